@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quizes.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up
+from django.conf import settings  # noqa: E402
+from survey.events import ranking_events, RANKING_EVENTS_PATH  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # The score stream is served outside of Django, its streaming responses can't be async in this version
+    if scope['type'] == 'http' and scope['path'] == RANKING_EVENTS_PATH and settings.RANKING_EVENTS.get('enabled'):
+        return await ranking_events(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -41,11 +41,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'survey.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'survey.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -78,9 +80,39 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keeps connections open between requests instead of opening one for each request
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# The survey reads of web requests go to the replicas, the writes to default (see survey.routers).
+# Each replica is another entry in DATABASES, with 'TEST': {'MIRROR': 'default'} so the tests use
+# the test database. Users read from default for sticky_seconds after answering or voting.
+DATABASE_ROUTERS = ['survey.routers.ReplicaRouter']
+
+REPLICA_CONFIGURATION = {
+    'replicas': [],
+    'sticky_seconds': 15,
+}
+
+# Applied to every new SQLite connection (see survey.database).
+# WAL lets readers work while a vote is written, busy_timeout (ms) makes writers wait for
+# the lock instead of failing, and the writes that still find it locked are retried
+# up to write_attempts times, starting after retry_delay seconds.
+SQLITE_CONFIGURATION = {
+    'enabled': True,
+    'pragmas': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 128 * 1024 * 1024,
+        'cache_size': -32000,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+    'write_attempts': 5,
+    'retry_delay': 0.05,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -130,10 +162,86 @@ LOGOUT_REDIRECT_URL = '/'
 LOGIN_URL = '/registration/login/'
 LOGOUT_URL = '/registration/logout/'
 
-# If it needs to be changed at runtime, consider it making it a Django model
+# Default ranking profile, used while there's no active RankingProfile in the database (see survey.profiles).
+# decay_points is the amount of points a question loses per day of age
 RANKING_CONFIGURATION = {
     'answer_points': 10,
     'like_points': 5,
     'dislike_points': -3,
     'daily_bonus_points': 10,
+    'decay_points': 0,
+}
+
+# The ranking profiles version is checked at most every check_interval seconds in each process
+RANKING_PROFILES = {
+    'check_interval': 1,
+}
+
+# Trending mode of the question list (?sort=trending&period=hour or day): the answers and votes of the
+# last `window` hourly or daily buckets, their points are halved every half_life buckets.
+# Older buckets are deleted by the prune_question_activity command
+TRENDING_CONFIGURATION = {
+    'hour': {'window': 48, 'half_life': 6},
+    'day': {'window': 14, 'half_life': 2},
+}
+
+# Snapshot of the best questions served in the first page of the ranking.
+# spill keeps some extra questions so re-ranking a question rarely requires rebuilding it
+LEADERBOARD_CONFIGURATION = {
+    'size': 20,
+    'spill': 20,
+    'timeout': 300,
+    # Seconds a writer can hold the snapshot while patching it
+    'lock_timeout': 10,
+}
+
+# When enabled, likes and dislikes are acknowledged into a local journal file and written to the
+# database in batches by the flush_vote_journal command (see survey.journal)
+VOTE_WRITE_BEHIND = {
+    'enabled': False,
+    'journal': BASE_DIR / 'votes.journal',
+}
+
+# The local memory cache is per process, use a shared backend (memcached, redis or
+# django.core.cache.backends.filebased.FileBasedCache) when running more than one process
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Pages of the question list of anonymous users are cached until the ranking changes,
+# and each question card until the question changes
+LIST_CACHE_CONFIGURATION = {
+    'enabled': True,
+    'page_timeout': 60,
+    'fragment_timeout': 600,
+}
+
+# Serves the question list, answers and votes with async views, enable it when running
+# under an ASGI server (uvicorn quizes.asgi:application, see the Dockerfile)
+ASYNC_VIEWS = {
+    'enabled': False,
+    'db_threads': 8,
+}
+
+# Streams the new scores to the open question lists as Server-Sent Events (see survey.events),
+# enable it when running under an ASGI server (uvicorn quizes.asgi:application, see the Dockerfile)
+RANKING_EVENTS = {
+    'enabled': False,
+}
+
+# The query budgets of the views (see survey.budgets) are always checked by the tests,
+# the time budgets only with check_time, e.g. for a benchmark run on a quiet machine
+QUERY_BUDGETS = {
+    'check_time': False,
+}
+
+# Records the latency, queries, database time, slowest SQL, render time and response size of each view
+# (see survey.instrumentation), served by the request-stats endpoint to staff users.
+# sample_rate is the share of the requests recorded, window the samples kept of each view
+INSTRUMENTATION = {
+    'enabled': False,
+    'sample_rate': 1.0,
+    'window': 1000,
 }
@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from survey.models import RankingProfile
+
+
+@admin.register(RankingProfile)
+class RankingProfileAdmin(admin.ModelAdmin):
+    list_display = ('name', 'role', 'version', 'answer_points', 'like_points', 'dislike_points',
+                    'daily_bonus_points', 'decay_points', 'updated')
+    list_filter = ('role',)
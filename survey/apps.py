@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class SurveyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'survey'
+
+    def ready(self):
+        # Connects the ranking counters signals and the SQLite pragmas
+        from survey import signals, database  # noqa: F401
+        from survey.search import restore_search_triggers
+
+        # Migrations that remake survey_question on SQLite drop the triggers of the search index
+        post_migrate.connect(restore_search_triggers, sender=self)
@@ -0,0 +1,77 @@
+"""
+Async versions of the survey endpoints, for ASGI servers (see ASYNC_VIEWS in settings).
+
+This Django version has no async ORM, so each view runs in a bounded pool of database threads.
+The event loop keeps accepting requests while the pool works, instead of every sync view
+going through the single thread that ASGI uses for them.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from survey import views
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_VIEWS.get('db_threads', 8),
+    thread_name_prefix='survey-db',
+)
+
+
+def in_db_thread(view):
+    """
+    Turns a sync view into an async view that runs it (and renders its template) in the database threads
+    """
+    def run(request, *args, **kwargs):
+        # Pool threads are not request threads, they take care of their own connections
+        close_old_connections()
+        try:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+            return response
+        finally:
+            close_old_connections()
+
+    @functools.wraps(view)
+    async def async_view(request, *args, **kwargs):
+        return await sync_to_async(run, thread_sensitive=False, executor=executor)(request, *args, **kwargs)
+
+    return async_view
+
+
+class sync_or_async:
+    """
+    View that runs async_view when ASYNC_VIEWS is enabled, and sync_view otherwise.
+    The setting is checked on each request, not when the URLs are loaded.
+
+    Django checks asyncio.iscoroutinefunction() on each request to decide how to call a view,
+    so the view is only a coroutine function while ASYNC_VIEWS is enabled: when it's disabled,
+    sync_view is called directly, without going through an event loop under WSGI.
+    """
+    def __init__(self, sync_view, async_view):
+        functools.update_wrapper(self, sync_view)
+        self.sync_view = sync_view
+        self.async_view = async_view
+
+    @staticmethod
+    def enabled():
+        return settings.ASYNC_VIEWS.get('enabled', False)
+
+    @property
+    def _is_coroutine(self):
+        # The marker of asyncio.iscoroutinefunction(), like asgiref's markcoroutinefunction in later versions
+        return asyncio.coroutines._is_coroutine if self.enabled() else None
+
+    def __call__(self, request, *args, **kwargs):
+        if self.enabled():
+            return self.async_view(request, *args, **kwargs)
+        return self.sync_view(request, *args, **kwargs)
+
+
+question_list = in_db_thread(views.QuestionListView.as_view())
+answer_question = in_db_thread(views.answer_question)
+like_dislike_question = in_db_thread(views.like_dislike_question)
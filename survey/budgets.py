@@ -0,0 +1,112 @@
+"""
+Query and time budgets of the views, so tests fail when a change adds queries (like an N+1 on
+Question.points) or makes a view slower at a given dataset size.
+The query budgets are always checked. Time depends on the machine, so the time budgets are only
+checked when QUERY_BUDGETS['check_time'] is enabled in settings (e.g. for a benchmark run on a quiet machine),
+or with check_time=True.
+
+Usage:
+with query_budget('survey:question-list'):
+    client.get('/')
+
+@query_budget(queries=3, milliseconds=50, check_time=True)
+def test_something(self):
+    ...
+"""
+import collections
+import difflib
+import re
+import time
+from contextlib import ContextDecorator
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+Budget = collections.namedtuple('Budget', ['queries', 'milliseconds'])
+
+# Budgets of each view, for a request on a seeded dataset (see QueryBudgetTests).
+# The time budgets are loose on purpose, they catch plans that got much slower, not noise
+VIEW_BUDGETS = {
+    # Count, page ids and the page with the authors
+    'survey:question-list': Budget(queries=3, milliseconds=500),
+    # Plus the session, the user, and the answers and votes of the user in the page
+    'survey:question-list:logged-in': Budget(queries=7, milliseconds=500),
+    # Count and page of the questions with activity in the window, grouped from the activity buckets
+    'survey:question-list:trending': Budget(queries=2, milliseconds=500),
+    # Session, user, savepoint, question, answer, write, histogram update of the changed value and release
+    'survey:question-answer': Budget(queries=8, milliseconds=200),
+    # Same for votes, with the counters update of the changed vote and its trending buckets
+    'survey:question-like': Budget(queries=9, milliseconds=200),
+}
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_in_lists = re.compile(r'IN \((?:\?, )*\?\)')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def normalize_sql(sql):
+    """
+    Replaces the literals of a query with ? and collapses IN lists, so the same query with
+    other parameters (e.g. the points query of each question of an N+1) reads the same
+    """
+    return _in_lists.sub('IN (...)', _literals.sub('?', sql))
+
+
+def sql_diff(expected, captured):
+    """Unified diff of the normalized queries, expected and captured are lists of SQL"""
+    return '\n'.join(difflib.unified_diff(
+        [normalize_sql(sql) for sql in expected],
+        [normalize_sql(sql) for sql in captured],
+        'expected', 'captured', lineterm='',
+    ))
+
+
+class query_budget(ContextDecorator):
+    """
+    Fails with QueryBudgetExceeded when the block runs more queries or takes longer than its budget.
+    The budget is given by the name of a view in VIEW_BUDGETS, or with queries and milliseconds
+    (None means no limit), the time is only checked with check_time (QUERY_BUDGETS['check_time'] by default).
+    When baseline (a list of SQL, e.g. the queries of the same block on a smaller dataset) is given,
+    the error shows the diff against it, otherwise the captured queries.
+    """
+    def __init__(self, name=None, queries=None, milliseconds=None, baseline=None, using=DEFAULT_DB_ALIAS,
+                 check_time=None):
+        budget = VIEW_BUDGETS[name] if name else Budget(queries, milliseconds)
+        self.name = name or 'block'
+        self.queries = budget.queries if queries is None else queries
+        self.milliseconds = budget.milliseconds if milliseconds is None else milliseconds
+        self.check_time = check_time
+        self.baseline = baseline
+        self.using = using
+
+    def __enter__(self):
+        self.context = CaptureQueriesContext(connections[self.using])
+        self.context.__enter__()
+        self.start = time.perf_counter()
+        return self.context
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = (time.perf_counter() - self.start) * 1000
+        self.context.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return False
+
+        captured = [query['sql'] for query in self.context.captured_queries]
+        problems = []
+        if self.queries is not None and len(captured) > self.queries:
+            problems.append('{} queries, the budget is {}'.format(len(captured), self.queries))
+        check_time = settings.QUERY_BUDGETS.get('check_time', False) if self.check_time is None else self.check_time
+        if check_time and self.milliseconds is not None and elapsed > self.milliseconds:
+            problems.append('{:.1f} ms, the budget is {} ms'.format(elapsed, self.milliseconds))
+        if not problems:
+            return False
+
+        if self.baseline is not None:
+            details = sql_diff(self.baseline, captured)
+        else:
+            details = '\n'.join('{}. {}'.format(number, sql) for number, sql in enumerate(captured, 1))
+        raise QueryBudgetExceeded('{} is over budget: {}\n{}'.format(self.name, ', '.join(problems), details))
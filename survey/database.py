@@ -0,0 +1,131 @@
+"""
+SQLite tuning (see SQLITE_CONFIGURATION in settings) and bulk writes.
+
+The pragmas are applied to every new connection. Writes that still find the database locked
+(SQLite takes one writer at a time) are retried with exponential backoff.
+"""
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection as default_connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from survey.models import Question, QuestionActivity, ACTIVITY_PERIODS, activity_bucket
+from survey.profiles import active_profile, shadow_profile
+
+
+def sqlite_configuration():
+    return getattr(settings, 'SQLITE_CONFIGURATION', {})
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Applies the configured pragmas to a new SQLite connection"""
+    configuration = sqlite_configuration()
+    if connection.vendor != 'sqlite' or not configuration.get('enabled', False):
+        return
+
+    with connection.cursor() as cursor:
+        for pragma, value in configuration.get('pragmas', {}).items():
+            cursor.execute('PRAGMA {} = {}'.format(pragma, value))
+
+
+def is_locked_error(error):
+    return 'database is locked' in str(error) or 'database table is locked' in str(error)
+
+
+def retry_on_locked(function):
+    """
+    Retries a write that found the database locked, waiting a bit longer (with some jitter) each time.
+    Only the outermost transaction can be retried, inside another atomic block the error is raised.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        configuration = sqlite_configuration()
+        attempts = configuration.get('write_attempts', 1)
+        delay = configuration.get('retry_delay', 0.05)
+        for attempt in range(attempts):
+            try:
+                return function(*args, **kwargs)
+            except OperationalError as error:
+                if (not is_locked_error(error) or attempt == attempts - 1
+                        or default_connection.in_atomic_block):
+                    raise
+            time.sleep(delay * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    return wrapper
+
+
+def insert_rows(model, fields, rows):
+    """
+    Inserts the rows (tuples with the values of the fields) with a single executemany.
+    Much faster than bulk_create for millions of rows: no model instances, and the SQL is built once.
+    Signals, defaults and auto_now are not applied.
+    """
+    sql = 'INSERT INTO {table} ({columns}) VALUES ({values})'.format(
+        table=default_connection.ops.quote_name(model._meta.db_table),
+        columns=', '.join(default_connection.ops.quote_name(model._meta.get_field(field).column) for field in fields),
+        values=', '.join(['%s'] * len(fields)),
+    )
+    with default_connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def add_question_counters(deltas):
+    """
+    Adds the counter deltas of many questions ({question_pk: {counter field: delta}}, e.g.
+    {'answer_count': 2, 'value_5_count': 1}) with a single executemany, the raw version of
+    QuestionQuerySet.update_counters for bulk imports. base_points and the scores follow the counters.
+    """
+    quote = default_connection.ops.quote_name
+    points_fields = ['base_points', 'score', 'shadow_score']
+    fields = [name for name in Question.COUNTER_FIELDS if name not in points_fields]
+    columns = [quote(Question._meta.get_field(name).column) for name in fields + points_fields]
+    sql = 'UPDATE {table} SET {counters} WHERE {pk} = %s'.format(
+        table=quote(Question._meta.db_table),
+        counters=', '.join('{column} = {column} + %s'.format(column=column) for column in columns),
+        pk=quote(Question._meta.pk.column),
+    )
+    active, shadow = active_profile(), shadow_profile()
+    rows = []
+    for question_pk, counters in deltas.items():
+        counts = (counters.get('answer_count', 0), counters.get('like_count', 0), counters.get('dislike_count', 0))
+        points = active.base_points(*counts)
+        rows.append([counters.get(name, 0) for name in fields] + [
+            points, points, shadow.base_points(*counts), question_pk
+        ])
+    with default_connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def add_question_activity(question_pk, answers=0, likes=0, dislikes=0, now=None):
+    """
+    Adds answers, likes and dislikes to the current hourly and daily activity buckets of a question
+    (see QuestionActivity), creating them if needed, with a single executemany of upserts.
+    """
+    quote = default_connection.ops.quote_name
+    table = quote(QuestionActivity._meta.db_table)
+    names = ['question', 'period', 'start', 'answers', 'likes', 'dislikes']
+    fields = [QuestionActivity._meta.get_field(name) for name in names]
+    key = ', '.join(quote(field.column) for field in fields[:3])
+    sql = 'INSERT INTO {table} ({columns}) VALUES ({values}) ON CONFLICT ({key}) DO UPDATE SET {counters}'.format(
+        table=table,
+        columns=', '.join(quote(field.column) for field in fields),
+        values=', '.join(['%s'] * len(fields)),
+        key=key,
+        counters=', '.join(
+            '{column} = {table}.{column} + excluded.{column}'.format(table=table, column=quote(field.column))
+            for field in fields[3:]
+        ),
+    )
+    rows = [
+        [field.get_db_prep_save(value, default_connection) for field, value in zip(fields, [
+            question_pk, period, activity_bucket(period, now), answers, likes, dislikes
+        ])]
+        for period, _ in ACTIVITY_PERIODS
+    ]
+    with default_connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import threading
+
+from survey.models import Question
+from survey.leaderboard import leaderboard
+
+RANKING_EVENTS_PATH = '/events/ranking/'
+
+
+class Broker:
+    """
+    In-process publish/subscribe of score deltas.
+    Subscribers are callables that receive each published message, they are called from the
+    thread that publishes, so they must not block (the SSE stream hands them to its event loop).
+    With more than one process, each one only sees the writes it served.
+
+    Usage:
+    broker.subscribe(messages.append)
+    broker.publish({'question_id': 1, 'points': 10, 'position': 3})
+    """
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.add(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers.discard(callback)
+
+    @property
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def publish(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(message)
+
+
+broker = Broker()
+
+
+def score_delta(question_pk):
+    """
+    Returns the current points and position in the ranking of a question, None if it doesn't exist.
+    The position is taken from the leaderboard snapshot, so it's None outside of it.
+    """
+    question = Question.objects.ranked().filter(pk=question_pk).first()
+    if question is None:
+        return None
+    return {'question_id': question_pk, 'points': question.points, 'position': leaderboard.position(question_pk)}
+
+
+def publish_score(question_pk):
+    """
+    Publishes the new score of a question, only if someone is listening
+    """
+    if not broker.has_subscribers:
+        return
+    delta = score_delta(question_pk)
+    if delta is not None:
+        broker.publish(delta)
+
+
+async def ranking_events(scope, receive, send, keepalive=15, max_queue=100):
+    """
+    ASGI app that streams the score deltas as Server-Sent Events, see quizes/asgi.py.
+    Clients that can't keep up lose deltas instead of making the queue grow.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=max_queue)
+
+    def put(message):
+        if not queue.full():
+            queue.put_nowait(message)
+
+    def subscriber(message):
+        loop.call_soon_threadsafe(put, message)
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache')],
+    })
+
+    broker.subscribe(subscriber)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        while True:
+            message = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                [message, disconnected], timeout=keepalive, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected in done:
+                message.cancel()
+                break
+            if message in done:
+                body = 'data: {}\n\n'.format(json.dumps(message.result()))
+            else:
+                message.cancel()
+                # Comment line, keeps proxies from closing an idle stream
+                body = ': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body.encode(), 'more_body': True})
+    finally:
+        broker.unsubscribe(subscriber)
+        disconnected.cancel()
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
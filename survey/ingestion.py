@@ -0,0 +1,146 @@
+from django.db import transaction, IntegrityError
+
+from survey.models import Question, Answer, Vote, histogram_deltas
+from survey.signals import update_question_counters, vote_deltas
+from survey.overlay import invalidate_user_interactions
+
+MAX_ITEMS = 500
+
+VOTE_VALUES = {'like': True, 'dislike': False}
+
+
+def validate_item(item):
+    """
+    Returns (kind, question_pk, value) of a bulk item, raises ValueError with the reason if it's not valid
+    """
+    if not isinstance(item, dict):
+        raise ValueError('Item must be an object')
+
+    kind = item.get('kind')
+    try:
+        question_pk = int(item.get('question_pk'))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid question_pk')
+
+    value = item.get('value')
+    if kind == 'answer':
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValueError('Invalid answer value')
+        if value not in dict(Answer.ANSWERS_VALUES) or not value:
+            raise ValueError('Invalid answer value')
+    elif kind == 'vote':
+        if value not in VOTE_VALUES:
+            raise ValueError('Invalid vote value')
+        value = VOTE_VALUES[value]
+    else:
+        raise ValueError('Invalid kind')
+
+    return kind, question_pk, value
+
+
+def existing_rows(model, author_pk, question_pks):
+    return {row.question_id: row for row in model.objects.filter(author_id=author_pk, question_id__in=question_pks)}
+
+
+def upsert(model, field, author_pk, values):
+    """
+    Creates or updates the rows of model (Answer or Vote) of an author for many questions,
+    setting field to the value of each question in values ({question_pk: value}).
+    Uses one query to read the existing rows, one bulk insert and one bulk update.
+    If another request created some of the rows after they were read, the insert fails,
+    so the writes are rolled back to a savepoint and tried again once with the rows read again.
+    Returns the list of (created, old_value, row) of the rows that changed.
+    """
+    existing = existing_rows(model, author_pk, values)
+    try:
+        with transaction.atomic():
+            changed = write_rows(model, field, author_pk, values, existing)
+    except IntegrityError:
+        changed = write_rows(model, field, author_pk, values, existing_rows(model, author_pk, values))
+    if changed:
+        invalidate_user_interactions(author_pk)
+    return changed
+
+
+def write_rows(model, field, author_pk, values, existing):
+    created = []
+    updated = []
+    for question_pk, value in values.items():
+        row = existing.get(question_pk)
+        if row is None:
+            created.append(model(question_id=question_pk, author_id=author_pk, **{field: value}))
+        elif getattr(row, field) != value:
+            updated.append((False, getattr(row, field), row))
+            setattr(row, field, value)
+
+    model.objects.bulk_create(created)
+    model.objects.bulk_update([row for _, _, row in updated], [field])
+    return [(True, None, row) for row in created] + updated
+
+
+def apply_answers(author_pk, answers):
+    """
+    Upserts the answers of an author ({question_pk: value}) and updates the ranking and histogram counters,
+    bulk_create and bulk_update don't send signals. Must run inside a transaction.
+    """
+    for created, old_value, answer in upsert(Answer, 'value', author_pk, answers):
+        update_question_counters(
+            answer, answers=int(created), histogram=histogram_deltas(old_value, answer.value)
+        )
+
+
+def apply_votes(author_pk, votes):
+    """
+    Upserts the votes of an author ({question_pk: is_like}) and updates the ranking counters.
+    Must run inside a transaction.
+    """
+    for _, old_is_like, vote in upsert(Vote, 'is_like', author_pk, votes):
+        likes, dislikes = vote_deltas(old_is_like, vote.is_like)
+        update_question_counters(vote, likes=likes, dislikes=dislikes)
+
+
+def ingest(author, items):
+    """
+    Applies a batch of answers and votes of author in one transaction.
+    Later items for the same question and kind override the previous ones.
+    Returns a result for each item: {'ok': True} or {'ok': False, 'error': reason}
+
+    Usage:
+    ingest(user, [{'question_pk': 1, 'kind': 'answer', 'value': 5},
+                  {'question_pk': 1, 'kind': 'vote', 'value': 'like'}])
+    """
+    results = []
+    parsed = []
+    for item in items:
+        try:
+            parsed.append(validate_item(item))
+            results.append({'ok': True})
+        except ValueError as error:
+            parsed.append(None)
+            results.append({'ok': False, 'error': str(error)})
+
+    # All the questions are validated with one query
+    question_pks = {item[1] for item in parsed if item}
+    existing_pks = set(Question.objects.filter(pk__in=question_pks).values_list('pk', flat=True))
+
+    answers = {}
+    votes = {}
+    for index, item in enumerate(parsed):
+        if item is None:
+            continue
+        kind, question_pk, value = item
+        if question_pk not in existing_pks:
+            results[index] = {'ok': False, 'error': 'Question does not exist'}
+            continue
+        if kind == 'answer':
+            answers[question_pk] = value
+        else:
+            votes[question_pk] = value
+
+    with transaction.atomic():
+        apply_answers(author.pk, answers)
+        apply_votes(author.pk, votes)
+
+    return results
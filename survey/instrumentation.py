@@ -0,0 +1,137 @@
+"""
+Per-request instrumentation (see INSTRUMENTATION in settings).
+
+Each sampled request records its latency, query count, database time, slowest SQL, template render
+time and response size under the name of its view (e.g. survey:question-list). Every view keeps
+the last `window` samples, so the summaries and histograms are rolling and memory doesn't grow.
+With more than one process, each one only sees the requests it served.
+"""
+import collections
+import statistics
+import threading
+import time
+
+from django.conf import settings
+
+# Upper bounds (in ms) of the latency histogram buckets, the last bucket has no bound
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+METRICS = ('latency_ms', 'queries', 'db_ms', 'render_ms', 'response_bytes')
+
+
+def instrumentation_configuration():
+    return getattr(settings, 'INSTRUMENTATION', {})
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that counts the queries of a request and keeps the slowest one
+    """
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0
+        self.slowest_seconds = 0
+        self.slowest_sql = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.seconds += duration
+            if duration >= self.slowest_seconds:
+                self.slowest_seconds = duration
+                self.slowest_sql = sql
+
+
+class RequestStats:
+    """
+    Rolling samples of the instrumented requests of each view.
+
+    Usage:
+    request_stats.record('survey:question-list', {'latency_ms': 12.5, 'queries': 3, ...})
+    request_stats.summary()
+    """
+    def __init__(self):
+        self._views = {}
+        self._totals = collections.Counter()
+        self._lock = threading.Lock()
+
+    def record(self, view_name, sample):
+        window = instrumentation_configuration().get('window', 1000)
+        with self._lock:
+            samples = self._views.get(view_name)
+            if samples is None or samples.maxlen != window:
+                samples = self._views[view_name] = collections.deque(samples or (), maxlen=window)
+            samples.append(sample)
+            self._totals[view_name] += 1
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+            self._totals.clear()
+
+    def summary(self):
+        """Returns {view_name: summary} of the samples in the window, see summarize"""
+        with self._lock:
+            views = {name: (list(samples), self._totals[name]) for name, samples in self._views.items()}
+        return {name: summarize(samples, total) for name, (samples, total) in sorted(views.items())}
+
+
+def summarize(samples, total):
+    """
+    Percentiles of each metric, the latency histogram and the slowest SQL of the samples
+    """
+    summary = {'requests': total, 'samples': len(samples)}
+    for metric in METRICS:
+        values = [sample[metric] for sample in samples if sample[metric] is not None]
+        if not values:
+            summary[metric] = None
+            continue
+        percentiles = statistics.quantiles(values, n=100, method='inclusive') if len(values) > 1 else values * 99
+        summary[metric] = {
+            'mean': round(statistics.mean(values), 3),
+            'p50': round(percentiles[49], 3),
+            'p95': round(percentiles[94], 3),
+            'p99': round(percentiles[98], 3),
+            'max': round(max(values), 3),
+        }
+
+    histogram = collections.Counter()
+    for sample in samples:
+        histogram[next((bound for bound in LATENCY_BUCKETS if sample['latency_ms'] <= bound), None)] += 1
+    summary['latency_histogram'] = {
+        ('<={}'.format(bound) if bound else '>{}'.format(LATENCY_BUCKETS[-1])): histogram[bound]
+        for bound in LATENCY_BUCKETS + (None,)
+    }
+
+    slowest = max(samples, key=lambda sample: sample['slowest_sql_ms'] or 0, default=None)
+    summary['slowest_sql'] = {
+        'ms': slowest['slowest_sql_ms'],
+        'sql': slowest['slowest_sql'],
+    } if slowest and slowest['slowest_sql'] else None
+    return summary
+
+
+def summary_text(summary):
+    """Plain text version of RequestStats.summary, one block per view"""
+    lines = []
+    for view_name, view in summary.items():
+        lines.append('{} ({} requests, {} samples)'.format(view_name, view['requests'], view['samples']))
+        for metric in METRICS:
+            values = view[metric]
+            if values:
+                lines.append('  {:<15} {}'.format(metric, ' '.join(
+                    '{}={}'.format(name, value) for name, value in values.items()
+                )))
+        lines.append('  {:<15} {}'.format('latency_hist', ' '.join(
+            '{}:{}'.format(bucket, count) for bucket, count in view['latency_histogram'].items()
+        )))
+        if view['slowest_sql']:
+            slowest = view['slowest_sql']
+            lines.append('  {:<15} {} ms {}'.format('slowest_sql', slowest['ms'], slowest['sql']))
+    return '\n'.join(lines) + '\n'
+
+
+request_stats = RequestStats()
@@ -0,0 +1,199 @@
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from survey.models import Question
+from survey.ingestion import apply_votes
+
+
+class VoteJournal:
+    """
+    Write-behind journal for likes and dislikes.
+
+    When VOTE_WRITE_BEHIND is enabled, like_dislike_question only appends the vote to a local file
+    and answers right away, instead of contending with other writers for the Vote and Question rows.
+    The journal is flushed to the database in batches by the flush_vote_journal command, coalescing
+    the entries per (author, question) so only the last toggle is written.
+
+    The file is shared by every process of the host, so a user always sees their pending votes,
+    whatever process serves the list. Each process keeps the pending votes of the journal files
+    in memory with the offset read so far, so the list only reads the votes appended since its last read.
+
+    Usage:
+    journal.append(user.pk, question.pk, True)
+    journal.flush()
+    """
+    def __init__(self, path=None):
+        self._path = path
+        # {(device, inode): JournalIndex} of the journal files, a renamed file keeps its index
+        self._indexes = {}
+        self._indexes_lock = threading.Lock()
+
+    @property
+    def path(self):
+        return str(self._path or settings.VOTE_WRITE_BEHIND.get('journal'))
+
+    @property
+    def flushing_path(self):
+        # The journal is renamed while it's flushed, so new votes go to a new file
+        return self.path + '.flushing'
+
+    @property
+    def enabled(self):
+        return settings.VOTE_WRITE_BEHIND.get('enabled', False)
+
+    def append(self, author_pk, question_pk, is_like):
+        line = json.dumps([author_pk, question_pk, is_like]) + '\n'
+        while True:
+            with open(self.path, 'a') as journal:
+                fcntl.flock(journal, fcntl.LOCK_EX)
+                # If the journal was renamed for a flush while waiting for the lock, write to the new one
+                try:
+                    if os.fstat(journal.fileno()).st_ino != os.stat(self.path).st_ino:
+                        continue
+                except FileNotFoundError:
+                    continue
+                journal.write(line)
+                return
+
+    def _read(self, path):
+        """
+        Yields the (author_pk, question_pk, is_like) entries of a journal file, in order
+        """
+        try:
+            with open(path) as journal:
+                for line in journal:
+                    try:
+                        author_pk, question_pk, is_like = json.loads(line)
+                    except ValueError:
+                        # Line being written
+                        continue
+                    yield author_pk, question_pk, is_like
+        except FileNotFoundError:
+            return
+
+    def _read_new(self, path, indexes):
+        """
+        Reads the lines appended to a journal file since its last read into its index, and adds the index
+        to indexes. Returns the index, None if the file doesn't exist
+        """
+        try:
+            journal = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        with journal:
+            stat = os.fstat(journal.fileno())
+            key = (stat.st_dev, stat.st_ino)
+            index = self._indexes.get(key)
+            if index is None or not index.same_file(journal, stat.st_size):
+                # A new file, or another one that got the inode of a deleted file
+                index = JournalIndex()
+            index.read(journal)
+        indexes[key] = index
+        return index
+
+    def pending_for(self, author_pk):
+        """
+        Returns the votes of the author that are not in the database yet, as {question_pk: is_like}
+        """
+        with self._indexes_lock:
+            indexes = {}
+            files = [self._read_new(self.flushing_path, indexes), self._read_new(self.path, indexes)]
+            # Flushed files are forgotten
+            self._indexes = indexes
+            pending = {}
+            for index in files:
+                if index is not None:
+                    pending.update(index.votes.get(author_pk, {}))
+            return pending
+
+    @contextmanager
+    def _flush_lock(self):
+        with open(self.path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def flush(self):
+        """
+        Writes the pending votes to the database in one transaction, returns the amount of votes written
+        """
+        with self._flush_lock():
+            # A flushing file left by a failed flush is written again, votes are idempotent
+            if not os.path.exists(self.flushing_path):
+                try:
+                    os.replace(self.path, self.flushing_path)
+                except FileNotFoundError:
+                    return 0
+
+            with open(self.flushing_path) as journal:
+                # Waits for the votes that were being appended while it was renamed
+                fcntl.flock(journal, fcntl.LOCK_EX)
+
+            votes = {}
+            for author_pk, question_pk, is_like in self._read(self.flushing_path):
+                votes.setdefault(author_pk, {})[question_pk] = is_like
+
+            question_pks = {question_pk for author_votes in votes.values() for question_pk in author_votes}
+            existing_questions = set(Question.objects.filter(pk__in=question_pks).values_list('pk', flat=True))
+            existing_authors = set(get_user_model().objects.filter(pk__in=votes).values_list('pk', flat=True))
+
+            written = 0
+            with transaction.atomic():
+                for author_pk, author_votes in votes.items():
+                    author_votes = {
+                        question_pk: is_like for question_pk, is_like in author_votes.items()
+                        if question_pk in existing_questions
+                    }
+                    if author_pk not in existing_authors or not author_votes:
+                        continue
+                    apply_votes(author_pk, author_votes)
+                    written += len(author_votes)
+
+            os.remove(self.flushing_path)
+            return written
+
+
+class JournalIndex:
+    """
+    Votes of the complete lines of a journal file up to offset, as {author_pk: {question_pk: is_like}}.
+    The first and the last lines read tell if a file with the same inode is still the same one.
+    """
+    def __init__(self):
+        self.offset = 0
+        self.head = b''
+        self.tail = b''
+        self.votes = {}
+
+    def same_file(self, journal, size):
+        if size < self.offset:
+            return False
+        journal.seek(0)
+        if journal.read(len(self.head)) != self.head:
+            return False
+        journal.seek(self.offset - len(self.tail))
+        return journal.read(len(self.tail)) == self.tail
+
+    def read(self, journal):
+        journal.seek(self.offset)
+        data = journal.read()
+        # A line without its end is being written, it's read the next time
+        lines = data[:data.rfind(b'\n') + 1].splitlines(keepends=True)
+        for line in lines:
+            try:
+                author_pk, question_pk, is_like = json.loads(line)
+            except ValueError:
+                continue
+            self.votes.setdefault(author_pk, {})[question_pk] = is_like
+        if lines:
+            self.head = self.head or lines[0]
+            self.tail = lines[-1]
+            self.offset += sum(len(line) for line in lines)
+
+
+journal = VoteJournal()
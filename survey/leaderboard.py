@@ -0,0 +1,150 @@
+from bisect import bisect_left, insort
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from survey.models import Question
+
+
+class Leaderboard:
+    """
+    Snapshot of the best questions of the ranking, kept in the cache.
+
+    The snapshot holds the top size + spill questions as sorted (-total_points, pk) keys, the same
+    order as Question.objects.ranked(), and a floor: the key of the best question outside of it.
+    Every write that changes the points of a question only re-ranks that question in the snapshot,
+    so reading the top of the ranking doesn't need to sort the whole table.
+    Entries that fall behind the floor are no longer reliable, when there are not enough reliable
+    entries left (or the day changes, because of the daily bonus) the snapshot is rebuilt from the database.
+    It's always read from the primary, a lagging replica would cache an old ranking.
+    The snapshot is patched by one writer at a time, in every process: a writer takes a lock in the
+    cache, and a writer that finds it taken drops the snapshot instead of overwriting the other patch.
+
+    Usage:
+    leaderboard.top(20)
+    leaderboard.refresh(question.pk)
+    leaderboard.position(question.pk)
+    """
+    cache_key = 'survey:leaderboard'
+    lock_key = 'survey:leaderboard-lock'
+
+    @property
+    def size(self):
+        return settings.LEADERBOARD_CONFIGURATION.get('size', 20)
+
+    @property
+    def capacity(self):
+        return self.size + settings.LEADERBOARD_CONFIGURATION.get('spill', 0)
+
+    @property
+    def timeout(self):
+        return settings.LEADERBOARD_CONFIGURATION.get('timeout', 300)
+
+    @property
+    def lock_timeout(self):
+        return settings.LEADERBOARD_CONFIGURATION.get('lock_timeout', 10)
+
+    def _today(self):
+        return datetime.today().date().isoformat()
+
+    def _build(self):
+        rows = list(
+            Question.objects.using(DEFAULT_DB_ALIAS).ranked().values_list('total_points', 'pk')[:self.capacity + 1]
+        )
+        keys = [(-points, pk) for points, pk in rows]
+        snapshot = {
+            'day': self._today(),
+            'entries': keys[:self.capacity],
+            'floor': keys[self.capacity] if len(keys) > self.capacity else None,
+        }
+        cache.set(self.cache_key, snapshot, self.timeout)
+        return snapshot
+
+    def _get(self):
+        snapshot = cache.get(self.cache_key)
+        if snapshot is None or snapshot['day'] != self._today():
+            return None
+        return snapshot
+
+    @staticmethod
+    def _reliable(snapshot):
+        entries = snapshot['entries']
+        if snapshot['floor'] is None:
+            return entries
+        return entries[:bisect_left(entries, tuple(snapshot['floor']))]
+
+    def top(self, count):
+        """
+        Returns the pks of the best count questions, in ranking order.
+        Returns None if the snapshot can't hold that many questions.
+        """
+        if count > self.size:
+            return None
+
+        snapshot = self._get()
+        if snapshot is None:
+            snapshot = self._build()
+
+        entries = self._reliable(snapshot)
+        if len(entries) < count and snapshot['floor'] is not None:
+            entries = self._reliable(self._build())
+
+        return [pk for _, pk in entries[:count]]
+
+    def position(self, question_pk):
+        """
+        Returns the position in the ranking of a question, read from the snapshot only.
+        Returns None if there's no snapshot or the question is not among its reliable entries.
+        """
+        snapshot = self._get()
+        if snapshot is None:
+            return None
+        for position, (_, pk) in enumerate(self._reliable(snapshot), 1):
+            if pk == question_pk:
+                return position
+        return None
+
+    def refresh(self, question_pk):
+        """
+        Re-ranks a question in the snapshot after its points changed (or it was created or deleted)
+        """
+        if not cache.add(self.lock_key, True, self.lock_timeout):
+            # Another writer is patching it, it will be rebuilt on the next read
+            self.invalidate()
+            return
+        try:
+            snapshot = self._get()
+            if snapshot is None:
+                # It will be rebuilt on the next read
+                return
+
+            points = Question.objects.using(DEFAULT_DB_ALIAS).ranked().filter(pk=question_pk).values_list(
+                'total_points', flat=True
+            ).first()
+            entries = [entry for entry in snapshot['entries'] if entry[1] != question_pk]
+            floor = tuple(snapshot['floor']) if snapshot['floor'] is not None else None
+
+            if points is not None:
+                key = (-points, question_pk)
+                if floor is None or key < floor:
+                    insort(entries, key)
+                else:
+                    floor = min(floor, key)
+
+            while len(entries) > self.capacity:
+                trimmed = entries.pop()
+                floor = trimmed if floor is None else min(floor, trimmed)
+
+            snapshot['entries'] = entries
+            snapshot['floor'] = floor
+            cache.set(self.cache_key, snapshot, self.timeout)
+        finally:
+            cache.delete(self.lock_key)
+
+    def invalidate(self):
+        cache.delete(self.cache_key)
+
+
+leaderboard = Leaderboard()
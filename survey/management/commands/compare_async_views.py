@@ -0,0 +1,134 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+from django.test import RequestFactory
+
+from survey import views, async_views
+from survey.models import Question
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the sync and async survey views inside one ASGI worker: '
+        'sync views go through the single thread ASGI uses for them, async views through the database threads'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', choices=['list', 'answer', 'like'], default='list')
+        parser.add_argument('--requests', type=int, default=200, help='Amount of requests for each variant')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at the same time')
+        parser.add_argument('--username', help='User making the requests, anonymous if not given (only for list)')
+        parser.add_argument('--json', action='store_true', help='Outputs the results as JSON')
+
+    def handle(self, *args, **options):
+        user = AnonymousUser()
+        if options['username']:
+            user = get_user_model().objects.get(username=options['username'])
+        elif options['view'] != 'list':
+            raise CommandError('Answers and votes need a --username')
+
+        question_pks = list(Question.objects.values_list('pk', flat=True)[:100])
+        if not question_pks:
+            raise CommandError('There are no questions, load some data first')
+
+        sync_view, async_view = {
+            'list': (views.QuestionListView.as_view(), async_views.question_list),
+            'answer': (views.answer_question, async_views.answer_question),
+            'like': (views.like_dislike_question, async_views.like_dislike_question),
+        }[options['view']]
+
+        results = {
+            'sync': asyncio.run(self.run(sync_view, False, user, question_pks, options)),
+            'async': asyncio.run(self.run(async_view, True, user, question_pks, options)),
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for variant, result in results.items():
+            self.stdout.write(
+                '{variant:>5}: {requests_per_second:8.1f} req/s, p50 {p50_ms:7.1f} ms, p95 {p95_ms:7.1f} ms, '
+                'up to {max_in_flight} requests running at once, '
+                '{errors} database errors'.format(variant=variant, **result)
+            )
+
+    def build_request(self, factory, view, user, question_pk, index):
+        if view == 'list':
+            request = factory.get('/')
+        elif view == 'answer':
+            request = factory.post('/question/answer/', {'question_pk': question_pk, 'value': index % 5 + 1})
+        else:
+            request = factory.post('/question/like/', {'question_pk': question_pk,
+                                                       'value': 'like' if index % 2 else 'dislike'})
+        request.user = user
+        return request
+
+    async def run(self, view, is_async, user, question_pks, options):
+        factory = RequestFactory()
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        lock = threading.Lock()
+        in_flight = {'now': 0, 'max': 0}
+        latencies = []
+        errors = []
+
+        def track(delta):
+            with lock:
+                in_flight['now'] += delta
+                in_flight['max'] = max(in_flight['max'], in_flight['now'])
+
+        def run_sync(request):
+            track(1)
+            try:
+                response = view(request)
+                if hasattr(response, 'render'):
+                    response.render()
+                return response
+            finally:
+                track(-1)
+
+        async def run_async(request):
+            track(1)
+            try:
+                return await view(request)
+            finally:
+                track(-1)
+
+        # This is how the ASGI handler runs sync views
+        call = run_async if is_async else sync_to_async(run_sync, thread_sensitive=True)
+
+        async def one(index):
+            request = self.build_request(
+                factory, options['view'], user, question_pks[index % len(question_pks)], index
+            )
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await call(request)
+                except DatabaseError as error:
+                    # SQLite only takes one writer at a time, count the requests it turned away
+                    errors.append(error)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(options['requests'])))
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        return {
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'seconds': round(elapsed, 3),
+            'requests_per_second': options['requests'] / elapsed,
+            'p50_ms': statistics.median(latencies) * 1000,
+            'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+            'max_in_flight': in_flight['max'],
+            'errors': len(errors),
+        }
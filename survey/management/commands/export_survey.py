@@ -0,0 +1,28 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from survey.streaming import export_jsonl
+
+
+class Command(BaseCommand):
+    help = 'Exports the questions, answers and votes as JSON Lines, reading them in chunks (constant memory)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='File to write, - for the standard output')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows read from the database at once',
+        )
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            export_jsonl(sys.stdout, chunk_size=options['chunk_size'])
+            return
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            counts = export_jsonl(output, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS('Exported {}'.format(
+            ', '.join('{} {}'.format(count, label) for label, count in counts.items())
+        )))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from survey.journal import journal
+
+
+class Command(BaseCommand):
+    help = 'Writes the votes of the write-behind journal to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keeps flushing the journal, as a background worker',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds between flushes when looping',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            written = journal.flush()
+            if written:
+                self.stdout.write('Flushed {} votes'.format(written))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,75 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from survey.synthetic import SyntheticDataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates synthetic users, questions, answers and votes, with a Zipf-like popularity. '
+        'The same seed always generates the same data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=10000, help='Amount of questions')
+        parser.add_argument('--users', type=int, help='Amount of users (default: a tenth of the questions)')
+        parser.add_argument('--answers-per-question', type=float, default=3, help='Average answers of a question')
+        parser.add_argument('--votes-per-question', type=float, default=5, help='Average votes of a question')
+        parser.add_argument(
+            '--popularity',
+            type=float,
+            default=1.1,
+            help='Exponent of the Zipf-like popularity, the higher the more interactions go to the top questions',
+        )
+        parser.add_argument('--like-ratio', type=float, default=0.7, help='Share of the votes that are likes')
+        parser.add_argument('--days', type=int, default=30, help='Days over which the questions are spread')
+        parser.add_argument(
+            '--today-ratio',
+            type=float,
+            help='Share of the questions created today, with the daily bonus (default: one day worth of them)',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Questions (with their answers and votes) written in each transaction',
+        )
+
+    def handle(self, *args, **options):
+        if options['questions'] < 1 or options['days'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--questions, --days and --chunk-size have to be positive')
+        if not 0 <= options['like_ratio'] <= 1 or not 0 <= (options['today_ratio'] or 0) <= 1:
+            raise CommandError('--like-ratio and --today-ratio have to be between 0 and 1')
+
+        dataset = SyntheticDataset(
+            questions=options['questions'],
+            users=options['users'],
+            answers_per_question=options['answers_per_question'],
+            votes_per_question=options['votes_per_question'],
+            popularity=options['popularity'],
+            like_ratio=options['like_ratio'],
+            days=options['days'],
+            today_ratio=options['today_ratio'],
+            seed=options['seed'],
+            chunk_size=options['chunk_size'],
+        )
+        start = time.perf_counter()
+
+        def progress(counts):
+            self.stdout.write(
+                '{questions}/{total} questions, {answers} answers, {votes} votes ({seconds:.0f} s)'.format(
+                    total=options['questions'], seconds=time.perf_counter() - start, **counts
+                )
+            )
+
+        counts = dataset.generate(progress=progress if options['verbosity'] > 1 else None)
+        seconds = time.perf_counter() - start
+        rows = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            'Generated {users} users, {questions} questions, {answers} answers and {votes} votes '
+            '({rows} rows in {seconds:.1f} s, {rate:.0f} rows/s)'.format(
+                rows=rows, seconds=seconds, rate=rows / seconds, **counts
+            )
+        ))
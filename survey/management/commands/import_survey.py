@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from survey.streaming import JSONLImporter
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports questions, answers and votes from a JSON Lines export, in batches. '
+        'A failed import continues where it stopped when it is run again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='File written by export_survey')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows validated and inserted at once',
+        )
+        parser.add_argument(
+            '--skip-invalid',
+            action='store_true',
+            help='Skips (and reports) the invalid rows instead of stopping at the first one',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Reads the file from the beginning, even if a previous import of it failed halfway',
+        )
+
+    def handle(self, *args, **options):
+        importer = JSONLImporter(
+            batch_size=options['batch_size'],
+            skip_invalid=options['skip_invalid'],
+            progress_path=options['input'] + '.progress',
+        )
+        if options['restart']:
+            importer.save_progress(0)
+        try:
+            with open(options['input'], encoding='utf-8') as stream:
+                counts = importer.run(stream)
+        except ValueError as error:
+            raise CommandError('{} (run the command again to continue after the last imported batch)'.format(error))
+
+        for line_number, reason in importer.errors:
+            self.stderr.write('Line {}: {}'.format(line_number, reason))
+        self.stdout.write(self.style.SUCCESS('Imported {}'.format(
+            ', '.join('{} {}'.format(count, label) for label, count in counts.items())
+        )))
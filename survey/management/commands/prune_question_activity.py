@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from survey.models import QuestionActivity
+
+
+class Command(BaseCommand):
+    help = 'Deletes the activity buckets older than the trending windows, schedule it every hour'
+
+    def handle(self, *args, **options):
+        deleted, _ = QuestionActivity.objects.expired().delete()
+        self.stdout.write(self.style.SUCCESS('Deleted {} activity buckets'.format(deleted)))
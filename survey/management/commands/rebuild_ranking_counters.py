@@ -0,0 +1,80 @@
+import functools
+import operator
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Q
+
+from survey.models import Question, counted_expressions, HISTOGRAM_FIELDS
+from survey.leaderboard import leaderboard
+from survey.profiles import active_profile, shadow_profile
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds (or verifies) the denormalized ranking counters and answer histograms of questions '
+        'from answers and votes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only checks the counters, fails if any of them is out of sync',
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify()
+        else:
+            self.rebuild()
+
+    def out_of_sync(self):
+        today = datetime.today().date()
+        active, shadow = active_profile(), shadow_profile()
+        wrong_histogram = [~Q(**{field: F('counted_{}'.format(field))}) for field in HISTOGRAM_FIELDS]
+        return Question.objects.counted().filter(
+            functools.reduce(operator.or_, wrong_histogram) |
+            (Q(created__lt=today) & (~Q(daily_bonus=0) | ~Q(shadow_daily_bonus=0))) |
+            (Q(created=today) & ~Q(daily_bonus=active.daily_bonus_points)) |
+            (Q(created=today) & ~Q(shadow_daily_bonus=shadow.daily_bonus_points)) |
+            ~Q(answer_count=F('counted_answers')) |
+            ~Q(like_count=F('counted_likes')) |
+            ~Q(dislike_count=F('counted_dislikes')) |
+            ~Q(base_points=active.base_points_expression()) |
+            ~Q(score=active.score_expression(today)) |
+            ~Q(shadow_score=shadow.score_expression(today))
+        )
+
+    def verify(self):
+        wrong = list(self.out_of_sync().values_list('pk', flat=True))
+        if wrong:
+            raise CommandError('{count} questions have wrong ranking counters: {pks}'.format(
+                count=len(wrong),
+                pks=', '.join(str(pk) for pk in wrong[:20])
+            ))
+        self.stdout.write(self.style.SUCCESS('All ranking counters are in sync'))
+
+    def rebuild(self):
+        counted = counted_expressions()
+        today = datetime.today().date()
+        active, shadow = active_profile(), shadow_profile()
+        with transaction.atomic():
+            Question.objects.all().rollover_daily_bonus(today)
+            Question.objects.all().apply_daily_bonus(today, active, shadow)
+            wrong = Question.objects.filter(pk__in=list(self.out_of_sync().values_list('pk', flat=True)))
+            updated = wrong.update(
+                answer_count=counted['counted_answers'],
+                like_count=counted['counted_likes'],
+                dislike_count=counted['counted_dislikes'],
+                **{field: counted['counted_{}'.format(field)] for field in HISTOGRAM_FIELDS}
+            )
+            # base_points and the scores are updated afterwards, so they're computed from the rebuilt counters
+            wrong.update(
+                base_points=active.base_points_expression(),
+                score=active.score_expression(today),
+                shadow_score=shadow.score_expression(today),
+            )
+        leaderboard.invalidate()
+        self.stdout.write(self.style.SUCCESS('Rebuilt the ranking counters of {} questions'.format(updated)))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from survey.search import search_available, rebuild_search_index, restore_search_triggers, verify_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds (or verifies) the full-text search index of the questions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only checks the index, fails if it is out of sync with the questions',
+        )
+
+    def handle(self, *args, **options):
+        if not search_available():
+            raise CommandError('The search index is only available on SQLite, other databases use icontains')
+
+        if options['verify']:
+            try:
+                verify_search_index()
+            except DatabaseError as error:
+                raise CommandError('The search index is out of sync: {}'.format(error))
+            self.stdout.write(self.style.SUCCESS('The search index is in sync'))
+            return
+
+        if not restore_search_triggers():
+            rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS('Rebuilt the search index'))
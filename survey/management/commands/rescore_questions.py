@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from survey.models import Question
+from survey.profiles import configured_profiles, compile_profiles, apply_profiles
+from survey.ranking_engine import RankingEngine
+
+
+class Command(BaseCommand):
+    help = (
+        'Rescores every question with the configured active and shadow ranking profiles and applies them, '
+        'run it after changing the profiles. The ranking keeps the previous profiles until it finishes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=10000,
+            help='Amount of questions read and written at once',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only shows the questions whose points would change",
+        )
+        parser.add_argument(
+            '--diff-size',
+            type=int,
+            default=20,
+            help='Amount of changes shown with --dry-run (the biggest ones)',
+        )
+
+    def handle(self, *args, **options):
+        total = Question.objects.count()
+
+        def progress(processed):
+            self.stdout.write('Processed {processed}/{total} questions'.format(processed=processed, total=total))
+
+        # The profiles are compiled from the rows read here, the rescored scores and the applied
+        # profiles are committed together
+        with transaction.atomic():
+            configured = configured_profiles()
+            active, shadow = compile_profiles(configured)
+            result = RankingEngine(chunk_size=options['chunk_size'], profile=active, shadow=shadow).rescore(
+                dry_run=options['dry_run'],
+                progress=progress if options['verbosity'] > 1 else None,
+                diff_size=options['diff_size'],
+            )
+            if not options['dry_run']:
+                apply_profiles(configured)
+
+        if options['dry_run']:
+            for pk, old_points, new_points in result['diff']:
+                self.stdout.write('Question {pk}: {old} -> {new}'.format(pk=pk, old=old_points, new=new_points))
+            self.stdout.write('{changed} of {questions} questions would change'.format(**result))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            'Rescored {questions} questions, {changed} changed'.format(**result)
+        ))
+        if result['skipped']:
+            self.stdout.write(self.style.WARNING(
+                '{skipped} questions changed while rescoring, run it again to rescore them'.format(**result)
+            ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from survey.models import Question
+from survey.leaderboard import leaderboard
+from survey.versions import bump_version, RANKING_VERSION_KEY
+
+
+class Command(BaseCommand):
+    help = "Removes the daily bonus of yesterday's questions, schedule it right after midnight"
+
+    def handle(self, *args, **options):
+        updated = Question.objects.all().rollover_daily_bonus()
+        leaderboard.invalidate()
+        bump_version(RANKING_VERSION_KEY)
+        self.stdout.write(self.style.SUCCESS('Removed the daily bonus of {} questions'.format(updated)))
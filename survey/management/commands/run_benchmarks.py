@@ -0,0 +1,188 @@
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import AnonymousUser, User
+
+from survey.models import Question, Vote
+from survey.synthetic import SyntheticDataset
+from survey.views import QuestionListView, answer_question, like_dislike_question
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the ranking, the list rendering, the points, the answer and vote endpoints '
+        'and the search (FTS5 against icontains) on synthetic datasets of several sizes. '
+        'Each size is generated in its own temporary database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales',
+            type=int,
+            nargs='+',
+            default=[1000, 100000],
+            help='Amount of questions of each dataset (e.g. 1000 100000 1000000)',
+        )
+        parser.add_argument('--iterations', type=int, default=50, help='Timed calls of each benchmark')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the datasets and of the requests')
+        parser.add_argument('--output', help='Writes the JSON results to this file instead of the standard output')
+
+    def handle(self, *args, **options):
+        results = {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': options['iterations'],
+            'seed': options['seed'],
+            'scales': [],
+        }
+        # Its own cache, so the benchmarks never clear a shared one
+        benchmark_cache = {'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'survey-benchmarks',
+        }}
+        with override_settings(CACHES=benchmark_cache), tempfile.TemporaryDirectory() as directory:
+            for questions in options['scales']:
+                path = os.path.join(directory, 'benchmark_{}.sqlite3'.format(questions))
+                results['scales'].append(self.run_scale(questions, path, options))
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output)
+            self.stdout.write(self.style.SUCCESS('Results written to {}'.format(options['output'])))
+        else:
+            self.stdout.write(output)
+
+    def run_scale(self, questions, path, options):
+        """Generates a dataset of the given size in a new database and runs every benchmark on it"""
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        old_name, old_test_name = connection.settings_dict['NAME'], test_settings.get('NAME')
+        test_settings['NAME'] = path
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stderr.write('Generating {} questions'.format(questions))
+            start = time.perf_counter()
+            rows = SyntheticDataset(questions=questions, seed=options['seed']).generate()
+            generate_seconds = time.perf_counter() - start
+
+            cases = {}
+            for name, (setup, call) in self.cases(random.Random(options['seed'])).items():
+                self.stderr.write('Running {} ({} questions)'.format(name, questions))
+                cases[name] = self.measure(setup, call, options['iterations'])
+            return {
+                'questions': questions,
+                'rows': rows,
+                'generate_seconds': round(generate_seconds, 3),
+                'cases': cases,
+            }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            test_settings['NAME'] = old_test_name
+            cache.clear()
+
+    def cases(self, rng):
+        """Returns {name: (setup, call)}, setup runs before each call and is not timed"""
+        factory = RequestFactory()
+        list_view = QuestionListView.as_view()
+        user_pks = list(User.objects.values_list('pk', flat=True))
+        question_pks = list(Question.objects.values_list('pk', flat=True))
+        # The user with most votes, the one with the biggest overlay
+        voter = User.objects.get(pk=Vote.objects.values('author').annotate(votes=Count('pk')).order_by(
+            '-votes'
+        ).values_list('author', flat=True).first())
+        page = list(Question.objects.ranked()[:1000])
+
+        def render(response):
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+            return response.content
+
+        def get_list(user):
+            request = factory.get('/')
+            request.user = user
+            return render(list_view(request))
+
+        def post(view, value):
+            request = factory.post('/', {'question_pk': rng.choice(question_pks), 'value': value})
+            request.user = User(pk=rng.choice(user_pks))
+            return view(request)
+
+        def nothing():
+            pass
+
+        # A number of a synthetic title (e.g. "Synthetic question 123"), it also matches longer numbers
+        def search_term():
+            return str(rng.randint(1, len(question_pks)))
+
+        page_size = QuestionListView.paginate_by
+
+        return {
+            'ranked': (nothing, lambda: list(Question.objects.ranked()[:QuestionListView.paginate_by])),
+            'list_anonymous': (cache.clear, lambda: get_list(AnonymousUser())),
+            'list_anonymous_cached': (nothing, lambda: get_list(AnonymousUser())),
+            'list_logged_in': (cache.clear, lambda: get_list(voter)),
+            'points_1000_questions': (nothing, lambda: [question.points for question in page]),
+            'answer': (nothing, lambda: post(answer_question, rng.randint(1, 5))),
+            'vote': (nothing, lambda: post(like_dislike_question, rng.choice(['like', 'dislike']))),
+            'search_fts': (nothing, lambda: list(Question.objects.search(search_term())[:page_size])),
+            'search_fts_by_points': (nothing, lambda: list(
+                Question.objects.ranked().search(search_term(), order=False)[:page_size]
+            )),
+            'search_icontains_by_points': (nothing, lambda: list(
+                Question.objects.ranked().filter(title__icontains=search_term())[:page_size]
+            )),
+            # A word every synthetic title has: every question is a hit, ranked or counted
+            'search_fts_common': (nothing, lambda: list(Question.objects.search('synthetic')[:page_size])),
+            'search_fts_common_count': (nothing, lambda: Question.objects.search('synthetic').count()),
+            'search_fts_common_by_points': (nothing, lambda: list(
+                Question.objects.ranked().search('synthetic', order=False)[:page_size]
+            )),
+            'search_icontains_common_by_points': (nothing, lambda: list(
+                Question.objects.ranked().filter(title__icontains='synthetic')[:page_size]
+            )),
+            # A word no question has: the index answers right away, icontains reads every question
+            'search_fts_miss': (nothing, lambda: list(Question.objects.search('zzzz')[:page_size])),
+            'search_icontains_miss': (nothing, lambda: list(
+                Question.objects.filter(title__icontains='zzzz')[:page_size]
+            )),
+        }
+
+    def measure(self, setup, call, iterations):
+        latencies = []
+        for _ in range(iterations):
+            setup()
+            start = time.perf_counter()
+            call()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        # Queries and memory are measured in one more call, tracing would slow down the timed ones
+        setup()
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            call()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        return {
+            'p50_ms': round(percentiles[49], 3),
+            'p95_ms': round(percentiles[94], 3),
+            'p99_ms': round(percentiles[98], 3),
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'queries': len(queries.captured_queries),
+            'peak_memory_kb': round(peak_memory / 1024, 1),
+        }
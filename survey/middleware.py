@@ -0,0 +1,78 @@
+import contextlib
+import random
+import time
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from survey import routers
+from survey.instrumentation import QueryRecorder, request_stats, instrumentation_configuration
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets the database router know that a request is being served, and by whom,
+    so its reads can go to the read replicas (see survey.routers)
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user_pk = request.user.pk if request.user.is_authenticated else None
+        token = routers.start_request(user_pk)
+        try:
+            return self.get_response(request)
+        finally:
+            routers.finish_request(token)
+
+
+class InstrumentationMiddleware:
+    """
+    Records the requests of a sample (sample_rate) of the requests in request_stats.
+    When INSTRUMENTATION is disabled the middleware removes itself, so it costs nothing.
+    Template render time is only known for TemplateResponse views (the class based ones),
+    function views render their templates inside the view. Queries are recorded on the connections
+    of the thread serving the request, so with ASYNC_VIEWS they are not seen.
+    """
+    def __init__(self, get_response):
+        if not instrumentation_configuration().get('enabled', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = instrumentation_configuration().get('sample_rate', 1.0)
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        request._render_timing = {}
+        start = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        latency = time.perf_counter() - start
+
+        match = request.resolver_match
+        request_stats.record(match.view_name if match else '<unresolved>', {
+            'latency_ms': latency * 1000,
+            'queries': recorder.queries,
+            'db_ms': recorder.seconds * 1000,
+            'render_ms': request._render_timing.get('ms'),
+            'response_bytes': None if response.streaming else len(response.content),
+            'slowest_sql_ms': round(recorder.slowest_seconds * 1000, 3) if recorder.slowest_sql else None,
+            'slowest_sql': recorder.slowest_sql,
+        })
+        return response
+
+    def process_template_response(self, request, response):
+        # Called right before the response is rendered
+        timing = getattr(request, '_render_timing', None)
+        if timing is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                timing['ms'] = (time.perf_counter() - start) * 1000
+
+            response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:27
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_ranking_counters(apps, schema_editor):
+    Question = apps.get_model('survey', 'Question')
+    Answer = apps.get_model('survey', 'Answer')
+    Vote = apps.get_model('survey', 'Vote')
+    db_alias = schema_editor.connection.alias
+
+    answer_points = settings.RANKING_CONFIGURATION.get('answer_points', 0)
+    like_points = settings.RANKING_CONFIGURATION.get('like_points', 0)
+    dislike_points = settings.RANKING_CONFIGURATION.get('dislike_points', 0)
+
+    counters = {}
+    for row in Answer.objects.using(db_alias).values('question').annotate(count=Count('pk')):
+        counters.setdefault(row['question'], [0, 0, 0])[0] = row['count']
+    for row in Vote.objects.using(db_alias).filter(is_like__isnull=False).values('question', 'is_like').annotate(count=Count('pk')):
+        counters.setdefault(row['question'], [0, 0, 0])[1 if row['is_like'] else 2] = row['count']
+
+    for question_id, (answers, likes, dislikes) in counters.items():
+        Question.objects.using(db_alias).filter(pk=question_id).update(
+            answer_count=answers,
+            like_count=likes,
+            dislike_count=dislikes,
+            base_points=answers * answer_points + likes * like_points + dislikes * dislike_points,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0003_alter_vote_is_like'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='answer_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Respuestas'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='base_points',
+            field=models.IntegerField(db_index=True, default=0, editable=False, verbose_name='Puntos base'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='dislike_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Dislikes'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Likes'),
+        ),
+        migrations.RunPython(fill_ranking_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:38
+
+from datetime import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_scores(apps, schema_editor):
+    Question = apps.get_model('survey', 'Question')
+    db_alias = schema_editor.connection.alias
+    daily_bonus_points = settings.RANKING_CONFIGURATION.get('daily_bonus_points', 0)
+    Question.objects.using(db_alias).update(score=F('base_points'))
+    Question.objects.using(db_alias).filter(created=datetime.today().date()).update(
+        daily_bonus=daily_bonus_points,
+        score=F('base_points') + daily_bonus_points,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0004_question_ranking_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='daily_bonus',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Bonus diario'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='score',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Puntos'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-score', 'id'], name='survey_question_ranking_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('daily_bonus', 0), _negated=True), fields=['created'], name='survey_question_today_idx'),
+        ),
+        migrations.RunPython(fill_scores, migrations.RunPython.noop),
+    ]
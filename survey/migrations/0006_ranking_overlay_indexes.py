@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-17 05:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0005_question_daily_bonus_bucket'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['author', 'question', 'value'], name='survey_answer_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['created', 'id'], name='survey_question_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['question', 'is_like'], name='survey_vote_question_like_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['author', 'question', 'is_like'], name='survey_vote_author_idx'),
+        ),
+    ]
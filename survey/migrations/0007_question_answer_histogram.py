@@ -0,0 +1,69 @@
+# Generated by Django 3.2.25 on 2026-10-17 05:53
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_answer_histograms(apps, schema_editor):
+    Question = apps.get_model('survey', 'Question')
+    Answer = apps.get_model('survey', 'Answer')
+    db_alias = schema_editor.connection.alias
+
+    histograms = {}
+    rows = Answer.objects.using(db_alias).filter(value__in=[1, 2, 3, 4, 5]).values('question', 'value').annotate(
+        count=Count('pk')
+    )
+    for row in rows:
+        histogram = histograms.setdefault(row['question'], {'value_count': 0, 'value_sum': 0})
+        histogram['value_{}_count'.format(row['value'])] = row['count']
+        histogram['value_count'] += row['count']
+        histogram['value_sum'] += row['count'] * row['value']
+
+    for question_id, histogram in histograms.items():
+        Question.objects.using(db_alias).filter(pk=question_id).update(**histogram)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0006_ranking_overlay_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='value_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Respuestas Muy Bajo'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='value_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Respuestas Bajo'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='value_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Respuestas Regular'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='value_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Respuestas Alto'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='value_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Respuestas Muy Alto'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='value_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Respuestas con valor'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='value_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Suma de respuestas'),
+        ),
+        migrations.RunPython(fill_answer_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:02
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_scores_to_shadow(apps, schema_editor):
+    # Without a shadow profile the shadow scores follow the active profile
+    Question = apps.get_model('survey', 'Question')
+    Question.objects.using(schema_editor.connection.alias).update(
+        shadow_daily_bonus=F('daily_bonus'), shadow_score=F('score')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0007_question_answer_histogram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Nombre')),
+                ('role', models.CharField(choices=[('active', 'Activo'), ('shadow', 'Sombra'), ('inactive', 'Inactivo')], default='inactive', max_length=10, verbose_name='Rol')),
+                ('version', models.PositiveIntegerField(default=0, editable=False, verbose_name='Versión')),
+                ('answer_points', models.IntegerField(default=0, verbose_name='Puntos por respuesta')),
+                ('like_points', models.IntegerField(default=0, verbose_name='Puntos por like')),
+                ('dislike_points', models.IntegerField(default=0, verbose_name='Puntos por dislike')),
+                ('daily_bonus_points', models.IntegerField(default=0, verbose_name='Bonus diario')),
+                ('decay_points', models.PositiveIntegerField(default=0, verbose_name='Puntos perdidos por día')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Modificado')),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='question',
+            name='survey_question_today_idx',
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='shadow_daily_bonus',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Bonus diario (perfil sombra)'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='shadow_score',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Puntos (perfil sombra)'),
+        ),
+        migrations.RunPython(copy_scores_to_shadow, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-shadow_score', 'id'], name='survey_question_shadow_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(models.Q(('daily_bonus', 0), _negated=True), models.Q(('shadow_daily_bonus', 0), _negated=True), _connector='OR'), fields=['created'], name='survey_question_today_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='rankingprofile',
+            constraint=models.UniqueConstraint(condition=models.Q(('role', 'inactive'), _negated=True), fields=('role',), name='survey_rankingprofile_role'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0008_ranking_profiles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hora'), ('day', 'Día')], max_length=4, verbose_name='Periodo')),
+                ('start', models.DateTimeField(verbose_name='Inicio')),
+                ('answers', models.IntegerField(default=0, verbose_name='Respuestas')),
+                ('likes', models.IntegerField(default=0, verbose_name='Likes')),
+                ('dislikes', models.IntegerField(default=0, verbose_name='Dislikes')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='survey.question', verbose_name='Pregunta')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='questionactivity',
+            index=models.Index(fields=['period', 'start', 'question'], name='survey_activity_window_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='questionactivity',
+            unique_together={('question', 'period', 'start')},
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+
+# External content FTS5 table over the title and description of the questions, see survey.search
+CREATE_SEARCH_INDEX = [
+    "CREATE VIRTUAL TABLE survey_question_fts USING fts5("
+    "title, description, content='survey_question', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER survey_question_fts_insert AFTER INSERT ON survey_question BEGIN "
+    "INSERT INTO survey_question_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+    "END",
+    "CREATE TRIGGER survey_question_fts_delete AFTER DELETE ON survey_question BEGIN "
+    "INSERT INTO survey_question_fts(survey_question_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "END",
+    # Only edits of the text reindex a question, not the counter updates of every answer and vote
+    "CREATE TRIGGER survey_question_fts_update AFTER UPDATE OF title, description ON survey_question BEGIN "
+    "INSERT INTO survey_question_fts(survey_question_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO survey_question_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+    "END",
+    "INSERT INTO survey_question_fts(survey_question_fts) VALUES ('rebuild')",
+]
+
+DROP_SEARCH_INDEX = [
+    'DROP TRIGGER IF EXISTS survey_question_fts_insert',
+    'DROP TRIGGER IF EXISTS survey_question_fts_delete',
+    'DROP TRIGGER IF EXISTS survey_question_fts_update',
+    'DROP TABLE IF EXISTS survey_question_fts',
+]
+
+
+def run(statements):
+    def run_statements(apps, schema_editor):
+        # Other databases search with icontains
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run_statements
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0009_question_activity'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SEARCH_INDEX), run(DROP_SEARCH_INDEX)),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0010_question_search'),
+    ]
+
+    # On SQLite this remakes the table, which drops the triggers of the search index:
+    # they are restored after the migrations (see survey.search.restore_search_triggers)
+    operations = [
+        migrations.AlterField(
+            model_name='question',
+            name='base_points',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Puntos base'),
+        ),
+    ]
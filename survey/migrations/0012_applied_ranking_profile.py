@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-17 07:09
+
+from django.db import migrations, models
+
+WEIGHTS = ('answer_points', 'like_points', 'dislike_points', 'daily_bonus_points', 'decay_points')
+
+
+def apply_current_profiles(apps, schema_editor):
+    # The stored scores already follow the active and shadow profiles, they were rescored when saved
+    RankingProfile = apps.get_model('survey', 'RankingProfile')
+    AppliedRankingProfile = apps.get_model('survey', 'AppliedRankingProfile')
+    AppliedRankingProfile.objects.bulk_create([
+        AppliedRankingProfile(role=profile.role, name=profile.name, version=profile.version, **{
+            weight: getattr(profile, weight) for weight in WEIGHTS
+        })
+        for profile in RankingProfile.objects.filter(role__in=['active', 'shadow'])
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0011_remove_question_base_points_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppliedRankingProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answer_points', models.IntegerField(default=0, verbose_name='Puntos por respuesta')),
+                ('like_points', models.IntegerField(default=0, verbose_name='Puntos por like')),
+                ('dislike_points', models.IntegerField(default=0, verbose_name='Puntos por dislike')),
+                ('daily_bonus_points', models.IntegerField(default=0, verbose_name='Bonus diario')),
+                ('decay_points', models.PositiveIntegerField(default=0, verbose_name='Puntos perdidos por día')),
+                ('role', models.CharField(choices=[('active', 'Activo'), ('shadow', 'Sombra')], max_length=10, unique=True, verbose_name='Rol')),
+                ('name', models.CharField(max_length=100, verbose_name='Nombre')),
+                ('version', models.PositiveIntegerField(verbose_name='Versión')),
+                ('applied', models.DateTimeField(auto_now_add=True, verbose_name='Aplicado')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(apply_current_profiles, migrations.RunPython.noop),
+    ]
@@ -1,44 +1,262 @@
-from datetime import datetime
+import collections
+import functools
+import operator
+from datetime import datetime, timedelta
 
-from django.db import models, IntegrityError
-from django.db.models import Count, Q, Case, When, Value, IntegerField
+from django.conf import settings
+from django.db import models, connections, IntegrityError
+from django.db.models import F, Q, Count, Sum, Value, IntegerField, FloatField, OuterRef, Subquery, Case, When
+from django.db.models.functions import Coalesce
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
-from django.conf import settings
+
+from survey.profiles import active_profile, shadow_profile, day_number
+from survey.search import SEARCH_TABLE, COLUMN_WEIGHTS, search_terms, match_expression, search_available
 
 
 User = get_user_model()
 
 
+def base_points_for(answers, likes, dislikes):
+    """
+    Returns the points given by answers, likes and dislikes, without the daily bonus,
+    according to the active ranking profile (see survey.profiles).
+    """
+    return active_profile().base_points(answers, likes, dislikes)
+
+
+def counted_expressions():
+    """
+    Correlated subqueries that count the answers, likes, dislikes and the answer values histogram
+    of each question from the raw tables. They can be used both in annotate and update.
+    """
+    def count_subquery(queryset):
+        counts = queryset.filter(question=OuterRef('pk')).order_by().values('question').annotate(
+            count=Count('pk')
+        ).values('count')
+        return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+    answered = Answer.objects.filter(question=OuterRef('pk'), value__in=HISTOGRAM_VALUES).order_by().values('question')
+    expressions = {
+        'counted_answers': count_subquery(Answer.objects.all()),
+        'counted_likes': count_subquery(Vote.objects.filter(is_like=True)),
+        'counted_dislikes': count_subquery(Vote.objects.filter(is_like=False)),
+        'counted_value_count': count_subquery(Answer.objects.filter(value__in=HISTOGRAM_VALUES)),
+        'counted_value_sum': Coalesce(Subquery(
+            answered.annotate(total=Sum('value')).values('total'), output_field=IntegerField()
+        ), Value(0)),
+    }
+    for value in HISTOGRAM_VALUES:
+        expressions['counted_{}'.format(histogram_field(value))] = count_subquery(Answer.objects.filter(value=value))
+    return expressions
+
+
+# Answer values counted in the histograms of the questions, 0 means not answered
+HISTOGRAM_VALUES = (1, 2, 3, 4, 5)
+
+
+def histogram_field(value):
+    return 'value_{}_count'.format(value)
+
+
+HISTOGRAM_FIELDS = tuple(histogram_field(value) for value in HISTOGRAM_VALUES) + ('value_count', 'value_sum')
+
+
+def histogram_deltas(old_value, new_value):
+    """
+    Returns the histogram counter deltas ({field: delta}) of changing an answer from old_value
+    to new_value, None means there was (or there is) no answer.
+    """
+    deltas = collections.Counter()
+    for value, sign in ((old_value, -1), (new_value, 1)):
+        if value in HISTOGRAM_VALUES:
+            deltas[histogram_field(value)] += sign
+            deltas['value_count'] += sign
+            deltas['value_sum'] += sign * value
+    return {field: delta for field, delta in deltas.items() if delta}
+
+
+def daily_bonus_for(created):
+    """
+    Returns the daily bonus of a question created on the given date (None means today)
+    """
+    today = datetime.today().date()
+    return active_profile().daily_bonus(day_number(created or today), day_number(today))
+
+
+def base_points_expression():
+    """
+    Same as base_points_for, but as an expression over the question counter fields
+    """
+    return active_profile().base_points_expression()
+
+
+ACTIVITY_PERIODS = (('hour', 'Hora'),
+                    ('day', 'Día'),)
+
+PERIOD_LENGTHS = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+
+
+def activity_bucket(period, moment=None):
+    """
+    Returns the start of the hourly or daily activity bucket of moment (now by default)
+    """
+    moment = moment or timezone.now()
+    start = moment.replace(minute=0, second=0, microsecond=0)
+    if period == 'day':
+        start = start.replace(hour=0)
+    return start
+
+
+def trending_configuration(period):
+    """Returns the (window, half_life) of a trending period, both in buckets"""
+    configuration = settings.TRENDING_CONFIGURATION[period]
+    return configuration.get('window', 1), configuration.get('half_life', 1)
+
+
 class QuestionQuerySet(models.QuerySet):
-    def ranked(self):
+    def ranked(self, shadow=False):
         """
         Question queryset that orders the questions by points.
-        It uses Count, Case and When instead of the points property because it was too slow.
-        It was not good when scaled.
+        It orders by the indexed score column of the active ranking profile (see survey.profiles),
+        or by the shadow_score one of the shadow profile, instead of aggregating answers and votes,
+        the counters are kept up to date on every write (see survey.signals).
+        total_points is the stored score, it's the points unless the profile has time decay
+        (Question.points are the shown ones).
+        Reading the ranking never writes: the daily bonus of yesterday's questions is removed
+        by the rollover_daily_bonus command, scheduled right after midnight.
 
         Usage:
         Question.objects.ranked()
+        Question.objects.ranked(shadow=True)
+        """
+        column = 'shadow_score' if shadow else 'score'
+        return self.annotate(total_points=F(column)).order_by('-{}'.format(column), 'pk')
+
+    def trending(self, period='hour', now=None):
+        """
+        Question queryset that orders the questions by their recent activity: the points (of the
+        active ranking profile) of the answers and votes of each hourly or daily bucket of the window,
+        halved every half_life buckets (see TRENDING_CONFIGURATION in settings).
+        Only reads the activity buckets of the window, so only the questions with recent activity
+        are listed. total_points is the decayed score.
+
+        Usage:
+        Question.objects.trending()
+        Question.objects.trending('day')
+        """
+        window, half_life = trending_configuration(period)
+        current = activity_bucket(period, now)
+        length = PERIOD_LENGTHS[period]
+        weight = Case(
+            *[
+                When(activity__start=current - length * age, then=Value(0.5 ** (age / half_life)))
+                for age in range(window)
+            ],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+        points = active_profile().base_points_expression(
+            F('activity__answers'), F('activity__likes'), F('activity__dislikes')
+        )
+        return self.filter(
+            activity__period=period, activity__start__gt=current - length * window
+        ).annotate(
+            total_points=Sum(points * weight, output_field=FloatField())
+        ).order_by('-total_points', 'pk')
+
+    def search(self, query, order=True):
+        """
+        Questions whose title or description have every word of query (see survey.search),
+        annotated with their search_rank (BM25, higher is better). With order they are ordered by it,
+        otherwise the order of the queryset is kept, e.g. to list the hits by points.
+        The FTS5 index returns the hits, the questions are not scanned.
+
+        Usage:
+        Question.objects.search('ejercicio')
+        Question.objects.ranked().search('ejercicio', order=False)
         """
-        answer_points = settings.RANKING_CONFIGURATION.get('answer_points', 0)
-        like_points = settings.RANKING_CONFIGURATION.get('like_points', 0)
-        dislike_points = settings.RANKING_CONFIGURATION.get('dislike_points', 0)
-        daily_bonus_points = settings.RANKING_CONFIGURATION.get('daily_bonus_points', 0)
-        return self.annotate(
-            total_points=(
-                Count('answers', distinct=True) * answer_points +
-                Count('votes', filter=Q(votes__is_like=True), distinct=True) * like_points +
-                Count('votes', filter=Q(votes__is_like=False), distinct=True) * dislike_points +
-                Case(
-                    When(
-                        created=datetime.today().date(),
-                        then=Value(daily_bonus_points)
-                    ),
-                    default=Value(0),
-                    output_field=IntegerField()
-                )
+        terms = search_terms(query)
+        if not terms:
+            return self.none()
+
+        if search_available(self.db):
+            # The index is joined once: each hit is matched and ranked a single time
+            quote = connections[self.db].ops.quote_name
+            pk = '{}.{}'.format(quote(self.model._meta.db_table), quote(self.model._meta.pk.column))
+            queryset = self.extra(
+                select={'search_rank': '-bm25({table}, %s, %s)'.format(table=SEARCH_TABLE)},
+                select_params=COLUMN_WEIGHTS,
+                tables=[SEARCH_TABLE],
+                where=['{table} MATCH %s'.format(table=SEARCH_TABLE), '{table}.rowid = {pk}'.format(
+                    table=SEARCH_TABLE, pk=pk
+                )],
+                params=[match_expression(terms)],
             )
-        ).order_by('-total_points')
+        else:
+            queryset = self.filter(functools.reduce(operator.and_, [
+                Q(title__icontains=term) | Q(description__icontains=term) for term in terms
+            ])).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+        return queryset.order_by('-search_rank', 'pk') if order else queryset
+
+    def rollover_daily_bonus(self, today=None):
+        """
+        Removes the daily bonus of the questions that are no longer from today, for both profiles.
+        Only reads the today bucket (questions that still have a bonus), it's indexed.
+        """
+        today = today or datetime.today().date()
+        return self.filter(Q(created__lt=today) & (~Q(daily_bonus=0) | ~Q(shadow_daily_bonus=0))).update(
+            daily_bonus=0,
+            score=F('score') - F('daily_bonus'),
+            shadow_daily_bonus=0,
+            shadow_score=F('shadow_score') - F('shadow_daily_bonus'),
+        )
+
+    def apply_daily_bonus(self, today=None, active=None, shadow=None):
+        """
+        Sets the daily bonus of the active and shadow profiles (the current ones by default)
+        to today's questions, after the profiles change
+        """
+        today = today or datetime.today().date()
+        active, shadow = active or active_profile(), shadow or shadow_profile()
+        return self.filter(created=today).exclude(
+            daily_bonus=active.daily_bonus_points, shadow_daily_bonus=shadow.daily_bonus_points
+        ).update(
+            daily_bonus=active.daily_bonus_points,
+            score=F('score') - F('daily_bonus') + active.daily_bonus_points,
+            shadow_daily_bonus=shadow.daily_bonus_points,
+            shadow_score=F('shadow_score') - F('shadow_daily_bonus') + shadow.daily_bonus_points,
+        )
+
+    def counted(self):
+        """
+        Annotates the ranking counters computed from the raw answers and votes tables
+        (counted_answers, counted_likes and counted_dislikes).
+        Slow, only used to rebuild and verify the denormalized counters.
+        """
+        return self.annotate(**counted_expressions())
+
+    def update_counters(self, answers=0, likes=0, dislikes=0, histogram=None):
+        """
+        Atomically adds the given deltas to the ranking counters (and the histogram counters,
+        see histogram_deltas) with F expressions, so concurrent writers never overwrite each other.
+
+        Usage:
+        Question.objects.filter(pk=question.pk).update_counters(likes=1)
+        Question.objects.filter(pk=question.pk).update_counters(answers=1, histogram=histogram_deltas(None, 5))
+        """
+        base_points = base_points_for(answers, likes, dislikes)
+        return self.update(
+            answer_count=F('answer_count') + answers,
+            like_count=F('like_count') + likes,
+            dislike_count=F('dislike_count') + dislikes,
+            base_points=F('base_points') + base_points,
+            score=F('score') + base_points,
+            shadow_score=F('shadow_score') + shadow_profile().base_points(answers, likes, dislikes),
+            **{field: F(field) + delta for field, delta in (histogram or {}).items()}
+        )
 
 
 class QuestionManager(models.Manager):
@@ -58,8 +276,17 @@ class QuestionManager(models.Manager):
     def get_queryset(self):
         return QuestionQuerySet(self.model, using=self._db)
 
-    def ranked(self):
-        return self.get_queryset().ranked()
+    def ranked(self, shadow=False):
+        return self.get_queryset().ranked(shadow=shadow)
+
+    def trending(self, period='hour', now=None):
+        return self.get_queryset().trending(period, now)
+
+    def search(self, query, order=True):
+        return self.get_queryset().search(query, order=order)
+
+    def counted(self):
+        return self.get_queryset().counted()
 
 
 class Question(models.Model):
@@ -73,47 +300,150 @@ class Question(models.Model):
     title = models.CharField('Título', max_length=200, blank=False, null=False)
     description = models.TextField('Descripción')
 
+    # Denormalized ranking counters, maintained incrementally by survey.signals
+    # and rebuilt with the rebuild_ranking_counters command
+    answer_count = models.PositiveIntegerField('Respuestas', default=0, editable=False)
+    like_count = models.PositiveIntegerField('Likes', default=0, editable=False)
+    dislike_count = models.PositiveIntegerField('Dislikes', default=0, editable=False)
+    base_points = models.IntegerField('Puntos base', default=0, editable=False)
+    # Daily bonus while the question is in the today bucket, score is base_points + daily_bonus
+    # (plus the time decay offset, see survey.profiles) of the active ranking profile
+    daily_bonus = models.IntegerField('Bonus diario', default=0, editable=False)
+    score = models.IntegerField('Puntos', default=0, editable=False)
+    # The same for the shadow ranking profile, to compare a new formula with the active one
+    shadow_daily_bonus = models.IntegerField('Bonus diario (perfil sombra)', default=0, editable=False)
+    shadow_score = models.IntegerField('Puntos (perfil sombra)', default=0, editable=False)
+
+    # Histogram of the answer values (1 to 5), maintained like the ranking counters,
+    # so the mean, median and distribution don't need to aggregate the answers
+    value_1_count = models.PositiveIntegerField('Respuestas Muy Bajo', default=0, editable=False)
+    value_2_count = models.PositiveIntegerField('Respuestas Bajo', default=0, editable=False)
+    value_3_count = models.PositiveIntegerField('Respuestas Regular', default=0, editable=False)
+    value_4_count = models.PositiveIntegerField('Respuestas Alto', default=0, editable=False)
+    value_5_count = models.PositiveIntegerField('Respuestas Muy Alto', default=0, editable=False)
+    value_count = models.PositiveIntegerField('Respuestas con valor', default=0, editable=False)
+    value_sum = models.PositiveIntegerField('Suma de respuestas', default=0, editable=False)
+
+    COUNTER_FIELDS = (
+        'answer_count', 'like_count', 'dislike_count', 'base_points', 'score', 'shadow_score'
+    ) + HISTOGRAM_FIELDS
+
     objects = QuestionManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', 'id'], name='survey_question_ranking_idx'),
+            models.Index(fields=['-shadow_score', 'id'], name='survey_question_shadow_idx'),
+            # Today bucket, the questions that have to be demoted by the daily bonus rollover
+            models.Index(
+                fields=['created'], condition=~Q(daily_bonus=0) | ~Q(shadow_daily_bonus=0),
+                name='survey_question_today_idx',
+            ),
+            # Date filters, like setting the daily bonus of today's questions
+            models.Index(fields=['created', 'id'], name='survey_question_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'created' in field_names and 'daily_bonus' in field_names and 'shadow_daily_bonus' in field_names:
+            instance._loaded_day = (instance.created, instance.daily_bonus, instance.shadow_daily_bonus)
+        return instance
+
+    def save(self, *args, **kwargs):
+        today = datetime.today().date()
+        active, shadow = active_profile(), shadow_profile()
+        created_day, today_day = day_number(self.created or today), day_number(today)
+        self.daily_bonus = active.daily_bonus(created_day, today_day)
+        self.shadow_daily_bonus = shadow.daily_bonus(created_day, today_day)
+        if self._state.adding:
+            counters = (self.answer_count, self.like_count, self.dislike_count)
+            self.base_points = active.base_points(*counters)
+            self.score = active.score(*counters, created_day, today_day)
+            self.shadow_score = shadow.score(*counters, created_day, today_day)
+            super().save(*args, **kwargs)
+            self._loaded_day = (self.created, self.daily_bonus, self.shadow_daily_bonus)
+            return
+
+        # Counters are only written through F expressions, a full save of a stale instance
+        # (e.g. from QuestionUpdateView) must not overwrite them
+        if kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+        # The date changed, the question enters or leaves the today bucket (and its time decay changes)
+        loaded_day = (self.created, self.daily_bonus, self.shadow_daily_bonus)
+        if getattr(self, '_loaded_day', None) != loaded_day:
+            Question.objects.filter(pk=self.pk).update(
+                score=active.score_expression(today),
+                shadow_score=shadow.score_expression(today),
+            )
+            self.refresh_from_db(fields=['score', 'shadow_score'])
+            self._loaded_day = loaded_day
+
     def get_absolute_url(self):
         return reverse('survey:question-edit', args=[self.pk])
 
     @property
     def is_today(self):
+        """
+        If the question gets the daily bonus. Same as being in the today bucket after the daily rollover.
+        """
         return self.created == datetime.today().date()
 
     @property
     def points(self):
         """
         Returns the amount of points the question has, depending on its answers, likes, dislikes,
-        if it was created today, and ranking configuration in settings.
+        if it was created today, its age, and the active ranking profile.
 
-        Used only for individual objects, not querysets.
+        Uses the denormalized score, so it doesn't run any query and it's safe to render
+        it for every row of a list.
         """
-        answers = self.answers.all().count()
-        likes = self.votes.filter(is_like=True).count()
-        dislikes = self.votes.filter(is_like=False).count()
+        return self._points_for(active_profile(), self.score, self.daily_bonus)
+
+    @property
+    def shadow_points(self):
+        """Same as points, for the shadow ranking profile"""
+        return self._points_for(shadow_profile(), self.shadow_score, self.shadow_daily_bonus)
 
-        answer_points = settings.RANKING_CONFIGURATION.get('answer_points', 0)
-        likes_points = settings.RANKING_CONFIGURATION.get('like_points', 0)
-        dislikes_points = settings.RANKING_CONFIGURATION.get('dislike_points', 0)
-        daily_bonus_points = settings.RANKING_CONFIGURATION.get('daily_bonus_points', 0)
+    def _points_for(self, profile, score, stored_daily_bonus):
+        today = datetime.today().date()
+        return profile.points(score, stored_daily_bonus, day_number(self.created or today), day_number(today))
 
-        # Calculate points without daily bonus
-        total_points = (
-            answers * answer_points +
-            likes * likes_points +
-            dislikes * dislikes_points
-        )
+    @property
+    def value_histogram(self):
+        """Amount of answers of each value, {value: amount}"""
+        return {value: getattr(self, histogram_field(value)) for value in HISTOGRAM_VALUES}
 
-        # Apply daily bonus if it's today's question
-        if self.is_today:
-            total_points += daily_bonus_points
+    @property
+    def value_mean(self):
+        """Mean of the answer values, None without answers"""
+        if not self.value_count:
+            return None
+        return self.value_sum / self.value_count
+
+    @property
+    def value_median(self):
+        """Median of the answer values, from the histogram. None without answers"""
+        if not self.value_count:
+            return None
 
-        return total_points
+        def value_at(position):
+            seen = 0
+            for value, amount in self.value_histogram.items():
+                seen += amount
+                if seen > position:
+                    return value
+
+        # The middle value, or the mean of the two middle values
+        return (value_at((self.value_count - 1) // 2) + value_at(self.value_count // 2)) / 2
 
 
 class AnswerManager(models.Manager):
@@ -148,6 +478,18 @@ class Answer(models.Model):
 
     class Meta:
         unique_together = ('author', 'question')
+        indexes = [
+            # Covers the answers of a user for a page of questions (see survey.overlay)
+            models.Index(fields=['author', 'question', 'value'], name='survey_answer_author_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Keeps the stored value so a change can move it to its new histogram bucket
+        if 'value' in field_names:
+            instance._loaded_value = instance.value
+        return instance
 
     def __str__(self):
         return '{question} - {author}:{value}'.format(question=self.question, author=self.author, value=self.value)
@@ -160,6 +502,20 @@ class Vote(models.Model):
 
     class Meta:
         unique_together = ('author', 'question')
+        indexes = [
+            # Covers the likes and dislikes counts of a question
+            models.Index(fields=['question', 'is_like'], name='survey_vote_question_like_idx'),
+            # Covers the votes of a user for a page of questions (see survey.overlay)
+            models.Index(fields=['author', 'question', 'is_like'], name='survey_vote_author_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Keeps the stored value so a toggle can move the counters from likes to dislikes
+        if 'is_like' in field_names:
+            instance._loaded_is_like = instance.is_like
+        return instance
 
     def __str__(self):
         return '{question} - {author}:{like}'.format(
@@ -167,3 +523,99 @@ class Vote(models.Model):
             author=self.author,
             like='like' if self.is_like else 'dislike'
         )
+
+
+class QuestionActivityQuerySet(models.QuerySet):
+    def expired(self, now=None):
+        """Buckets older than the trending window of their period"""
+        expired = Q()
+        for period, _ in ACTIVITY_PERIODS:
+            window, _ = trending_configuration(period)
+            start = activity_bucket(period, now) - PERIOD_LENGTHS[period] * (window - 1)
+            expired |= Q(period=period, start__lt=start)
+        return self.filter(expired)
+
+
+class QuestionActivity(models.Model):
+    """
+    Answers and votes of a question in an hour or a day, the source of the trending ranking.
+    Only new answers and votes are counted, a changed vote counts as a new one with its new value
+    (e.g. a like changed to a dislike in the same bucket leaves likes=1 and dislikes=1), so the
+    counts are never negative. Maintained on every write, like the question counters.
+    """
+    question = models.ForeignKey(Question, related_name='activity', verbose_name='Pregunta', on_delete=models.CASCADE)
+    period = models.CharField('Periodo', max_length=4, choices=ACTIVITY_PERIODS)
+    start = models.DateTimeField('Inicio')
+    answers = models.IntegerField('Respuestas', default=0)
+    likes = models.IntegerField('Likes', default=0)
+    dislikes = models.IntegerField('Dislikes', default=0)
+
+    objects = QuestionActivityQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('question', 'period', 'start')
+        indexes = [
+            # Covers the window of a period, the trending ranking only reads it
+            models.Index(fields=['period', 'start', 'question'], name='survey_activity_window_idx'),
+        ]
+
+    def __str__(self):
+        return '{question} - {period} {start}'.format(question=self.question, period=self.period, start=self.start)
+
+
+class RankingWeights(models.Model):
+    """Weights, daily bonus and time decay of a ranking formula (see survey.profiles)"""
+    answer_points = models.IntegerField('Puntos por respuesta', default=0)
+    like_points = models.IntegerField('Puntos por like', default=0)
+    dislike_points = models.IntegerField('Puntos por dislike', default=0)
+    daily_bonus_points = models.IntegerField('Bonus diario', default=0)
+    decay_points = models.PositiveIntegerField('Puntos perdidos por día', default=0)
+
+    class Meta:
+        abstract = True
+
+
+class RankingProfile(RankingWeights):
+    """
+    A ranking formula, as configured. Only one profile can be the active one and one the shadow one,
+    every change increases the version.
+    Changes are not served right away: the ranking and the points keep using the applied profiles
+    (see AppliedRankingProfile) until rescore_questions rescores the questions with these ones.
+    """
+    ROLES = (('active', 'Activo'),
+             ('shadow', 'Sombra'),
+             ('inactive', 'Inactivo'),)
+
+    name = models.CharField('Nombre', max_length=100, unique=True)
+    role = models.CharField('Rol', max_length=10, choices=ROLES, default='inactive')
+    version = models.PositiveIntegerField('Versión', default=0, editable=False)
+    updated = models.DateTimeField('Modificado', auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['role'], condition=~Q(role='inactive'), name='survey_rankingprofile_role'),
+        ]
+
+    def __str__(self):
+        return '{name} v{version} ({role})'.format(name=self.name, version=self.version, role=self.get_role_display())
+
+    def save(self, *args, **kwargs):
+        self.version += 1
+        super().save(*args, **kwargs)
+
+
+class AppliedRankingProfile(RankingWeights):
+    """
+    The active and shadow profiles the stored scores follow, the ones served by the ranking and the points.
+    Only written by rescore_questions, in the transaction that rescores the questions.
+    """
+    ROLES = (('active', 'Activo'),
+             ('shadow', 'Sombra'),)
+
+    role = models.CharField('Rol', max_length=10, choices=ROLES, unique=True)
+    name = models.CharField('Nombre', max_length=100)
+    version = models.PositiveIntegerField('Versión')
+    applied = models.DateTimeField('Aplicado', auto_now_add=True)
+
+    def __str__(self):
+        return '{name} v{version} ({role})'.format(name=self.name, version=self.version, role=self.get_role_display())
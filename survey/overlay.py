@@ -0,0 +1,67 @@
+import hashlib
+
+from django.core.cache import cache
+
+from survey.models import Answer, Vote
+from survey.routers import pin_user
+from survey.versions import get_version, bump_version
+
+
+def version_key(user_pk):
+    return 'survey:interactions-version:{}'.format(user_pk)
+
+
+def invalidate_user_interactions(user_pk):
+    """
+    Called on every answer or vote write of the user, so their cached interactions are not used anymore
+    and their next reads see the write
+    """
+    bump_version(version_key(user_pk))
+    pin_user(user_pk)
+
+
+def user_interactions(user_pk, question_pks):
+    """
+    Returns the answers and votes of a user for the given questions, as {question_pk: (value, is_like)}.
+    It's cached until the user answers or votes again.
+    """
+    question_pks = sorted(question_pks)
+    version = get_version(version_key(user_pk))
+    key = 'survey:interactions:{user}:{version}:{pks}'.format(
+        user=user_pk,
+        version=version,
+        pks=hashlib.md5(','.join(str(pk) for pk in question_pks).encode()).hexdigest()
+    )
+
+    interactions = cache.get(key)
+    if interactions is None:
+        values = dict(Answer.objects.filter(author_id=user_pk, question_id__in=question_pks).values_list(
+            'question_id', 'value'
+        ))
+        votes = dict(Vote.objects.filter(author_id=user_pk, question_id__in=question_pks).values_list(
+            'question_id', 'is_like'
+        ))
+        interactions = {pk: (values.get(pk, 0), votes.get(pk)) for pk in question_pks if pk in values or pk in votes}
+        cache.set(key, interactions)
+
+    # The journal writes through survey.signals, which imports this module
+    from survey.journal import journal
+    if journal.enabled:
+        # Votes that are still in the write-behind journal
+        for question_pk, is_like in journal.pending_for(user_pk).items():
+            if question_pk in question_pks:
+                interactions[question_pk] = (interactions.get(question_pk, (0, None))[0], is_like)
+
+    return interactions
+
+
+def overlay_interactions(user, questions):
+    """
+    Sets user_value (answer value) and is_like (if the user liked or disliked the question)
+    in each of the questions of a page, so the page itself can be shared by every user.
+    """
+    if not user.is_authenticated:
+        return
+    interactions = user_interactions(user.pk, [question.pk for question in questions])
+    for question in questions:
+        question.user_value, question.is_like = interactions.get(question.pk, (0, None))
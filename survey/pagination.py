@@ -0,0 +1,125 @@
+import base64
+import binascii
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+def encode_cursor(direction, question):
+    """
+    Opaque cursor pointing before ('p') or after ('n') a ranked question
+    """
+    raw = '{direction}:{points}:{pk}'.format(direction=direction, points=question.total_points, pk=question.pk)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Returns (direction, total_points, pk) of a cursor, raises Http404 if it's not valid
+    """
+    try:
+        direction, points, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        if direction not in ('n', 'p'):
+            raise ValueError(direction)
+        return direction, int(points), int(pk)
+    except (ValueError, UnicodeError, binascii.Error):
+        raise Http404('Invalid cursor')
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator that caches the amount of objects for a while, instead of counting
+    the whole ranked queryset on every request.
+    """
+    def __init__(self, object_list, per_page, count_queryset=None, count_cache_key=None, count_timeout=60, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_queryset = count_queryset
+        self.count_cache_key = count_cache_key
+        self.count_timeout = count_timeout
+
+    @cached_property
+    def count(self):
+        if self.count_cache_key is None:
+            return super().count
+        return cache.get_or_set(self.count_cache_key, self.count_queryset.count, self.count_timeout)
+
+
+class KeysetPage:
+    """
+    Page of a keyset paginated ranked queryset. It doesn't know its number, only how to get to
+    the previous and next pages.
+    """
+    number = None
+
+    def __init__(self, object_list, paginator, has_previous, has_next):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous() and self.object_list:
+            return encode_cursor('p', self.object_list[0])
+        return None
+
+    @property
+    def next_cursor(self):
+        if self.has_next() and self.object_list:
+            return encode_cursor('n', self.object_list[-1])
+        return None
+
+
+class KeysetPaginator:
+    """
+    Seek pagination over Question.objects.ranked(), keyed on (total_points, pk).
+    Each page is read with a comparison against the cursor instead of an OFFSET,
+    so deep pages are as fast as the first one, and questions don't move between pages
+    because of the ones that were voted before them.
+
+    Usage:
+    page = KeysetPaginator(Question.objects.ranked(), 20).page(cursor)
+    """
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = per_page
+
+    def page(self, cursor):
+        direction, points, pk = decode_cursor(cursor)
+
+        if direction == 'n':
+            # Questions after the cursor: fewer points, or the same points and a greater pk
+            queryset = self.object_list.filter(Q(total_points__lt=points) | Q(total_points=points, pk__gt=pk))
+        else:
+            queryset = self.object_list.filter(
+                Q(total_points__gt=points) | Q(total_points=points, pk__lt=pk)
+            ).reverse()
+
+        # One extra row tells if there is another page in that direction
+        object_list = list(queryset[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+
+        if direction == 'n':
+            return KeysetPage(object_list, self, has_previous=True, has_next=has_more)
+
+        object_list.reverse()
+        return KeysetPage(object_list, self, has_previous=has_more, has_next=True)
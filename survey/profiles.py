@@ -0,0 +1,237 @@
+"""
+Ranking profiles: the weights, daily bonus and time decay of a ranking formula.
+
+Profiles are configured in the database (see RankingProfile). The active one gives the score column,
+used by the ranking and the points, and the shadow one (if any) gives the shadow_score column,
+maintained by the same writes, so a new formula can be compared with the current one on real data.
+Without an active profile, RANKING_CONFIGURATION from settings is the active profile,
+and without a shadow profile the shadow scores follow the active profile.
+
+The served profiles are the applied ones (see AppliedRankingProfile): a configured change only takes
+effect when rescore_questions rescores every question with it and applies it in the same transaction,
+so the stored scores and the formula of the points always match.
+
+Each profile is compiled once per process into a CompiledProfile: the formula as a Python function
+(that also works with NumPy arrays) and as ORM expressions. The compiled profiles are reloaded when
+the profiles version changes (applying profiles bumps it), which is checked at most every
+check_interval seconds (see RANKING_PROFILES in settings), so all the workers pick up the changes.
+
+Time decay is linear: a question loses decay_points points per day of age. Subtracting the same
+amount (decay_points * today) from every question doesn't change the order, so the stored score adds
+decay_points * the day the question was created instead, and never has to be updated as days go by.
+"""
+import threading
+import time
+from datetime import date, datetime
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Case, When, Value, Func, IntegerField
+
+from survey.versions import get_version, bump_version
+
+PROFILES_VERSION_KEY = 'survey:ranking-profiles-version'
+
+EPOCH = date(1970, 1, 1)
+
+
+def day_number(day):
+    """Days from EPOCH to day"""
+    return day.toordinal() - EPOCH.toordinal()
+
+
+class DayNumber(Func):
+    """SQL version of day_number, for a date column"""
+    output_field = IntegerField()
+    template = "(%(expressions)s - DATE '1970-01-01')"
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template='CAST(julianday(%(expressions)s) - 2440587.5 AS INTEGER)', **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='(TO_DAYS(%(expressions)s) - 719528)', **extra_context)
+
+
+WEIGHTS = ('answer_points', 'like_points', 'dislike_points', 'daily_bonus_points', 'decay_points')
+
+
+class CompiledProfile:
+    """
+    The formula of a ranking profile. The stored score of a question is
+    base points + daily bonus (while it's from today) + decay_points * the day it was created.
+
+    Usage:
+    profile = active_profile()
+    profile.base_points(answers=2, likes=1, dislikes=0)
+    Question.objects.update(shadow_score=shadow_profile().score_expression(today))
+    """
+    def __init__(self, name, version, answer_points=0, like_points=0, dislike_points=0, daily_bonus_points=0,
+                 decay_points=0):
+        self.name = name
+        self.version = version
+        self.answer_points = answer_points
+        self.like_points = like_points
+        self.dislike_points = dislike_points
+        self.daily_bonus_points = daily_bonus_points
+        self.decay_points = decay_points
+
+    @classmethod
+    def from_configuration(cls, configuration, name='settings', version=0):
+        return cls(name, version, **{
+            weight: configuration.get(weight, 0)
+            for weight in WEIGHTS
+        })
+
+    @classmethod
+    def from_profile(cls, profile):
+        return cls(
+            profile.name, profile.version, profile.answer_points, profile.like_points, profile.dislike_points,
+            profile.daily_bonus_points, profile.decay_points,
+        )
+
+    def __repr__(self):
+        return '<CompiledProfile {} v{}>'.format(self.name, self.version)
+
+    def base_points(self, answers, likes, dislikes):
+        """Points of the counters, they can be numbers, arrays or expressions"""
+        return answers * self.answer_points + likes * self.like_points + dislikes * self.dislike_points
+
+    def daily_bonus(self, created_day, today_day):
+        """Daily bonus of a question created on created_day (day numbers, or arrays of them)"""
+        return (created_day == today_day) * self.daily_bonus_points
+
+    def score(self, answers, likes, dislikes, created_day, today_day):
+        """Stored score of a question, the one it's ranked by"""
+        return (
+            self.base_points(answers, likes, dislikes) +
+            self.daily_bonus(created_day, today_day) +
+            self.decay_points * created_day
+        )
+
+    def points(self, score, stored_daily_bonus, created_day, today_day):
+        """
+        Points shown for a stored score. The daily bonus is the one of today, even if the score
+        still has yesterday's one because the daily rollover didn't run yet.
+        """
+        return (
+            score - stored_daily_bonus + self.daily_bonus(created_day, today_day) -
+            self.decay_points * today_day
+        )
+
+    def base_points_expression(self, answers=F('answer_count'), likes=F('like_count'), dislikes=F('dislike_count')):
+        return self.base_points(answers, likes, dislikes)
+
+    def daily_bonus_expression(self, today):
+        if not self.daily_bonus_points:
+            return Value(0)
+        return Case(When(created=today, then=Value(self.daily_bonus_points)), default=Value(0))
+
+    def score_expression(self, today, **counters):
+        """The stored score computed from the counters of the row, or from the given counter expressions"""
+        expression = self.base_points_expression(**counters) + self.daily_bonus_expression(today)
+        if self.decay_points:
+            expression += DayNumber(F('created')) * self.decay_points
+        return expression
+
+
+class ProfileRegistry:
+    """
+    The compiled active and shadow profiles of this process
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked = None
+        self._profiles = {}
+
+    def get(self, role):
+        check_interval = getattr(settings, 'RANKING_PROFILES', {}).get('check_interval', 1)
+        now = time.monotonic()
+        if self._checked is None or now - self._checked >= check_interval:
+            version = cache.get(PROFILES_VERSION_KEY)
+            if version is None and self._version is not None:
+                # Evicted or cleared, the profiles didn't change since (a change sets a new version)
+                cache.add(PROFILES_VERSION_KEY, self._version, None)
+                version = self._version
+            if version is None or version != self._version:
+                self.load(get_version(PROFILES_VERSION_KEY))
+            self._checked = now
+
+        profile = self._profiles.get(role)
+        if profile is None and role == 'shadow':
+            return self.get('active')
+        if profile is None:
+            # Read on every call, like the settings used to be
+            return CompiledProfile.from_configuration(settings.RANKING_CONFIGURATION)
+        return profile
+
+    def load(self, version):
+        AppliedRankingProfile = apps.get_model('survey', 'AppliedRankingProfile')
+        profiles = {
+            profile.role: CompiledProfile.from_profile(profile) for profile in AppliedRankingProfile.objects.all()
+        }
+        with self._lock:
+            self._profiles = profiles
+            self._version = version
+
+    def invalidate(self):
+        """Reloads the profiles on the next use in this process"""
+        with self._lock:
+            self._version = None
+            self._checked = None
+
+
+profiles = ProfileRegistry()
+
+
+def active_profile():
+    return profiles.get('active')
+
+
+def shadow_profile():
+    return profiles.get('shadow')
+
+
+def profiles_changed():
+    """After the applied profiles change: this process reloads them right away, the others after the commit"""
+    profiles.invalidate()
+    transaction.on_commit(lambda: bump_version(PROFILES_VERSION_KEY))
+
+
+def configured_profiles():
+    """
+    The active and shadow RankingProfile rows, as {role: profile}. They are not served until they are applied
+    """
+    RankingProfile = apps.get_model('survey', 'RankingProfile')
+    return {profile.role: profile for profile in RankingProfile.objects.filter(role__in=['active', 'shadow'])}
+
+
+def compile_profiles(configured):
+    """The (active, shadow) CompiledProfile of configured profiles, with the same fallbacks as the served ones"""
+    active = configured.get('active')
+    active = CompiledProfile.from_profile(active) if active else CompiledProfile.from_configuration(
+        settings.RANKING_CONFIGURATION
+    )
+    shadow = configured.get('shadow')
+    return active, CompiledProfile.from_profile(shadow) if shadow else active
+
+
+def apply_profiles(configured):
+    """Serves the configured profiles ({role: profile}), once the questions were rescored with them"""
+    AppliedRankingProfile = apps.get_model('survey', 'AppliedRankingProfile')
+    AppliedRankingProfile.objects.all().delete()
+    AppliedRankingProfile.objects.bulk_create([
+        AppliedRankingProfile(role=role, name=profile.name, version=profile.version, **{
+            weight: getattr(profile, weight) for weight in WEIGHTS
+        })
+        for role, profile in configured.items()
+    ])
+    profiles_changed()
+
+
+def today_day():
+    return day_number(datetime.today().date())
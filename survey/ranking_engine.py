@@ -0,0 +1,157 @@
+from datetime import datetime
+
+import numpy as np
+from django.db import connection, transaction
+
+from survey.models import Question
+from survey.leaderboard import leaderboard
+from survey.versions import bump_all_question_versions
+from survey.profiles import CompiledProfile, active_profile, shadow_profile, day_number
+
+
+class RankingEngine:
+    """
+    Offline rescoring of every question with NumPy, for when the ranking profiles change
+    (see survey.profiles). It scores with the given profiles, or the served ones by default,
+    or with the given configuration.
+
+    The counters of the questions are streamed from the database in chunks of pk ranges,
+    scored with array arithmetic (the same formula as Question.objects.ranked() and Question.points)
+    and only the questions whose base points or score changed are written back.
+    The shadow scores are recomputed in SQL, chunk by chunk.
+    A row is only overwritten if its counters didn't change since it was read, rows that were voted
+    or answered in the meantime are skipped and counted, running it again picks them up.
+
+    Usage:
+    RankingEngine(chunk_size=10000).rescore(dry_run=True)
+    """
+    def __init__(self, configuration=None, chunk_size=10000, today=None, shadow=None, profile=None):
+        if configuration is not None:
+            self.profile = CompiledProfile.from_configuration(configuration)
+        else:
+            self.profile = profile or active_profile()
+        self.shadow = shadow or shadow_profile()
+        self.chunk_size = chunk_size
+        self.today = today or datetime.today().date()
+
+    def chunks(self):
+        """
+        Yields the questions in chunks of arrays: pk, answers, likes, dislikes, created (as day numbers),
+        and the current base points and score
+        """
+        last_pk = 0
+        while True:
+            rows = list(
+                Question.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+                    'pk', 'answer_count', 'like_count', 'dislike_count', 'created', 'base_points', 'score'
+                )[:self.chunk_size]
+            )
+            if not rows:
+                return
+            last_pk = rows[-1][0]
+
+            pks, answers, likes, dislikes, created, base_points, score = zip(*rows)
+            yield {
+                'pk': np.array(pks, dtype=np.int64),
+                'answers': np.array(answers, dtype=np.int64),
+                'likes': np.array(likes, dtype=np.int64),
+                'dislikes': np.array(dislikes, dtype=np.int64),
+                'created': np.fromiter((day_number(day) for day in created), dtype=np.int64, count=len(rows)),
+                'base_points': np.array(base_points, dtype=np.int64),
+                'score': np.array(score, dtype=np.int64),
+            }
+
+    def score(self, chunk):
+        """
+        Returns the (base_points, total_points) arrays of a chunk, total_points is the stored score
+        """
+        counters = (chunk['answers'], chunk['likes'], chunk['dislikes'])
+        return (
+            self.profile.base_points(*counters),
+            self.profile.score(*counters, chunk['created'], day_number(self.today)),
+        )
+
+    def write(self, chunk, base_points, indexes):
+        """
+        Writes the new base points (and score) of the rows at indexes, guarded by the counters that were read,
+        with one prepared UPDATE executed for every row.
+        Returns the amount of rows that weren't written because their counters changed.
+        """
+        quote = connection.ops.quote_name
+        # The daily bonus follows the profile afterwards, see rescore
+        sql = (
+            'UPDATE {table} SET {base_points} = %s, {score} = %s + {daily_bonus} '
+            'WHERE {pk} = %s AND {answers} = %s AND {likes} = %s AND {dislikes} = %s'
+        ).format(
+            table=quote(Question._meta.db_table), base_points=quote('base_points'), score=quote('score'),
+            daily_bonus=quote('daily_bonus'), pk=quote(Question._meta.pk.column), answers=quote('answer_count'),
+            likes=quote('like_count'), dislikes=quote('dislike_count'),
+        )
+        decay = chunk['created'] * self.profile.decay_points
+        rows = [
+            (
+                int(base_points[index]), int(base_points[index] + decay[index]), int(chunk['pk'][index]),
+                int(chunk['answers'][index]), int(chunk['likes'][index]), int(chunk['dislikes'][index]),
+            )
+            for index in indexes
+        ]
+        if not rows:
+            return 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+            written = cursor.rowcount
+        return len(rows) - written
+
+    def rescore(self, dry_run=False, progress=None, diff_size=20):
+        """
+        Rescores every question. With dry_run nothing is written, the result has the
+        biggest differences instead.
+        progress is called after each chunk with the amount of questions processed.
+        Returns a dict with the amount of questions, changed, skipped and the diff:
+        a list of (pk, old base points, new base points)
+        Once the rescore is committed the leaderboard is rebuilt and every cached page and card is dropped.
+        """
+        result = {'questions': 0, 'changed': 0, 'skipped': 0, 'diff': []}
+        for chunk in self.chunks():
+            base_points, total_points = self.score(chunk)
+            changed = (base_points != chunk['base_points']) | (total_points != chunk['score'])
+
+            result['questions'] += len(chunk['pk'])
+            result['changed'] += int(changed.sum())
+
+            if dry_run:
+                result['diff'].extend(zip(
+                    chunk['pk'][changed].tolist(),
+                    chunk['base_points'][changed].tolist(),
+                    base_points[changed].tolist(),
+                ))
+                result['diff'].sort(key=lambda row: abs(row[2] - row[1]), reverse=True)
+                del result['diff'][diff_size:]
+            else:
+                result['skipped'] += self.write(chunk, base_points, np.flatnonzero(changed))
+                self.write_shadow(chunk)
+
+            if progress:
+                progress(result['questions'])
+
+        if not dry_run:
+            Question.objects.all().rollover_daily_bonus(self.today)
+            Question.objects.all().apply_daily_bonus(self.today, self.profile, self.shadow)
+            transaction.on_commit(rescored)
+
+        return result
+
+    def write_shadow(self, chunk):
+        """
+        Recomputes the shadow scores of the pk range of a chunk from the counters of each row,
+        so concurrent writes can't make them stale
+        """
+        Question.objects.filter(pk__gte=int(chunk['pk'][0]), pk__lte=int(chunk['pk'][-1])).update(
+            shadow_daily_bonus=self.shadow.daily_bonus_expression(self.today),
+            shadow_score=self.shadow.score_expression(self.today),
+        )
+
+
+def rescored():
+    leaderboard.invalidate()
+    bump_all_question_versions()
@@ -0,0 +1,81 @@
+"""
+Routes the reads of the survey models in web requests to the read replicas (see REPLICA_CONFIGURATION in settings).
+
+Writes, reads inside transactions and everything that doesn't happen during a request
+(commands and their on_commit callbacks) use the primary. A user who just answered, voted or
+saved a question reads from the primary for a few seconds (see pin_user), so their own writes
+don't flicker while the replicas catch up. What a request rendered from a replica may be behind
+the primary, so it must not be cached under the current versions (see read_from_replica).
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+request_state = ContextVar('survey_request_state', default=None)
+
+
+def replica_configuration():
+    return getattr(settings, 'REPLICA_CONFIGURATION', {})
+
+
+def sticky_key(user_pk):
+    return 'survey:primary-reads:{}'.format(user_pk)
+
+
+def start_request(user_pk=None):
+    """
+    Called when a request starts, its reads will use the primary if the user wrote recently.
+    Returns the token to pass to finish_request.
+    """
+    pinned = user_pk is not None and cache.get(sticky_key(user_pk)) is not None
+    return request_state.set({'pinned': pinned, 'replica_reads': False})
+
+
+def finish_request(token):
+    request_state.reset(token)
+
+
+def pin_user(user_pk):
+    """Sends the reads of the user to the primary for the next few seconds (and for the rest of the request)"""
+    cache.set(sticky_key(user_pk), True, replica_configuration().get('sticky_seconds', 15))
+    state = request_state.get()
+    if state is not None:
+        state['pinned'] = True
+
+
+def read_from_replica():
+    """If any read of the current request went to a replica, which can be lagging behind the primary"""
+    state = request_state.get()
+    return state is not None and state['replica_reads']
+
+
+class ReplicaRouter:
+    def _databases(self):
+        return [DEFAULT_DB_ALIAS] + list(replica_configuration().get('replicas', []))
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'survey':
+            return None
+        replicas = replica_configuration().get('replicas', [])
+        state = request_state.get()
+        if not replicas or state is None or state['pinned'] or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        state['replica_reads'] = True
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != 'survey':
+            return None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = self._databases()
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
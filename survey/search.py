@@ -0,0 +1,112 @@
+"""
+Full-text search of questions, by title and description.
+
+On SQLite the questions are indexed in an FTS5 table (SEARCH_TABLE) with external content: it reads
+the text from survey_question, and it's kept in sync by triggers on survey_question
+(see migration 0010_question_search), so questions written with raw inserts (imports, synthetic data)
+and edits of QuestionUpdateView are indexed in the same transaction. Hits are ranked with BM25,
+titles weigh more than descriptions. Other databases fall back to icontains lookups without a rank.
+SQLite drops the triggers when a migration remakes survey_question (e.g. AddField or AlterField),
+so they are restored after every migrate (see restore_search_triggers).
+
+Usage:
+Question.objects.search('ejercicio')
+Question.objects.ranked().search('ejercicio', order=False)
+"""
+import re
+
+from django.db import connections, DatabaseError, DEFAULT_DB_ALIAS
+
+SEARCH_TABLE = 'survey_question_fts'
+
+# Same triggers as migration 0010_question_search
+SEARCH_TRIGGERS = {
+    'survey_question_fts_insert': (
+        "CREATE TRIGGER IF NOT EXISTS survey_question_fts_insert AFTER INSERT ON survey_question BEGIN "
+        "INSERT INTO survey_question_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+        "END"
+    ),
+    'survey_question_fts_delete': (
+        "CREATE TRIGGER IF NOT EXISTS survey_question_fts_delete AFTER DELETE ON survey_question BEGIN "
+        "INSERT INTO survey_question_fts(survey_question_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "END"
+    ),
+    'survey_question_fts_update': (
+        "CREATE TRIGGER IF NOT EXISTS survey_question_fts_update AFTER UPDATE OF title, description "
+        "ON survey_question BEGIN "
+        "INSERT INTO survey_question_fts(survey_question_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "INSERT INTO survey_question_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+        "END"
+    ),
+}
+
+# BM25 weights of the title and description columns
+COLUMN_WEIGHTS = (10.0, 1.0)
+
+# Words of a query, the rest (FTS5 operators, quotes, punctuation) is ignored
+MAX_TERMS = 10
+_words = re.compile(r'\w+')
+
+
+def search_terms(query):
+    """Returns the words of a search query, lowercased"""
+    return _words.findall(query.lower())[:MAX_TERMS]
+
+
+def match_expression(terms):
+    """
+    FTS5 query that matches every term as a prefix, so partial words typed in a search box
+    already match (e.g. "ejerc" matches "ejercicio")
+    """
+    return ' '.join('"{}"*'.format(term) for term in terms)
+
+
+def search_available(using=DEFAULT_DB_ALIAS):
+    """If the database has the FTS5 index, otherwise searches fall back to icontains"""
+    return connections[using].vendor == 'sqlite'
+
+
+def rebuild_search_index(using=DEFAULT_DB_ALIAS):
+    """Reindexes every question from survey_question"""
+    with connections[using].cursor() as cursor:
+        cursor.execute("INSERT INTO {table}({table}) VALUES ('rebuild')".format(table=SEARCH_TABLE))
+        cursor.execute("INSERT INTO {table}({table}) VALUES ('optimize')".format(table=SEARCH_TABLE))
+
+
+def missing_search_triggers(cursor):
+    """Returns the names of the triggers of the index that don't exist, None if there's no index"""
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE (type = 'table' AND name = %s) OR type = 'trigger'", [SEARCH_TABLE]
+    )
+    existing = {name for name, in cursor.fetchall()}
+    if SEARCH_TABLE not in existing:
+        return None
+    return [name for name in SEARCH_TRIGGERS if name not in existing]
+
+
+def restore_search_triggers(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Recreates the missing triggers of the index, and reindexes the questions if any was missing
+    since the writes made without it were not indexed. Connected to post_migrate (see SurveyConfig).
+    Returns the names of the recreated triggers.
+    """
+    if not search_available(using):
+        return []
+    with connections[using].cursor() as cursor:
+        missing = missing_search_triggers(cursor) or []
+        for name in missing:
+            cursor.execute(SEARCH_TRIGGERS[name])
+    if missing:
+        rebuild_search_index(using)
+    return missing
+
+
+def verify_search_index(using=DEFAULT_DB_ALIAS):
+    """Checks that the index and its triggers match survey_question, raises DatabaseError if they don't"""
+    with connections[using].cursor() as cursor:
+        missing = missing_search_triggers(cursor)
+        if missing:
+            raise DatabaseError('Missing triggers: {}'.format(', '.join(missing)))
+        cursor.execute("INSERT INTO {table}({table}, rank) VALUES ('integrity-check', 1)".format(table=SEARCH_TABLE))
@@ -0,0 +1,202 @@
+import collections
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from survey.models import Question, Answer, Vote, histogram_deltas
+from survey.leaderboard import leaderboard
+from survey.overlay import invalidate_user_interactions
+from survey.routers import pin_user
+from survey.versions import bump_question_version
+from survey.events import publish_score
+from survey.profiles import active_profile, shadow_profile
+from survey.database import add_question_activity
+
+
+# Questions and users being deleted in this thread, by pk: their answers and votes are deleted
+# in the same cascade, so the answer and vote receivers don't update the counters one row at a time
+_deleting = threading.local()
+
+
+def deleting(kind):
+    """
+    Returns the set of pks of the given kind ('questions' or 'users') being deleted in this thread
+    """
+    if not hasattr(_deleting, kind):
+        setattr(_deleting, kind, set())
+    return getattr(_deleting, kind)
+
+
+def cascaded(instance):
+    """
+    Returns whether an answer or vote is deleted with its question or its author
+    """
+    return instance.question_id in deleting('questions') or instance.author_id in deleting('users')
+
+
+def question_changed(question_pk):
+    """
+    Once the write is committed, re-ranks the question in the leaderboard, bumps its version
+    (and the ranking version), so only its cached fragments and the cached pages are not used anymore,
+    and publishes its new score to the live clients
+    """
+    def changed():
+        leaderboard.refresh(question_pk)
+        bump_question_version(question_pk)
+        publish_score(question_pk)
+
+    transaction.on_commit(changed)
+
+
+def update_question_counters(instance, answers=0, likes=0, dislikes=0, histogram=None, activity=True):
+    """
+    Applies the counter deltas of an answer or vote write to its question.
+    The database row is updated with F expressions, and the question instance cached in the
+    answer or vote (if any) is updated in memory so it doesn't need to be refreshed.
+    With activity, the new answers and votes are also added to the trending buckets of the question:
+    a changed vote only counts its new value, and deletes are not activity (they may come from
+    deleting the question).
+    """
+    histogram = histogram or {}
+    if not (answers or likes or dislikes or histogram):
+        return
+
+    Question.objects.filter(pk=instance.question_id).update_counters(
+        answers=answers, likes=likes, dislikes=dislikes, histogram=histogram
+    )
+    added = {'answers': max(answers, 0), 'likes': max(likes, 0), 'dislikes': max(dislikes, 0)}
+    if activity and any(added.values()):
+        add_question_activity(instance.question_id, **added)
+    question_changed(instance.question_id)
+
+    if type(instance)._meta.get_field('question').is_cached(instance):
+        question = instance.question
+        question.answer_count += answers
+        question.like_count += likes
+        question.dislike_count += dislikes
+        points = active_profile().base_points(answers, likes, dislikes)
+        question.base_points += points
+        question.score += points
+        question.shadow_score += shadow_profile().base_points(answers, likes, dislikes)
+        for field, delta in histogram.items():
+            setattr(question, field, getattr(question, field) + delta)
+
+
+def vote_deltas(old_is_like, new_is_like):
+    """
+    Returns the (likes, dislikes) deltas of changing a vote from old_is_like to new_is_like.
+    None means the vote doesn't count as a like nor a dislike.
+    """
+    likes = int(new_is_like is True) - int(old_is_like is True)
+    dislikes = int(new_is_like is False) - int(old_is_like is False)
+    return likes, dislikes
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    pin_user(instance.author_id)
+    question_changed(instance.pk)
+
+
+@receiver(pre_delete, sender=Question)
+def question_pre_delete(sender, instance, **kwargs):
+    deleting('questions').add(instance.pk)
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    # The answers and votes of the question are deleted before it
+    deleting('questions').discard(instance.pk)
+    question_changed(instance.pk)
+
+
+@receiver(pre_delete, sender=get_user_model())
+def user_pre_delete(sender, instance, **kwargs):
+    """
+    The answers and votes of a deleted user are deleted with them, so their counter deltas
+    are applied here with one grouped update per question (the questions of the user are deleted too)
+    """
+    deleting('users').add(instance.pk)
+    invalidate_user_interactions(instance.pk)
+    deltas = collections.defaultdict(collections.Counter)
+    answers = Answer.objects.filter(author=instance).exclude(question__author=instance)
+    for question_pk, value in answers.values_list('question_id', 'value'):
+        deltas[question_pk]['answers'] -= 1
+        deltas[question_pk].update(histogram_deltas(value, None))
+    votes = Vote.objects.filter(author=instance).exclude(question__author=instance)
+    for question_pk, is_like in votes.values_list('question_id', 'is_like'):
+        likes, dislikes = vote_deltas(is_like, None)
+        deltas[question_pk].update(likes=likes, dislikes=dislikes)
+
+    for question_pk, delta in deltas.items():
+        counters = {field: delta.pop(field, 0) for field in ('answers', 'likes', 'dislikes')}
+        Question.objects.filter(pk=question_pk).update_counters(histogram=dict(delta), **counters)
+        question_changed(question_pk)
+
+
+@receiver(post_delete, sender=get_user_model())
+def user_deleted(sender, instance, **kwargs):
+    deleting('users').discard(instance.pk)
+
+
+@receiver(pre_save, sender=Answer)
+def answer_pre_save(sender, instance, raw=False, **kwargs):
+    # Answers that weren't loaded from the database don't know their stored value
+    if raw or instance._state.adding or hasattr(instance, '_loaded_value'):
+        return
+    instance._loaded_value = Answer.objects.filter(pk=instance.pk).values_list('value', flat=True).first()
+
+
+@receiver(post_save, sender=Answer)
+def answer_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_user_interactions(instance.author_id)
+    old_value = None if created else instance._loaded_value
+    # The value may still be the string posted by the client
+    value = Answer._meta.get_field('value').to_python(instance.value)
+    update_question_counters(instance, answers=int(created), histogram=histogram_deltas(old_value, value))
+    instance._loaded_value = value
+
+
+@receiver(post_delete, sender=Answer)
+def answer_deleted(sender, instance, **kwargs):
+    if cascaded(instance):
+        return
+    invalidate_user_interactions(instance.author_id)
+    update_question_counters(
+        instance, answers=-1, histogram=histogram_deltas(instance.value, None), activity=False
+    )
+
+
+@receiver(pre_save, sender=Vote)
+def vote_pre_save(sender, instance, raw=False, **kwargs):
+    # Votes that weren't loaded from the database don't know their stored value
+    if raw or instance._state.adding or hasattr(instance, '_loaded_is_like'):
+        return
+    instance._loaded_is_like = Vote.objects.filter(pk=instance.pk).values_list('is_like', flat=True).first()
+
+
+@receiver(post_save, sender=Vote)
+def vote_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_user_interactions(instance.author_id)
+    old_is_like = None if created else instance._loaded_is_like
+    likes, dislikes = vote_deltas(old_is_like, instance.is_like)
+    update_question_counters(instance, likes=likes, dislikes=dislikes)
+    instance._loaded_is_like = instance.is_like
+
+
+@receiver(post_delete, sender=Vote)
+def vote_deleted(sender, instance, **kwargs):
+    if cascaded(instance):
+        return
+    invalidate_user_interactions(instance.author_id)
+    likes, dislikes = vote_deltas(instance.is_like, None)
+    update_question_counters(instance, likes=likes, dislikes=dislikes, activity=False)
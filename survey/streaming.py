@@ -0,0 +1,244 @@
+"""
+Streaming import and export of questions, answers and votes as JSON Lines.
+
+Each line is an object in the format of Django's serializers ({"model", "pk", "fields"}),
+so the files can also be read with loaddata. Export reads the tables with iterator() inside
+one transaction (a consistent snapshot), import parses the file line by line and writes it in batches,
+so neither of them keeps more than a batch in memory.
+"""
+import collections
+import json
+import os
+from datetime import datetime
+
+from django.core import serializers
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+
+from survey.database import insert_rows, add_question_counters
+from survey.leaderboard import leaderboard
+from survey.models import Question, Answer, Vote, histogram_deltas
+from survey.profiles import active_profile, shadow_profile, day_number, today_day
+from survey.versions import bump_version, RANKING_VERSION_KEY
+
+# In the order they have to be imported, answers and votes point to questions
+MODELS = [Question, Answer, Vote]
+
+
+def error_message(error):
+    if isinstance(error, ValidationError):
+        return '; '.join(error.messages)
+    return str(error)
+
+
+def export_jsonl(stream, models=MODELS, chunk_size=2000):
+    """Writes the rows of the models to the stream, returns the amount written of each model"""
+    serializer = serializers.get_serializer('jsonl')()
+    counts = {}
+
+    def rows(model):
+        for row in model._base_manager.order_by('pk').iterator(chunk_size=chunk_size):
+            counts[model._meta.label_lower] += 1
+            yield row
+
+    with transaction.atomic():
+        for model in models:
+            counts[model._meta.label_lower] = 0
+            serializer.serialize(rows(model), stream=stream)
+    return counts
+
+
+class JSONLImporter:
+    """
+    Imports a JSON Lines export. Rows whose pk already exists are skipped, so a failed import
+    can simply be run again. The last line of each committed batch is kept in progress_path,
+    so the lines already imported are not even parsed again.
+    """
+    def __init__(self, batch_size=1000, skip_invalid=False, progress_path=None):
+        self.batch_size = batch_size
+        self.skip_invalid = skip_invalid
+        self.progress_path = progress_path
+        self.models = {model._meta.label_lower: model for model in MODELS}
+        self.counts = {model._meta.label_lower: 0 for model in MODELS}
+        self.counts.update(skipped=0, invalid=0)
+        self.errors = []
+
+    def resume_line(self):
+        if not self.progress_path or not os.path.exists(self.progress_path):
+            return 0
+        with open(self.progress_path) as progress_file:
+            return int(progress_file.read().strip() or 0)
+
+    def save_progress(self, line_number):
+        if self.progress_path:
+            with open(self.progress_path, 'w') as progress_file:
+                progress_file.write(str(line_number))
+
+    def run(self, stream):
+        """Imports the lines of the stream, returns the counts of imported, skipped and invalid rows"""
+        start_line = self.resume_line()
+        batch = []
+        for line_number, line in enumerate(stream, 1):
+            if line_number <= start_line or not line.strip():
+                continue
+            batch.append((line_number, self.parse(line_number, line)))
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                batch = []
+        if batch:
+            self.write(batch)
+        self.finish()
+        return self.counts
+
+    def parse(self, line_number, line):
+        """
+        Returns (model, {attname: value}) of a line, the values are converted with the model fields
+        like the serializers do, without building model instances
+        """
+        try:
+            data = json.loads(line)
+            model = self.models[data['model']]
+        except (ValueError, TypeError, KeyError):
+            return self.invalid(line_number, 'Invalid row, expected a question, answer or vote')
+
+        fields = data.get('fields') or {}
+        if not isinstance(fields, dict):
+            return self.invalid(line_number, 'Invalid row, expected the fields as an object')
+        values = {}
+        try:
+            values[model._meta.pk.attname] = model._meta.pk.to_python(data.get('pk'))
+        except (ValidationError, TypeError, ValueError) as error:
+            return self.invalid(line_number, 'Invalid pk ({})'.format(error_message(error)))
+        try:
+            for field in model._meta.concrete_fields:
+                if field.primary_key:
+                    continue
+                if field.name in fields:
+                    target = field.target_field if field.is_relation else field
+                    values[field.attname] = target.to_python(fields[field.name])
+                else:
+                    values[field.attname] = field.get_default()
+        # Values of the wrong JSON type (e.g. a number for a date) may fail before the field validates them
+        except (ValidationError, TypeError, ValueError) as error:
+            return self.invalid(line_number, 'Invalid {} ({})'.format(field.name, error_message(error)))
+        return model, values
+
+    def invalid(self, line_number, reason):
+        if not self.skip_invalid:
+            raise ValueError('Line {}: {}'.format(line_number, reason))
+        self.counts['invalid'] += 1
+        self.errors.append((line_number, reason))
+        return None
+
+    def write(self, batch):
+        """Validates the rows of a batch against the database and the batch itself, and inserts them"""
+        rows = {model: [] for model in MODELS}
+        for line_number, row in batch:
+            if row is not None:
+                rows[row[0]].append((line_number, row[1]))
+
+        valid = {}
+        for model in MODELS:
+            valid[model] = self.validate(model, rows[model], valid)
+
+        # The counters of the file are not trusted: questions start from zero, and every imported answer
+        # and vote adds to its question, like the signals do. So answers and votes of questions
+        # that were already in the database are counted too.
+        active, shadow, today = active_profile(), shadow_profile(), today_day()
+        for values in valid[Question]:
+            # auto_now_add is not applied by raw inserts
+            values['created'] = values['created'] or datetime.today().date()
+            values.update({name: 0 for name in Question.COUNTER_FIELDS})
+            created_day = day_number(values['created'])
+            values['daily_bonus'] = active.daily_bonus(created_day, today)
+            values['score'] = active.score(0, 0, 0, created_day, today)
+            values['shadow_daily_bonus'] = shadow.daily_bonus(created_day, today)
+            values['shadow_score'] = shadow.score(0, 0, 0, created_day, today)
+        deltas = collections.defaultdict(collections.Counter)
+        for values in valid[Answer]:
+            deltas[values['question_id']]['answer_count'] += 1
+            deltas[values['question_id']].update(histogram_deltas(None, values['value']))
+        for values in valid[Vote]:
+            if values['is_like'] is not None:
+                deltas[values['question_id']]['like_count' if values['is_like'] else 'dislike_count'] += 1
+
+        database = connections[DEFAULT_DB_ALIAS]
+        with transaction.atomic():
+            for model in MODELS:
+                if valid[model]:
+                    fields = model._meta.concrete_fields
+                    insert_rows(model, [field.attname for field in fields], [
+                        [field.get_db_prep_save(values[field.attname], database) for field in fields]
+                        for values in valid[model]
+                    ])
+                    self.counts[model._meta.label_lower] += len(valid[model])
+            add_question_counters(deltas)
+        self.save_progress(batch[-1][0])
+
+    def validate(self, model, rows, valid):
+        """
+        Returns the rows that can be inserted: those whose pk doesn't exist yet (already imported ones
+        are skipped), whose foreign keys exist (in the database or earlier in the batch)
+        and that don't break a unique together constraint
+        """
+        pk = model._meta.pk.attname
+        existing = set(model._base_manager.filter(pk__in=[values[pk] for _, values in rows]).values_list(
+            'pk', flat=True
+        ))
+        new_rows = []
+        for line_number, values in rows:
+            if values[pk] in existing:
+                self.counts['skipped'] += 1
+            else:
+                new_rows.append((line_number, values))
+
+        foreign_keys = {}
+        for field in model._meta.concrete_fields:
+            if field.is_relation:
+                ids = {values[field.attname] for _, values in new_rows}
+                found = set(field.related_model._base_manager.filter(pk__in=ids).values_list('pk', flat=True))
+                related_pk = field.related_model._meta.pk.attname
+                found.update(values[related_pk] for values in valid.get(field.related_model, []))
+                foreign_keys[field] = found
+
+        unique_together = [tuple(model._meta.get_field(name).attname for name in names)
+                           for names in model._meta.unique_together]
+        taken = {}
+        for names in unique_together:
+            # Narrowed by each field of the constraint with IN lookups, then only the exact
+            # combinations of the batch are kept
+            combinations = {tuple(values[name] for name in names) for _, values in new_rows}
+            lookup = {'{}__in'.format(name): {combination[position] for combination in combinations}
+                      for position, name in enumerate(names)}
+            taken[names] = set(model._base_manager.filter(**lookup).values_list(*names)) & combinations if (
+                combinations
+            ) else set()
+
+        accepted = []
+        for line_number, values in new_rows:
+            missing = [field.name for field, found in foreign_keys.items() if values[field.attname] not in found]
+            if missing:
+                self.invalid(line_number, 'Unknown {}'.format(', '.join(missing)))
+                continue
+            duplicated = [names for names in unique_together if tuple(values[name] for name in names) in taken[names]]
+            if duplicated:
+                self.invalid(line_number, 'Duplicated {}'.format(', '.join(
+                    model._meta.get_field(name).name for name in duplicated[0]
+                )))
+                continue
+            for names in unique_together:
+                taken[names].add(tuple(values[name] for name in names))
+            accepted.append(values)
+        return accepted
+
+    def finish(self):
+        """Points the pk sequences after the imported rows and drops the cached rankings"""
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), MODELS):
+                cursor.execute(sql)
+        # The whole file was imported, another import of it starts over
+        if self.progress_path and os.path.exists(self.progress_path):
+            os.remove(self.progress_path)
+        leaderboard.invalidate()
+        bump_version(RANKING_VERSION_KEY)
@@ -0,0 +1,140 @@
+"""
+Synthetic users, questions, answers and votes, for benchmarks and for reproducing scaling problems.
+
+The popularity of the questions follows a Zipf-like distribution: a few questions get most of the
+answers and votes. Questions are spread over the last days (the newest ones get the daily bonus),
+and their ranking counters are written with them, so no rebuild is needed afterwards.
+Rows are written in chunks, one transaction per chunk, so memory doesn't grow with the dataset,
+and the same seed always generates the same data.
+"""
+import collections
+import math
+import random
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from survey.database import insert_rows
+from survey.models import Question, Answer, Vote, HISTOGRAM_VALUES, HISTOGRAM_FIELDS
+from survey.leaderboard import leaderboard
+from survey.profiles import active_profile, shadow_profile, day_number
+from survey.versions import bump_version, RANKING_VERSION_KEY
+
+
+class SyntheticDataset:
+    def __init__(self, questions=1000, users=None, answers_per_question=3, votes_per_question=5,
+                 popularity=1.1, like_ratio=0.7, days=30, today_ratio=None, seed=0, chunk_size=5000):
+        self.questions = questions
+        self.users = users or max(100, questions // 10)
+        self.answers_per_question = answers_per_question
+        self.votes_per_question = votes_per_question
+        self.popularity = popularity
+        self.like_ratio = like_ratio
+        self.days = days
+        # Share of the questions created today, the rest are spread over the previous days
+        self.today_ratio = 1 / days if today_ratio is None else today_ratio
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.random = random.Random(seed)
+        self.weights_total = sum(rank ** -popularity for rank in range(1, questions + 1))
+        # The popularity ranks are a permutation of the questions, so the most popular ones
+        # are anywhere in the ranking without keeping a list of every question
+        self.rank_step = self._coprime_step()
+        self.rank_offset = self.random.randrange(questions) if questions else 0
+
+    def _coprime_step(self):
+        step = max(1, int(self.questions * 0.618))
+        while math.gcd(step, self.questions) != 1:
+            step += 1
+        return step
+
+    def rank_for(self, index):
+        return (index * self.rank_step + self.rank_offset) % self.questions + 1
+
+    def created_for(self, index, today):
+        """Older questions come first, the last today_ratio of the questions are from today"""
+        past_questions = self.questions - round(self.questions * self.today_ratio)
+        if index >= past_questions or self.days <= 1:
+            return today
+        return today - timedelta(days=self.days - 1 - index * (self.days - 1) // past_questions)
+
+    def interactions_for(self, rank, per_question, user_pks):
+        expected = per_question * self.questions * rank ** -self.popularity / self.weights_total
+        amount = int(expected) + (1 if self.random.random() < expected % 1 else 0)
+        return self.random.sample(user_pks, min(amount, len(user_pks)))
+
+    def generate(self, progress=None):
+        """
+        Writes the dataset, calling progress(rows written so far) after each chunk.
+        Returns the amount of rows written of each model.
+        """
+        counts = {'users': 0, 'questions': 0, 'answers': 0, 'votes': 0}
+        user_pks = self.create_users()
+        counts['users'] = len(user_pks)
+
+        for start in range(0, self.questions, self.chunk_size):
+            with transaction.atomic():
+                written = self.create_chunk(range(start, min(start + self.chunk_size, self.questions)), user_pks)
+            for model, count in written.items():
+                counts[model] += count
+            if progress:
+                progress(counts)
+
+        leaderboard.invalidate()
+        bump_version(RANKING_VERSION_KEY)
+        return counts
+
+    def create_users(self):
+        User = get_user_model()
+        start = User.objects.filter(username__startswith='synthetic_').count()
+        users = [
+            # Not a valid password hash, so nobody can log in as them
+            User(username='synthetic_{}'.format(number), password='!')
+            for number in range(start, start + self.users)
+        ]
+        with transaction.atomic():
+            User.objects.bulk_create(users, batch_size=self.chunk_size)
+        return list(User.objects.filter(username__startswith='synthetic_').values_list('pk', flat=True))
+
+    def create_chunk(self, indexes, user_pks):
+        today = datetime.today().date()
+        today_day = day_number(today)
+        active, shadow = active_profile(), shadow_profile()
+        questions, interactions = [], []
+        for index in indexes:
+            rank = self.rank_for(index)
+            answer_authors = self.interactions_for(rank, self.answers_per_question, user_pks)
+            answer_values = [self.random.choice(HISTOGRAM_VALUES) for _ in answer_authors]
+            vote_authors = self.interactions_for(rank, self.votes_per_question, user_pks)
+            likes = sum(1 for _ in vote_authors if self.random.random() < self.like_ratio)
+            dislikes = len(vote_authors) - likes
+            created = self.created_for(index, today)
+            counters = (len(answer_authors), likes, dislikes)
+            created_day = day_number(created)
+            histogram = collections.Counter(answer_values)
+            questions.append((
+                'Synthetic question {}'.format(index + 1), 'Generated with seed {}'.format(self.seed),
+                self.random.choice(user_pks), connection.ops.adapt_datefield_value(created),
+                *counters, active.base_points(*counters),
+                active.daily_bonus(created_day, today_day), active.score(*counters, created_day, today_day),
+                shadow.daily_bonus(created_day, today_day), shadow.score(*counters, created_day, today_day),
+                *(histogram[value] for value in HISTOGRAM_VALUES), len(answer_values), sum(answer_values),
+            ))
+            interactions.append((zip(answer_authors, answer_values), vote_authors, likes))
+
+        last_pk = Question.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        insert_rows(Question, (
+            'title', 'description', 'author', 'created',
+            'answer_count', 'like_count', 'dislike_count', 'base_points', 'daily_bonus', 'score',
+            'shadow_daily_bonus', 'shadow_score',
+        ) + HISTOGRAM_FIELDS, questions)
+        question_pks = Question.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)
+
+        answers, votes = [], []
+        for pk, (answer_values, vote_authors, likes) in zip(question_pks.iterator(), interactions):
+            answers.extend((pk, author_pk, value, '') for author_pk, value in answer_values)
+            votes.extend((pk, author_pk, position < likes) for position, author_pk in enumerate(vote_authors))
+        insert_rows(Answer, ('question', 'author', 'value', 'comment'), answers)
+        insert_rows(Vote, ('question', 'author', 'is_like'), votes)
+        return {'questions': len(questions), 'answers': len(answers), 'votes': len(votes)}
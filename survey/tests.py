@@ -1,12 +1,43 @@
 from datetime import datetime, timedelta
+from io import StringIO
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
 
-from django.test import TestCase
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, Client, RequestFactory, override_settings
+from django.test.signals import template_rendered
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, connections, OperationalError, DEFAULT_DB_ALIAS
+from django.core.cache import cache
 from django.db.utils import IntegrityError
 from django.contrib.auth.models import User
+from django.http import Http404
 from django.conf import settings
-from django.urls import reverse
+from django.urls import reverse, resolve
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.management.sql import emit_post_migrate_signal
+from django.utils import timezone
 
-from survey.models import Question, Answer, Vote
+from survey.models import (Question, Answer, Vote, RankingProfile, AppliedRankingProfile, QuestionActivity,
+                           activity_bucket)
+from survey.leaderboard import leaderboard
+from survey.journal import journal
+from survey.ranking_engine import RankingEngine
+from survey.versions import question_versions, ranking_version
+from survey.events import broker, ranking_events, score_delta, RANKING_EVENTS_PATH
+from survey import async_views, ingestion
+from survey.database import retry_on_locked, add_question_activity
+from survey.synthetic import SyntheticDataset
+from survey.instrumentation import request_stats
+from survey.budgets import query_budget, QueryBudgetExceeded
+from survey.profiles import profiles, active_profile, ProfileRegistry, PROFILES_VERSION_KEY
+from survey.versions import bump_version
 
 
 class BasicModelTests(TestCase):
@@ -222,8 +253,1672 @@ class RankingModelTests(TestCase):
         self.assertEqual(total_points, ranked_question.total_points)
 
 
+class RankingCountersTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='test_user', password='12345')
+        self.user2 = User.objects.create_user(username='test_user2', password='22345')
+        self.question = Question.objects.create(title='Counters question', author=self.user)
+
+        self.answer_points = settings.RANKING_CONFIGURATION.get('answer_points', 0)
+        self.like_points = settings.RANKING_CONFIGURATION.get('like_points', 0)
+        self.dislike_points = settings.RANKING_CONFIGURATION.get('dislike_points', 0)
+
+    def assertCounters(self, answers, likes, dislikes):
+        question = Question.objects.get(pk=self.question.pk)
+        self.assertEqual(question.answer_count, answers)
+        self.assertEqual(question.like_count, likes)
+        self.assertEqual(question.dislike_count, dislikes)
+        self.assertEqual(
+            question.base_points,
+            answers * self.answer_points + likes * self.like_points + dislikes * self.dislike_points
+        )
+
+    def test_answer_counters(self):
+        """Tests that creating and deleting answers updates the counters"""
+        answer = Answer.objects.create_answer(question=self.question, author=self.user, value=3)
+        Answer.objects.create(question=self.question, author=self.user2, value=4)
+        self.assertCounters(2, 0, 0)
+
+        # Changing the value of an answer doesn't count it again
+        answer.value = 5
+        answer.save()
+        self.assertCounters(2, 0, 0)
+
+        answer.delete()
+        self.assertCounters(1, 0, 0)
+
+    def test_vote_toggle_counters(self):
+        """Tests that toggling a vote moves it between likes and dislikes"""
+        vote = Vote.objects.create(question=self.question, author=self.user, is_like=True)
+        self.assertCounters(0, 1, 0)
+
+        vote = Vote.objects.get(pk=vote.pk)
+        vote.is_like = False
+        vote.save()
+        self.assertCounters(0, 0, 1)
+
+        vote.delete()
+        self.assertCounters(0, 0, 0)
+
+    def test_views_update_counters(self):
+        """Tests the counters after answering and voting through the views"""
+        self.client.login(username='test_user', password='12345')
+        self.client.post(reverse('survey:question-answer'), data={'question_pk': self.question.pk, 'value': 2})
+        self.client.post(reverse('survey:question-like'), data={'question_pk': self.question.pk, 'value': 'like'})
+        self.client.post(reverse('survey:question-like'), data={'question_pk': self.question.pk, 'value': 'dislike'})
+        self.assertCounters(1, 0, 1)
+
+    def test_stale_question_save_keeps_counters(self):
+        """Tests that saving a stale question instance doesn't overwrite its counters"""
+        stale_question = Question.objects.get(pk=self.question.pk)
+        Vote.objects.create(question=self.question, author=self.user, is_like=True)
+        stale_question.title = 'New title'
+        stale_question.save()
+        self.assertCounters(0, 1, 0)
+
+    def test_rebuild_counters_command(self):
+        """Tests that the command detects and fixes counters out of sync"""
+        Answer.objects.create(question=self.question, author=self.user, value=1)
+        Vote.objects.create(question=self.question, author=self.user2, is_like=False)
+        Question.objects.filter(pk=self.question.pk).update(answer_count=7, base_points=0)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_ranking_counters', '--verify', stdout=StringIO())
+
+        call_command('rebuild_ranking_counters', stdout=StringIO())
+        self.assertCounters(1, 0, 1)
+        call_command('rebuild_ranking_counters', '--verify', stdout=StringIO())
+
+    def test_question_delete_skips_counters(self):
+        """Tests that the answers and votes deleted with their question don't update its counters"""
+        for user in (self.user, self.user2):
+            Answer.objects.create(question=self.question, author=user, value=2)
+            Vote.objects.create(question=self.question, author=user, is_like=True)
+        with CaptureQueriesContext(connection) as queries:
+            self.question.delete()
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE "survey_question"')])
+        self.assertFalse(Answer.objects.exists())
+
+        # Later deletes update the counters again
+        self.question = Question.objects.create(title='Other question', author=self.user)
+        Answer.objects.create(question=self.question, author=self.user2, value=2)
+        Answer.objects.get().delete()
+        self.assertCounters(0, 0, 0)
+
+    def test_user_delete_counters(self):
+        """Tests that deleting a user updates the counters of each question they answered once"""
+        other_question = Question.objects.create(title='Other question', author=self.user)
+        voter = User.objects.create_user(username='voter', password='12345')
+        for question in (self.question, other_question):
+            Answer.objects.create(question=question, author=voter, value=4)
+            Vote.objects.create(question=question, author=voter, is_like=False)
+            Vote.objects.create(question=question, author=self.user2, is_like=True)
+        Question.objects.create(title='Voter question', author=voter).votes.create(author=self.user, is_like=True)
+
+        with CaptureQueriesContext(connection) as queries:
+            voter.delete()
+        updates = [query for query in queries if query['sql'].startswith('UPDATE "survey_question"')]
+        self.assertEqual(len(updates), 2)
+        self.assertCounters(0, 1, 0)
+        call_command('rebuild_ranking_counters', '--verify', stdout=StringIO())
+
+        # Later deletes update the counters again
+        Vote.objects.get(question=self.question).delete()
+        self.assertCounters(0, 0, 0)
+
+
+@override_settings(LEADERBOARD_CONFIGURATION={'size': 2, 'spill': 1})
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            User.objects.create_user(username='user{}'.format(i), password='12345') for i in range(4)
+        ]
+        self.questions = [
+            Question.objects.create(title='Question {}'.format(i), author=self.users[0]) for i in range(5)
+        ]
+
+    def ranked_pks(self, count):
+        return list(Question.objects.ranked().values_list('pk', flat=True)[:count])
+
+    def vote(self, question, user, is_like):
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.update_or_create(question=question, author=user, defaults={'is_like': is_like})
+
+    def test_top_matches_ranking(self):
+        """Tests that the snapshot has the same order as the ranked queryset"""
+        self.assertEqual(leaderboard.top(2), self.ranked_pks(2))
+
+    def test_outsider_enters_top(self):
+        """Tests that a question outside of the snapshot is re-ranked into it"""
+        leaderboard.top(2)
+        last_question = self.questions[-1]
+        self.vote(last_question, self.users[0], True)
+        self.assertEqual(leaderboard.top(2)[0], last_question.pk)
+        self.assertEqual(leaderboard.top(2), self.ranked_pks(2))
+
+    def test_entries_falling_behind_floor(self):
+        """Tests that questions leaving the top are replaced by the right ones"""
+        leaderboard.top(2)
+        for user in self.users:
+            self.vote(self.questions[0], user, False)
+            self.vote(self.questions[1], user, False)
+        self.assertEqual(leaderboard.top(2), self.ranked_pks(2))
+
+        # Likes and dislikes at the same time
+        self.vote(self.questions[0], self.users[0], True)
+        self.vote(self.questions[4], self.users[1], False)
+        self.assertEqual(leaderboard.top(2), self.ranked_pks(2))
+
+    def test_deleted_question(self):
+        """Tests that deleted questions leave the snapshot"""
+        top_pks = leaderboard.top(2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.get(pk=top_pks[0]).delete()
+        self.assertNotIn(top_pks[0], leaderboard.top(2))
+        self.assertEqual(leaderboard.top(2), self.ranked_pks(2))
+
+    def test_concurrent_refresh(self):
+        """Tests that a writer that finds another one patching the snapshot drops it instead"""
+        leaderboard.top(2)
+        cache.add(leaderboard.lock_key, True)
+        self.vote(self.questions[-1], self.users[0], True)
+        self.assertIsNone(cache.get(leaderboard.cache_key))
+        cache.delete(leaderboard.lock_key)
+        self.assertEqual(leaderboard.top(2), self.ranked_pks(2))
+        # The lock is released after patching
+        self.vote(self.questions[-1], self.users[1], True)
+        self.assertIsNone(cache.get(leaderboard.lock_key))
+        self.assertIsNotNone(cache.get(leaderboard.cache_key))
+
+    def test_list_view_first_page(self):
+        """Tests that the first page of the list has the leaderboard order"""
+        self.vote(self.questions[3], self.users[0], True)
+        with self.settings(LEADERBOARD_CONFIGURATION={'size': 20, 'spill': 5}):
+            cache.clear()
+            response = self.client.get(reverse('survey:question-list'))
+        self.assertEqual([question.pk for question in response.context['object_list']], self.ranked_pks(20))
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='test_user', password='12345')
+        voters = [User.objects.create_user(username='voter{}'.format(i), password='12345') for i in range(3)]
+        for i in range(45):
+            question = Question.objects.create_question(author=self.user, title='Question {}'.format(i))
+            for voter in voters[:i % 4]:
+                question.votes.create(author=voter, is_like=i % 3 != 0)
+
+    def get_page(self, **params):
+        response = self.client.get(reverse('survey:question-list'), data=params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['page_obj']
+
+    def test_walk_forward_and_backward(self):
+        """Tests that following the cursors goes through the whole ranking in order, both ways"""
+        ranked_pks = list(Question.objects.ranked().values_list('pk', flat=True))
+
+        pages = [self.get_page()]
+        while pages[-1].has_next():
+            pages.append(self.get_page(cursor=pages[-1].next_cursor))
+        self.assertEqual([question.pk for page in pages for question in page.object_list], ranked_pks)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[-1].next_cursor)
+
+        page = pages[-1]
+        backward_pks = [question.pk for question in page.object_list]
+        while page.has_previous():
+            page = self.get_page(cursor=page.previous_cursor)
+            backward_pks = [question.pk for question in page.object_list] + backward_pks
+        self.assertEqual(backward_pks, ranked_pks)
+
+    def test_votes_dont_shift_pages(self):
+        """Tests that votes in previous pages don't repeat questions in the next one"""
+        first_page = self.get_page()
+        first_pks = {question.pk for question in first_page.object_list}
+
+        # The last question of the first page goes down
+        last_question = first_page.object_list[-1]
+        for i in range(5):
+            voter = User.objects.create_user(username='late_voter{}'.format(i), password='12345')
+            last_question.votes.create(author=voter, is_like=False)
+
+        second_page = self.get_page(cursor=first_page.next_cursor)
+        self.assertFalse(first_pks & {question.pk for question in second_page.object_list})
+
+    def test_last_page_link(self):
+        """Tests that numbered pages are still available"""
+        page = self.get_page(page=3)
+        self.assertEqual(page.number, 3)
+        self.assertEqual(len(page.object_list), 5)
+        self.assertFalse(page.has_next())
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('survey:question-list'), data={'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class BulkIngestionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user_data = {'username': 'test_user', 'password': 'qwerty'}
+        self.user = User.objects.create_user(**self.user_data)
+        self.questions = [Question.objects.create(title='Question {}'.format(i), author=self.user) for i in range(3)]
+        self.client.login(**self.user_data)
+
+    def post_bulk(self, items):
+        return self.client.post(reverse('survey:question-bulk'), data=json.dumps(items),
+                                content_type='application/json')
+
+    def test_bulk_ingestion(self):
+        """Tests a batch with new and updated answers and votes, and invalid items"""
+        Vote.objects.create(question=self.questions[1], author=self.user, is_like=True)
+        Answer.objects.create(question=self.questions[1], author=self.user, value=1)
+
+        items = [
+            {'question_pk': self.questions[0].pk, 'kind': 'answer', 'value': 3},
+            {'question_pk': self.questions[0].pk, 'kind': 'vote', 'value': 'like'},
+            {'question_pk': self.questions[1].pk, 'kind': 'answer', 'value': 5},
+            {'question_pk': self.questions[1].pk, 'kind': 'vote', 'value': 'dislike'},
+            {'question_pk': self.questions[2].pk, 'kind': 'vote', 'value': 'like'},
+            # Last one wins
+            {'question_pk': self.questions[2].pk, 'kind': 'vote', 'value': 'dislike'},
+            {'question_pk': 9999, 'kind': 'vote', 'value': 'like'},
+            {'question_pk': self.questions[0].pk, 'kind': 'answer', 'value': 7},
+            {'question_pk': self.questions[0].pk, 'kind': 'comment', 'value': 'hi'},
+        ]
+        response = self.post_bulk(items)
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['ok'] for result in results], [True] * 6 + [False] * 3)
+
+        self.assertEqual(Answer.objects.get(question=self.questions[1], author=self.user).value, 5)
+        self.assertFalse(Vote.objects.get(question=self.questions[1], author=self.user).is_like)
+        self.assertFalse(Vote.objects.get(question=self.questions[2], author=self.user).is_like)
+
+        questions = Question.objects.in_bulk([question.pk for question in self.questions])
+        self.assertEqual(
+            [(questions[q.pk].answer_count, questions[q.pk].like_count, questions[q.pk].dislike_count)
+             for q in self.questions],
+            [(1, 1, 0), (1, 0, 1), (0, 0, 1)]
+        )
+        call_command('rebuild_ranking_counters', '--verify', stdout=StringIO())
+
+    def test_bulk_ingestion_queries(self):
+        """Tests that the amount of queries doesn't depend on the amount of items of each question"""
+        items = [{'question_pk': question.pk, 'kind': 'answer', 'value': 4} for question in self.questions] * 10
+        with CaptureQueriesContext(connection) as context:
+            self.post_bulk(items)
+        select_queries = [query for query in context.captured_queries if query['sql'].startswith('SELECT')]
+        # session, user, questions validation and existing answers
+        self.assertLessEqual(len(select_queries), 4)
+
+    def test_bulk_ingestion_race(self):
+        """Tests that rows created by another request after they were read are updated instead"""
+        def existing_rows(model, author_pk, question_pks):
+            rows = read_existing_rows(model, author_pk, question_pks)
+            if model is Vote and not Vote.objects.exists():
+                Vote.objects.create(question=self.questions[0], author=self.user, is_like=True)
+            return rows
+
+        read_existing_rows = ingestion.existing_rows
+        with mock.patch('survey.ingestion.existing_rows', side_effect=existing_rows):
+            response = self.post_bulk([{'question_pk': self.questions[0].pk, 'kind': 'vote', 'value': 'dislike'}])
+        self.assertEqual(response.json()['results'], [{'ok': True}])
+        self.assertFalse(Vote.objects.get(question=self.questions[0], author=self.user).is_like)
+        call_command('rebuild_ranking_counters', '--verify', stdout=StringIO())
+
+    def test_bulk_ingestion_invalid(self):
+        self.assertEqual(self.post_bulk({'question_pk': 1}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.post_bulk([]).status_code, 401)
+
+
+class WriteBehindTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = self.settings(VOTE_WRITE_BEHIND={
+            'enabled': True, 'journal': os.path.join(directory, 'votes.journal')
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user_data = {'username': 'test_user', 'password': 'qwerty'}
+        self.user = User.objects.create_user(**self.user_data)
+        self.question = Question.objects.create(title='Hot question', author=self.user)
+        self.client.login(**self.user_data)
+
+    def like(self, value):
+        data = {'question_pk': self.question.pk, 'value': value}
+        response = self.client.post(reverse('survey:question-like'), data=data)
+        self.assertTrue(response.json()['pending'])
+
+    def test_votes_are_coalesced(self):
+        """Tests that toggles stay in the journal until flushed, and only the last one is written"""
+        for value in ['like', 'dislike', 'like', 'dislike']:
+            self.like(value)
+        self.assertFalse(Vote.objects.exists())
+
+        response = self.client.get(reverse('survey:question-list'))
+        self.assertIs(response.context['object_list'][0].is_like, False)
+
+        self.assertEqual(journal.flush(), 1)
+        vote = Vote.objects.get()
+        self.assertFalse(vote.is_like)
+        self.assertEqual(Question.objects.get(pk=self.question.pk).dislike_count, 1)
+        self.assertEqual(journal.pending_for(self.user.pk), {})
+        self.assertEqual(journal.flush(), 0)
+
+    def test_failed_flush_is_retried(self):
+        """Tests that a journal left by a failed flush is written on the next one"""
+        self.like('like')
+        os.replace(journal.path, journal.flushing_path)
+        self.like('dislike')
+        self.assertEqual(journal.pending_for(self.user.pk), {self.question.pk: False})
+
+        call_command('flush_vote_journal', stdout=StringIO())
+        self.assertTrue(Vote.objects.get().is_like)
+        call_command('flush_vote_journal', stdout=StringIO())
+        self.assertFalse(Vote.objects.get().is_like)
+        call_command('rebuild_ranking_counters', '--verify', stdout=StringIO())
+
+    def test_pending_votes_read_once(self):
+        """Tests that only the votes appended since the last read of the journal are read"""
+        other = Question.objects.create(title='Other question', author=self.user)
+        self.like('like')
+        with open(journal.path, 'a') as file:
+            file.write('[{}, {}, true]\n'.format(self.user.pk, other.pk))
+        self.like('dislike')
+        pending = {self.question.pk: False, other.pk: True}
+        self.assertEqual(journal.pending_for(self.user.pk), pending)
+
+        # The lines already read are not read again, even after the journal is renamed for a flush
+        with open(journal.path) as file:
+            lines = file.readlines()
+        lines[1] = lines[1].replace('true]', 'null]')
+        with open(journal.path, 'r+') as file:
+            file.write(''.join(lines))
+        self.assertEqual(journal.pending_for(self.user.pk), pending)
+        os.replace(journal.path, journal.flushing_path)
+        self.assertEqual(journal.pending_for(self.user.pk), pending)
+
+        # A line being written is read once it's complete
+        with open(journal.path, 'a') as file:
+            file.write('[{}, {}, fal'.format(self.user.pk, other.pk))
+            file.flush()
+            self.assertEqual(journal.pending_for(self.user.pk), pending)
+            file.write('se]\n')
+        self.assertEqual(journal.pending_for(self.user.pk), {self.question.pk: False, other.pk: False})
+
+
+class RankingEngineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        users = [User.objects.create_user(username='user{}'.format(i), password='12345') for i in range(4)]
+        for i in range(12):
+            question = Question.objects.create(title='Question {}'.format(i), author=users[0])
+            for user in users[:i % 5]:
+                question.answers.create(author=user, value=3)
+                question.votes.create(author=user, is_like=(i + user.pk) % 2 == 0)
+        yesterday_question = Question.objects.first()
+        yesterday_question.created = datetime.today().date() - timedelta(days=1)
+        yesterday_question.save()
+
+    def test_scores_match_ranked(self):
+        """Tests that the vectorized scores are the same as the ranked queryset ones"""
+        engine = RankingEngine(chunk_size=5)
+        scores = {}
+        for chunk in engine.chunks():
+            _, total_points = engine.score(chunk)
+            scores.update(zip(chunk['pk'].tolist(), total_points.tolist()))
+        self.assertEqual(scores, dict(Question.objects.ranked().values_list('pk', 'total_points')))
+
+    def test_rescore_new_configuration(self):
+        """Tests the dry run and the rescoring after the weights change"""
+        configuration = dict(settings.RANKING_CONFIGURATION, like_points=50)
+        with self.settings(RANKING_CONFIGURATION=configuration):
+            output = StringIO()
+            call_command('rescore_questions', '--dry-run', '--chunk-size', '5', stdout=output)
+            changed = Question.objects.filter(like_count__gt=0).count()
+            self.assertIn('{} of 12 questions would change'.format(changed), output.getvalue())
+            with self.assertRaises(CommandError):
+                call_command('rebuild_ranking_counters', '--verify', stdout=StringIO())
+
+            call_command('rescore_questions', '--chunk-size', '5', stdout=StringIO())
+            call_command('rebuild_ranking_counters', '--verify', stdout=StringIO())
+
+    def test_rescore_skips_changed_rows(self):
+        """Tests that rows whose counters changed after being read are not overwritten"""
+        engine = RankingEngine(configuration=dict(settings.RANKING_CONFIGURATION, answer_points=100))
+        chunk = next(engine.chunks())
+        base_points, _ = engine.score(chunk)
+        question = Question.objects.get(pk=int(chunk['pk'][0]))
+        Question.objects.filter(pk=question.pk).update_counters(answers=1)
+
+        skipped = engine.write(chunk, base_points, [0, 1])
+        self.assertEqual(skipped, 1)
+        answer_points = settings.RANKING_CONFIGURATION['answer_points']
+        self.assertEqual(Question.objects.get(pk=question.pk).base_points, question.base_points + answer_points)
+        self.assertEqual(Question.objects.get(pk=int(chunk['pk'][1])).base_points, int(base_points[1]))
+
+    def test_write_one_statement(self):
+        """Tests that the rows are written with one prepared UPDATE, and their scores match the ranking"""
+        configuration = dict(settings.RANKING_CONFIGURATION, answer_points=100, decay_points=3)
+        engine = RankingEngine(configuration=configuration)
+        chunk = next(engine.chunks())
+        base_points, total_points = engine.score(chunk)
+        with CaptureQueriesContext(connection) as context:
+            skipped = engine.write(chunk, base_points, range(len(chunk['pk'])))
+        self.assertEqual(skipped, 0)
+        self.assertEqual(len([query for query in context.captured_queries if 'UPDATE' in query['sql']]), 1)
+        # The daily bonus points didn't change
+        self.assertEqual(
+            dict(Question.objects.values_list('pk', 'score')), dict(zip(chunk['pk'].tolist(), total_points.tolist()))
+        )
+
+
+class DailyBonusTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='test_user', password='12345')
+        self.question = Question.objects.create(title='Today question', author=self.user)
+        self.question.votes.create(author=self.user, is_like=True)
+        self.daily_bonus_points = settings.RANKING_CONFIGURATION.get('daily_bonus_points', 0)
+        self.like_points = settings.RANKING_CONFIGURATION.get('like_points', 0)
+
+    def test_today_bucket(self):
+        """Tests that today's questions are scored with the bonus"""
+        question = Question.objects.ranked().get(pk=self.question.pk)
+        self.assertEqual(question.daily_bonus, self.daily_bonus_points)
+        self.assertEqual(question.total_points, self.like_points + self.daily_bonus_points)
+        self.assertEqual(question.total_points, question.points)
+
+    def test_rollover(self):
+        """Tests that the rollover demotes yesterday's questions"""
+        tomorrow = datetime.today().date() + timedelta(days=1)
+        self.assertEqual(Question.objects.all().rollover_daily_bonus(tomorrow), 1)
+        question = Question.objects.get(pk=self.question.pk)
+        self.assertEqual(question.daily_bonus, 0)
+        self.assertEqual(question.score, self.like_points)
+        # Nothing left in the bucket
+        self.assertEqual(Question.objects.all().rollover_daily_bonus(tomorrow), 0)
+
+    def test_ranking_doesnt_rollover(self):
+        """Tests that reading the ranking doesn't write, yesterday's bonus is removed by the command"""
+        Question.objects.filter(pk=self.question.pk).update(created=datetime.today().date() - timedelta(days=1))
+        with CaptureQueriesContext(connection) as context:
+            question = Question.objects.ranked().get(pk=self.question.pk)
+        self.assertEqual([query['sql'][:6] for query in context.captured_queries], ['SELECT'])
+        self.assertEqual(question.daily_bonus, self.daily_bonus_points)
+
+    def test_rollover_command(self):
+        """Tests that the command demotes questions moved to the past without saving them"""
+        Question.objects.filter(pk=self.question.pk).update(created=datetime.today().date() - timedelta(days=1))
+        with self.assertRaises(CommandError):
+            call_command('rebuild_ranking_counters', '--verify', stdout=StringIO())
+
+        call_command('rollover_daily_bonus', stdout=StringIO())
+        question = Question.objects.ranked().get(pk=self.question.pk)
+        self.assertEqual(question.total_points, self.like_points)
+        self.assertEqual(question.total_points, question.points)
+        call_command('rebuild_ranking_counters', '--verify', stdout=StringIO())
+
+    def test_saving_date_moves_bucket(self):
+        """Tests that changing the date of a question moves it in or out of the today bucket"""
+        self.question.created = datetime.today().date() - timedelta(days=3)
+        self.question.save()
+        self.assertEqual(Question.objects.get(pk=self.question.pk).score, self.like_points)
+
+        self.question.created = datetime.today().date()
+        self.question.save()
+        self.assertEqual(Question.objects.get(pk=self.question.pk).score, self.like_points + self.daily_bonus_points)
+
+
+class InteractionsOverlayTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user_data = {'username': 'test_user', 'password': 'qwerty'}
+        self.user = User.objects.create_user(**self.user_data)
+        self.other_user = User.objects.create_user(username='other_user', password='qwerty')
+        self.questions = [Question.objects.create(title='Question {}'.format(i), author=self.user) for i in range(3)]
+        Answer.objects.create(question=self.questions[0], author=self.user, value=4)
+        Vote.objects.create(question=self.questions[1], author=self.user, is_like=False)
+        Vote.objects.create(question=self.questions[2], author=self.other_user, is_like=True)
+
+    def interactions(self):
+        response = self.client.get(reverse('survey:question-list'))
+        return {question.pk: (question.user_value, question.is_like) for question in response.context['object_list']}
+
+    def test_overlay(self):
+        """Tests that each user sees only their own answers and votes"""
+        self.client.login(**self.user_data)
+        self.assertEqual(self.interactions(), {
+            self.questions[0].pk: (4, None),
+            self.questions[1].pk: (0, False),
+            self.questions[2].pk: (0, None),
+        })
+
+    def test_overlay_cache(self):
+        """Tests that the interactions are cached until the user writes again"""
+        self.client.login(**self.user_data)
+        self.interactions()
+        with CaptureQueriesContext(connection) as context:
+            self.interactions()
+        self.assertFalse([query for query in context.captured_queries if 'survey_vote' in query['sql']])
+
+        self.client.post(reverse('survey:question-like'), data={'question_pk': self.questions[2].pk, 'value': 'like'})
+        self.assertEqual(self.interactions()[self.questions[2].pk], (0, True))
+
+        # Other users' writes don't change them
+        Vote.objects.filter(author=self.other_user).get().delete()
+        self.assertEqual(self.interactions()[self.questions[2].pk], (0, True))
+
+
+class ListCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='test_user', password='qwerty')
+        self.questions = [Question.objects.create(title='Question {}'.format(i), author=self.user) for i in range(3)]
+
+    def get_list(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('survey:question-list'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode(), len(context.captured_queries)
+
+    def vote(self, question):
+        with self.captureOnCommitCallbacks(execute=True):
+            question.votes.create(author=self.user, is_like=True)
+
+    def assertPageCache(self):
+        content, _ = self.get_list()
+        cached_content, queries = self.get_list()
+        self.assertEqual(queries, 0)
+        self.assertEqual(cached_content, content)
+
+        self.vote(self.questions[1])
+        content, queries = self.get_list()
+        self.assertGreater(queries, 0)
+        self.assertIn('data-question="{pk}">{points}</span> pts.'.format(
+            pk=self.questions[1].pk, points=Question.objects.get(pk=self.questions[1].pk).points
+        ), content)
+
+    def test_page_cache(self):
+        """Tests that anonymous pages are cached until the ranking changes"""
+        self.assertPageCache()
+
+    def test_page_cache_file_based(self):
+        """Tests the page cache with the file based cache backend"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}}
+        with self.settings(CACHES=caches):
+            self.assertPageCache()
+        self.assertTrue(os.listdir(directory))
+
+    def test_only_touched_fragments_are_invalidated(self):
+        """Tests that a vote only changes the version of the card of its question"""
+        pks = [question.pk for question in self.questions]
+        versions = question_versions(pks)
+        self.vote(self.questions[0])
+        new_versions = question_versions(pks)
+        self.assertNotEqual(new_versions[pks[0]], versions[pks[0]])
+        self.assertEqual({pk: new_versions[pk] for pk in pks[1:]}, {pk: versions[pk] for pk in pks[1:]})
+
+    def test_logged_in_pages_are_not_cached(self):
+        self.client.login(username='test_user', password='qwerty')
+        self.get_list()
+        _, queries = self.get_list()
+        self.assertGreater(queries, 0)
+
+
+class RankingApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user_data = {'username': 'test_user', 'password': 'qwerty'}
+        self.user = User.objects.create_user(**self.user_data)
+        self.questions = [Question.objects.create(title='Question {}'.format(i), author=self.user) for i in range(3)]
+        self.questions[2].votes.create(author=self.user, is_like=True)
+
+    def test_ranking_json(self):
+        """Tests that the JSON ranking has the same questions and points as the ranked queryset"""
+        response = self.client.get(reverse('survey:question-ranking'))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            [(question['pk'], question['points']) for question in data['results']],
+            list(Question.objects.ranked().values_list('pk', 'total_points'))
+        )
+        self.assertEqual(data['page'], 1)
+        self.assertNotIn('is_like', data['results'][0])
+
+        self.client.login(**self.user_data)
+        data = self.client.get(reverse('survey:question-ranking')).json()
+        self.assertIs(data['results'][0]['is_like'], True)
+
+    def assertConditionalGet(self, url_name, max_queries=0):
+        url = reverse(url_name)
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertLessEqual(len(context.captured_queries), max_queries)
+
+        voter = User.objects.create_user(username='voter_{}'.format(url_name), password='qwerty')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.questions[0].answers.create(author=voter, value=2)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_get_no_auth(self):
+        """Tests that unchanged pages are answered with 304 without running queries"""
+        self.assertConditionalGet('survey:question-list')
+        self.assertConditionalGet('survey:question-ranking')
+
+    def test_conditional_get(self):
+        """Tests that logged in users only need their session and user queries for a 304"""
+        self.client.login(**self.user_data)
+        self.assertConditionalGet('survey:question-list', max_queries=2)
+
+    def test_login_changes_etag(self):
+        """Tests that logging in again doesn't get a 304 with the old CSRF token in the page"""
+        url = reverse('survey:question-list')
+        self.client.post(reverse('login'), data=self.user_data)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.post(reverse('logout'))
+        self.client.post(reverse('login'), data=self.user_data)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_user_vote_changes_etag(self):
+        self.client.login(**self.user_data)
+        url = reverse('survey:question-ranking')
+        etag = self.client.get(url)['ETag']
+        Answer.objects.create(question=self.questions[1], author=self.user, value=1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_gzip(self):
+        response = self.client.get(reverse('survey:question-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        response = self.client.get(reverse('survey:question-ranking'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+class ScoreEventsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user_data = {'username': 'test_user', 'password': 'qwerty'}
+        self.user = User.objects.create_user(**self.user_data)
+        self.questions = [Question.objects.create(title='Question {}'.format(i), author=self.user) for i in range(3)]
+        self.messages = []
+        broker.subscribe(self.messages.append)
+        self.addCleanup(broker.unsubscribe, self.messages.append)
+
+    def test_endpoints_return_points(self):
+        """Tests that answering and voting return the new points of the question"""
+        self.client.login(**self.user_data)
+        question = self.questions[2]
+        data = {'question_pk': question.pk, 'value': 'like'}
+        self.client.post(reverse('survey:question-like'), data=data)
+        data['value'] = 'dislike'
+        response = self.client.post(reverse('survey:question-like'), data=data)
+        self.assertEqual(response.json()['points'], Question.objects.get(pk=question.pk).points)
+
+        response = self.client.post(reverse('survey:question-answer'), data={'question_pk': question.pk, 'value': 4})
+        self.assertEqual(response.json()['points'], Question.objects.get(pk=question.pk).points)
+
+    def test_score_published(self):
+        """Tests that committed votes publish the new score and position of the question"""
+        question = self.questions[2]
+        leaderboard.top(2)
+        with self.captureOnCommitCallbacks(execute=True):
+            question.votes.create(author=self.user, is_like=True)
+        self.assertEqual(self.messages, [{
+            'question_id': question.pk,
+            'points': Question.objects.get(pk=question.pk).points,
+            'position': 1,
+        }])
+
+    @override_settings(LEADERBOARD_CONFIGURATION={'size': 1, 'spill': 0})
+    def test_position_outside_snapshot(self):
+        """Tests that the position is only read from the leaderboard snapshot"""
+        question = self.questions[2]
+        leaderboard.top(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            question.votes.create(author=self.user, is_like=False)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIsNone(score_delta(question.pk)['position'])
+        self.assertEqual(len(queries), 1)
+
+        leaderboard.invalidate()
+        self.assertIsNone(score_delta(self.questions[0].pk)['position'])
+
+    def test_event_stream(self):
+        """Tests the Server-Sent Events stream with a local ASGI client"""
+        # Only the stream listens
+        broker.unsubscribe(self.messages.append)
+
+        async def stream():
+            received = asyncio.Queue()
+            sent = asyncio.Queue()
+            app = asyncio.ensure_future(
+                ranking_events({'type': 'http', 'path': RANKING_EVENTS_PATH}, received.get, sent.put)
+            )
+            start = await sent.get()
+            while not broker.has_subscribers:
+                await asyncio.sleep(0.01)
+
+            broker.publish({'question_id': 1, 'points': 15, 'position': 2})
+            body = await asyncio.wait_for(sent.get(), 5)
+
+            await received.put({'type': 'http.disconnect'})
+            await asyncio.wait_for(app, 5)
+            return start, body
+
+        start, body = async_to_sync(stream)()
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        self.assertEqual(body['body'], b'data: {"question_id": 1, "points": 15, "position": 2}\n\n')
+        self.assertFalse(broker.has_subscribers)
+
+    def test_event_source(self):
+        """Tests that the list only opens the stream when the ASGI app serves it"""
+        with self.settings(RANKING_EVENTS={'enabled': False}):
+            self.assertNotContains(self.client.get(reverse('survey:question-list')), 'EventSource')
+        cache.clear()
+        with self.settings(RANKING_EVENTS={'enabled': True}):
+            self.assertContains(self.client.get(reverse('survey:question-list')), RANKING_EVENTS_PATH)
+
+
+class AsyncViewsTests(TransactionTestCase):
+    """The async views use other database connections, so the data has to be committed"""
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='test_user', password='qwerty')
+        self.questions = [Question.objects.create(title='Question {}'.format(i), author=self.user) for i in range(3)]
+        self.factory = RequestFactory()
+
+    def post(self, view, data):
+        request = self.factory.post('/', data=data)
+        request.user = self.user
+        return json.loads(async_to_sync(view)(request).content)
+
+    def test_question_list(self):
+        """Tests that the async list view returns the rendered ranking"""
+        request = self.factory.get('/')
+        request.user = self.user
+        response = async_to_sync(async_views.question_list)(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [question.pk for question in response.context_data['object_list']],
+            [question.pk for question in self.questions]
+        )
+        self.assertIn(self.questions[0].title, response.content.decode())
+
+    def test_answer_and_vote(self):
+        """Tests that the async endpoints save answers and votes like the sync ones"""
+        question = self.questions[1]
+        response = self.post(async_views.answer_question, {'question_pk': question.pk, 'value': 4})
+        self.assertTrue(response['ok'])
+        response = self.post(async_views.like_dislike_question, {'question_pk': question.pk, 'value': 'like'})
+        self.assertEqual(response['points'], Question.objects.get(pk=question.pk).points)
+
+        question.refresh_from_db()
+        self.assertEqual((question.answer_count, question.like_count), (1, 1))
+        self.assertTrue(Answer.objects.filter(question=question, author=self.user, value=4).exists())
+
+    def test_setting_checked_per_request(self):
+        """Tests that the URLs serve the async views only while ASYNC_VIEWS is enabled"""
+        threads = []
+
+        def rendered(sender, **kwargs):
+            threads.append(threading.current_thread().name)
+
+        template_rendered.connect(rendered)
+        self.addCleanup(template_rendered.disconnect, rendered)
+        for enabled in (True, False):
+            cache.clear()
+            threads.clear()
+            with self.settings(ASYNC_VIEWS={'enabled': enabled}):
+                # Only a coroutine function while enabled, so WSGI calls the sync view directly otherwise
+                self.assertEqual(asyncio.iscoroutinefunction(resolve(reverse('survey:question-list')).func), enabled)
+                self.assertEqual(self.client.get(reverse('survey:question-list')).status_code, 200)
+            self.assertEqual({thread.startswith('survey-db') for thread in threads}, {enabled})
+
+    def test_async_view_errors(self):
+        """Tests that the sync view errors still come back through the async view"""
+        response = self.post(async_views.like_dislike_question, {'value': 'like'})
+        self.assertFalse(response['ok'])
+        with self.assertRaises(Http404):
+            self.post(async_views.like_dislike_question, {'question_pk': 0, 'value': 'like'})
+
+
+class SQLiteTuningTests(SimpleTestCase):
+    """Runs outside of a transaction, like the views do, so the writes can be retried"""
+    databases = {'default'}
+
+    def test_pragmas_applied(self):
+        """Tests that new connections get the configured pragmas"""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_CONFIGURATION['pragmas']['busy_timeout'])
+
+    @override_settings(SQLITE_CONFIGURATION={'write_attempts': 3, 'retry_delay': 0})
+    def test_retry_on_locked(self):
+        """Tests that writes that find the database locked are retried, and other errors are not"""
+        calls = []
+
+        @retry_on_locked
+        def write(error):
+            calls.append(error)
+            if len(calls) < 3:
+                raise OperationalError(error)
+            return 'saved'
+
+        self.assertEqual(write('database is locked'), 'saved')
+        self.assertEqual(len(calls), 3)
+
+        calls.clear()
+        with self.assertRaises(OperationalError):
+            write('no such table: survey_vote')
+        self.assertEqual(len(calls), 1)
+
+    @override_settings(SQLITE_CONFIGURATION={'write_attempts': 3, 'retry_delay': 0})
+    def test_retry_gives_up(self):
+        """Tests that the error is raised once all the attempts found the database locked"""
+        calls = []
+
+        @retry_on_locked
+        def write():
+            calls.append(1)
+            raise OperationalError('database is locked')
+
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 3)
+
+
+@override_settings(REPLICA_CONFIGURATION={'replicas': ['replica'], 'sticky_seconds': 15})
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Uses a second SQLite file as the replica. It doesn't replicate anything, so its questions
+    tell which database a read went to.
+    The test runner doesn't know about it, it's added (and migrated) here.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.databases = {'default', 'replica'}
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.databases['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.replica_dir, 'replica.sqlite3'),
+        }
+        call_command('migrate', database='replica', verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.databases['replica']
+        shutil.rmtree(cls.replica_dir)
+
+    def setUp(self):
+        cache.clear()
+        self.user_data = {'username': 'test_user', 'password': 'qwerty'}
+        self.user = User.objects.create_user(**self.user_data)
+        self.question = Question.objects.create(title='Primary question', author=self.user)
+        # Same rows as the primary (like a replica), with another title
+        replica_user = User.objects.db_manager('replica').create_user(pk=self.user.pk, **self.user_data)
+        Question.objects.db_manager('replica').create(
+            pk=self.question.pk, title='Replica question', author=replica_user
+        )
+        # Creating the question pinned its author to the primary
+        cache.clear()
+
+    def test_reads_outside_requests(self):
+        """Tests that reads outside of requests (commands, tests) use the primary"""
+        self.assertEqual(Question.objects.get().title, 'Primary question')
+
+    def test_list_reads_from_replica(self):
+        """Tests that the list of an anonymous user is read from the replica"""
+        response = self.client.get(reverse('survey:question-list'))
+        self.assertContains(response, 'Replica question')
+        self.assertNotContains(response, 'Primary question')
+
+    def test_lagging_replica_not_cached(self):
+        """Tests that pages and cards read from a (lagging) replica are not cached under the current versions"""
+        response = self.client.get(reverse('survey:question-list'))
+        self.assertContains(response, 'Replica question')
+        # The replica catches up, without any new write bumping the versions
+        Question.objects.db_manager('replica').update(title='Caught up question')
+        response = self.client.get(reverse('survey:question-list'))
+        self.assertContains(response, 'Caught up question')
+
+        # Without replicas the pages are cached again
+        with self.settings(REPLICA_CONFIGURATION={'replicas': []}):
+            self.client.get(reverse('survey:question-list'))
+            Question.objects.update(title='Updated question')
+            self.assertContains(self.client.get(reverse('survey:question-list')), 'Primary question')
+
+    def test_read_your_writes(self):
+        """Tests that a user reads from the primary after voting, while other users still use the replica"""
+        self.client.login(**self.user_data)
+        response = self.client.get(reverse('survey:question-list'))
+        self.assertContains(response, 'Replica question')
+
+        response = self.client.post(reverse('survey:question-like'),
+                                    data={'question_pk': self.question.pk, 'value': 'like'})
+        self.assertEqual(response.json()['points'], Question.objects.get(pk=self.question.pk).points)
+
+        response = self.client.get(reverse('survey:question-list'))
+        self.assertContains(response, 'Primary question')
+
+        self.client.logout()
+        response = self.client.get(reverse('survey:question-list'))
+        self.assertContains(response, 'Replica question')
+
+
+class QueryPlanTests(TestCase):
+    """Checks the plans of the ranking and overlay queries with EXPLAIN QUERY PLAN, so the indexes stay in use"""
+    def setUp(self):
+        self.user = User.objects.create_user(username='test_user', password='12345')
+        self.question_pks = [Question.objects.create(title='Question {}'.format(i), author=self.user).pk
+                             for i in range(3)]
+
+    def assertPlanUses(self, queryset, *details):
+        plan = queryset.explain()
+        for detail in details:
+            self.assertIn(detail, plan)
+        self.assertNotIn('USE TEMP B-TREE', plan)
+
+    def test_ranking(self):
+        """Tests that the ranked list is read in order from its index"""
+        self.assertPlanUses(Question.objects.ranked()[:20], 'USING INDEX survey_question_ranking_idx')
+
+    def test_counted(self):
+        """Tests that likes and dislikes are counted from the votes index alone"""
+        self.assertPlanUses(Question.objects.counted(), 'USING COVERING INDEX survey_vote_question_like_idx')
+
+    def test_daily_bonus(self):
+        """Tests the indexes of the daily bonus rollover and of the questions of a day"""
+        today = datetime.today().date()
+        self.assertPlanUses(
+            Question.objects.filter(created__lt=today).exclude(daily_bonus=0), 'USING INDEX survey_question_today_idx'
+        )
+        self.assertPlanUses(Question.objects.filter(created=today), 'USING INDEX survey_question_created_idx')
+
+    def test_user_interactions(self):
+        """Tests that the answers and votes of a user for a page are read from the covering indexes"""
+        answers = Answer.objects.filter(author_id=self.user.pk, question_id__in=self.question_pks)
+        self.assertPlanUses(
+            answers.values_list('question_id', 'value'), 'USING COVERING INDEX survey_answer_author_idx'
+        )
+        votes = Vote.objects.filter(author_id=self.user.pk, question_id__in=self.question_pks)
+        self.assertPlanUses(votes.values_list('question_id', 'is_like'), 'USING COVERING INDEX survey_vote_author_idx')
+
+
+class SyntheticDatasetTests(TestCase):
+    def test_generate(self):
+        """Tests that the synthetic questions are spread over the days, with counters in sync with their rows"""
+        rows = SyntheticDataset(questions=60, users=20, days=3, chunk_size=25).generate()
+        self.assertEqual(rows['questions'], Question.objects.count())
+        self.assertEqual(rows['answers'], Answer.objects.count())
+        self.assertEqual(rows['votes'], Vote.objects.count())
+        self.assertEqual(Question.objects.filter(created=datetime.today().date()).count(), 20)
+        self.assertEqual(Question.objects.exclude(daily_bonus=0).count(), 20)
+        call_command('rebuild_ranking_counters', verify=True, stdout=StringIO())
+
+    def dataset_rows(self):
+        return (
+            list(Question.objects.order_by('pk').values_list(
+                'title', 'author__username', 'created', 'answer_count', 'like_count', 'dislike_count'
+            )),
+            list(Answer.objects.order_by('pk').values_list('question__title', 'author__username', 'value')),
+            list(Vote.objects.order_by('pk').values_list('question__title', 'author__username', 'is_like')),
+        )
+
+    def test_deterministic(self):
+        """Tests that the same seed generates the same data"""
+        SyntheticDataset(questions=40, users=15, seed=3, chunk_size=7).generate()
+        first = self.dataset_rows()
+        User.objects.filter(username__startswith='synthetic_').delete()
+        SyntheticDataset(questions=40, users=15, seed=3, chunk_size=7).generate()
+        self.assertEqual(self.dataset_rows(), first)
+
+    def test_command(self):
+        """Tests the options of the generate_survey_data command"""
+        call_command('generate_survey_data', questions=50, users=10, days=5, today_ratio=0.5, like_ratio=1,
+                     stdout=StringIO())
+        self.assertEqual(Question.objects.filter(created=datetime.today().date()).count(), 25)
+        self.assertEqual(Question.objects.filter(created__lt=datetime.today().date() - timedelta(days=4)).count(), 0)
+        self.assertFalse(Vote.objects.filter(is_like=False).exists())
+        call_command('rebuild_ranking_counters', verify=True, stdout=StringIO())
+
+        with self.assertRaises(CommandError):
+            call_command('generate_survey_data', questions=10, like_ratio=2, stdout=StringIO())
+
+
+class StreamingImportExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        SyntheticDataset(questions=30, users=10, days=3, seed=1).generate()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'survey.jsonl')
+        call_command('export_survey', self.path, stdout=StringIO(), stderr=StringIO())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def survey_rows(self):
+        return (
+            list(Question.objects.order_by('pk').values_list('pk', 'title', 'author', 'created', 'score')),
+            list(Answer.objects.order_by('pk').values_list('pk', 'question', 'author', 'value')),
+            list(Vote.objects.order_by('pk').values_list('pk', 'question', 'author', 'is_like')),
+        )
+
+    def import_survey(self, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_survey', self.path, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def write_lines(self, lines):
+        with open(self.path, 'w') as export_file:
+            export_file.write(''.join(json.dumps(line) + '\n' for line in lines))
+
+    def test_round_trip(self):
+        """Tests that an export imported in an empty database gives the same rows, dates and counters included"""
+        exported = self.survey_rows()
+        Question.objects.all().delete()
+        stdout, _ = self.import_survey(batch_size=7)
+        self.assertEqual(self.survey_rows(), exported)
+        self.assertIn('0 skipped, 0 invalid', stdout)
+        call_command('rebuild_ranking_counters', verify=True, stdout=StringIO())
+        # The sequences continue after the imported rows
+        self.assertGreater(Question.objects.create(title='New', author=User.objects.first()).pk, exported[0][-1][0])
+
+    def test_existing_rows_skipped(self):
+        """Tests that importing the same file again skips the rows that already exist"""
+        exported = self.survey_rows()
+        stdout, _ = self.import_survey()
+        self.assertEqual(self.survey_rows(), exported)
+        self.assertIn('{} skipped'.format(sum(len(rows) for rows in exported)), stdout)
+
+    def test_invalid_rows(self):
+        """Tests that invalid rows stop the import, or are reported and skipped with --skip-invalid"""
+        question = Question.objects.first()
+        author = User.objects.create_user(username='importer')
+        answer = {'question': question.pk, 'author': author.pk}
+        self.write_lines([
+            {'model': 'survey.answer', 'pk': 10000, 'fields': dict(answer, value=3)},
+            # Same author and question as the previous one
+            {'model': 'survey.answer', 'pk': 10001, 'fields': dict(answer, value=4)},
+            {'model': 'survey.vote', 'pk': 10000, 'fields': {'question': 999999, 'author': author.pk}},
+            {'model': 'survey.unknown', 'pk': 1, 'fields': {}},
+            {'model': 'survey.answer', 'pk': 10002, 'fields': dict(answer, value='many')},
+            {'model': 'survey.answer', 'pk': 'first', 'fields': dict(answer, value=1)},
+            {'model': 'survey.question', 'pk': 10000, 'fields': {'title': 'Q', 'author': author.pk, 'created': 5}},
+            {'model': 'survey.question', 'pk': 10001, 'fields': {'title': 'Q', 'author': author.pk, 'created': [1]}},
+            {'model': 'survey.answer', 'pk': [10003], 'fields': dict(answer, value=1)},
+            {'model': 'survey.answer', 'pk': 10004, 'fields': [1]},
+        ])
+        with self.assertRaisesMessage(CommandError, 'Line 2: Duplicated author, question'):
+            self.import_survey(batch_size=3, restart=True)
+        self.assertFalse(Answer.objects.filter(pk=10000).exists())
+
+        stdout, stderr = self.import_survey(skip_invalid=True, restart=True)
+        self.assertIn('0 survey.question, 1 survey.answer, 0 survey.vote, 0 skipped, 9 invalid', stdout)
+        self.assertIn('Line 2: Duplicated author, question', stderr)
+        self.assertIn('Line 3: Unknown question', stderr)
+        self.assertIn('Line 4: Invalid row', stderr)
+        self.assertIn('Line 5: Invalid value', stderr)
+        self.assertIn('Line 6: Invalid pk', stderr)
+        self.assertIn('Line 7: Invalid created', stderr)
+        self.assertIn('Line 8: Invalid created', stderr)
+        self.assertIn('Line 9: Invalid pk', stderr)
+        self.assertIn('Line 10: Invalid row', stderr)
+        self.assertEqual(Answer.objects.get(pk=10000).value, 3)
+        call_command('rebuild_ranking_counters', verify=True, stdout=StringIO())
+
+    def test_resume(self):
+        """Tests that a failed import continues after the last imported batch"""
+        question = Question.objects.first()
+        authors = [User.objects.create_user(username='importer_{}'.format(number)) for number in range(3)]
+        answer = {'model': 'survey.answer', 'fields': {'question': question.pk, 'value': 2}}
+        lines = [dict(answer, pk=10000 + number, fields=dict(answer['fields'], author=author.pk))
+                 for number, author in enumerate(authors)]
+        broken_vote = {'model': 'survey.vote', 'pk': 10000, 'fields': {'question': 999999}}
+        self.write_lines(lines[:2] + [broken_vote] + lines[2:])
+        with self.assertRaises(CommandError):
+            self.import_survey(batch_size=2)
+        self.assertEqual(Answer.objects.filter(pk__gte=10000).count(), 2)
+        with open(self.path + '.progress') as progress_file:
+            self.assertEqual(progress_file.read(), '2')
+
+        # The broken line is fixed, the lines before it are not read again
+        lines[0]['fields']['value'] = 5
+        broken_vote['fields'] = {'question': question.pk, 'author': authors[0].pk, 'is_like': False}
+        self.write_lines(lines[:2] + [broken_vote] + lines[2:])
+        stdout, _ = self.import_survey(batch_size=2)
+        self.assertIn('1 survey.answer, 1 survey.vote, 0 skipped', stdout)
+        self.assertEqual(Answer.objects.get(pk=10000).value, 2)
+        self.assertFalse(os.path.exists(self.path + '.progress'))
+        call_command('rebuild_ranking_counters', verify=True, stdout=StringIO())
+
+
+@override_settings(INSTRUMENTATION={'enabled': True, 'sample_rate': 1.0, 'window': 3})
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        request_stats.reset()
+        self.user_data = {'username': 'test_user', 'password': 'qwerty'}
+        self.user = User.objects.create_user(is_staff=True, **self.user_data)
+        self.question = Question.objects.create(title='Instrumented question', author=self.user)
+
+    def test_list_recorded(self):
+        """Tests that the queries, render time and size of the list requests are recorded, in a rolling window"""
+        response = self.client.get(reverse('survey:question-list'))
+        stats = request_stats.summary()['survey:question-list']
+        self.assertGreater(stats['queries']['max'], 0)
+        self.assertGreater(stats['db_ms']['max'], 0)
+        self.assertIsNotNone(stats['render_ms'])
+        self.assertEqual(stats['response_bytes']['max'], len(response.content))
+        self.assertIn('SELECT', stats['slowest_sql']['sql'])
+
+        for _ in range(3):
+            self.client.get(reverse('survey:question-list'))
+        stats = request_stats.summary()['survey:question-list']
+        self.assertEqual(stats['requests'], 4)
+        self.assertEqual(stats['samples'], 3)
+        self.assertEqual(sum(stats['latency_histogram'].values()), 3)
+
+    def test_function_views_recorded(self):
+        """Tests that the answer endpoint is recorded under its view name, without render time"""
+        self.client.login(**self.user_data)
+        self.client.post(reverse('survey:question-answer'), {'question_pk': self.question.pk, 'value': 4})
+        stats = request_stats.summary()['survey:question-answer']
+        self.assertEqual(stats['requests'], 1)
+        self.assertGreater(stats['queries']['p50'], 0)
+        self.assertIsNone(stats['render_ms'])
+
+    def test_stats_endpoint(self):
+        """Tests the JSON and text stats, only for staff users"""
+        stats_url = reverse('survey:request-stats')
+        self.client.get(reverse('survey:question-list'))
+        self.assertEqual(self.client.get(stats_url).status_code, 302)
+
+        self.client.login(**self.user_data)
+        stats = json.loads(self.client.get(stats_url).content)
+        self.assertEqual(stats['survey:question-list']['requests'], 1)
+        response = self.client.get(stats_url, {'format': 'text'})
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn(b'survey:question-list (1 requests, 1 samples)', response.content)
+
+    def test_sampling(self):
+        """Tests that unsampled requests, or all of them when disabled, are not recorded"""
+        for configuration in ({'enabled': True, 'sample_rate': 0}, {'enabled': False}):
+            with override_settings(INSTRUMENTATION=configuration):
+                # The middleware reads the settings when it's loaded, a new client loads it again
+                response = Client().get(reverse('survey:question-list'))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(request_stats.summary(), {}, configuration)
+
+        Client().get(reverse('survey:question-list'))
+        self.assertEqual(request_stats.summary()['survey:question-list']['samples'], 1)
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Runs the main views on a seeded dataset within their budgets (see survey.budgets.VIEW_BUDGETS)
+    """
+    @classmethod
+    def setUpTestData(cls):
+        SyntheticDataset(questions=500, users=50, seed=0).generate()
+        cls.user_data = {'username': 'test_user', 'password': 'qwerty'}
+        cls.user = User.objects.create_user(**cls.user_data)
+        cls.question = Question.objects.ranked().first()
+        # A page with answers and votes of the user
+        for question in Question.objects.ranked()[:5]:
+            question.answers.create(author=cls.user, value=3)
+            question.votes.create(author=cls.user, is_like=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_list(self):
+        """Tests the budget of the question list of anonymous users"""
+        with query_budget('survey:question-list'):
+            response = self.client.get(reverse('survey:question-list'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_logged_in(self):
+        """Tests the budget of the question list with the answers and votes of the user"""
+        self.client.login(**self.user_data)
+        with query_budget('survey:question-list:logged-in'):
+            response = self.client.get(reverse('survey:question-list'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_trending(self):
+        """Tests the budget of the trending question list"""
+        with query_budget('survey:question-list:trending'):
+            response = self.client.get(reverse('survey:question-list'), {'sort': 'trending'})
+        self.assertEqual(len(response.context['object_list']), 5)
+
+    def test_answer(self):
+        """Tests the budget of answering a question"""
+        self.client.login(**self.user_data)
+        with query_budget('survey:question-answer'):
+            response = self.client.post(reverse('survey:question-answer'), {
+                'question_pk': self.question.pk, 'value': 5
+            })
+        self.assertEqual(response.status_code, 200)
+
+    def test_like(self):
+        """Tests the budget of changing a vote"""
+        self.client.login(**self.user_data)
+        with query_budget('survey:question-like'):
+            response = self.client.post(reverse('survey:question-like'), {
+                'question_pk': self.question.pk, 'value': 'dislike'
+            })
+        self.assertEqual(response.status_code, 200)
+
+    def test_over_budget(self):
+        """Tests that an N+1 fails with the diff of the added queries"""
+        with CaptureQueriesContext(connection) as baseline:
+            list(Question.objects.select_related('author')[:3])
+
+        with self.assertRaises(QueryBudgetExceeded) as error:
+            with query_budget(queries=1, baseline=[query['sql'] for query in baseline.captured_queries]):
+                [question.author for question in Question.objects.all()[:3]]
+        message = str(error.exception)
+        self.assertIn('block is over budget: 4 queries, the budget is 1', message)
+        self.assertEqual(message.count('\n+SELECT "auth_user"'), 3)
+        self.assertIn('WHERE "auth_user"."id" = ? LIMIT ?', message)
+
+        @query_budget(milliseconds=0, check_time=True)
+        def slow():
+            pass
+
+        self.assertRaisesMessage(QueryBudgetExceeded, 'the budget is 0 ms', slow)
+        # Time is only checked when enabled
+        with self.settings(QUERY_BUDGETS={'check_time': False}):
+            with query_budget(milliseconds=0):
+                pass
+
+
+class AnswerHistogramTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user_data = {'username': 'test_user', 'password': 'qwerty'}
+        self.user = User.objects.create_user(**self.user_data)
+        self.other_user = User.objects.create_user(username='other_user', password='qwerty')
+        self.question = Question.objects.create(title='Que te parecio el ejercicio?', author=self.user)
+
+    def answer(self, value):
+        response = self.client.post(reverse('survey:question-answer'), {
+            'question_pk': self.question.pk, 'value': value
+        })
+        self.assertEqual(response.status_code, 200)
+
+    def test_answers_move_between_buckets(self):
+        """Tests that changing an answer moves it from its old bucket to the new one"""
+        self.client.login(**self.user_data)
+        self.answer(5)
+        self.answer(2)
+        Answer.objects.create(question=self.question, author=self.other_user, value=4)
+
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.value_histogram, {1: 0, 2: 1, 3: 0, 4: 1, 5: 0})
+        self.assertEqual((self.question.value_count, self.question.value_sum), (2, 6))
+        self.assertEqual(self.question.value_mean, 3)
+        self.assertEqual(self.question.value_median, 3)
+        call_command('rebuild_ranking_counters', verify=True, stdout=StringIO())
+
+        Answer.objects.get(author=self.other_user).delete()
+        self.question.refresh_from_db()
+        self.assertEqual((self.question.value_count, self.question.value_sum, self.question.value_2_count), (1, 2, 1))
+
+    def test_bulk_answers(self):
+        """Tests that the bulk endpoint updates the histograms of created and changed answers"""
+        self.client.login(**self.user_data)
+        self.answer(1)
+        items = [{'question_pk': self.question.pk, 'kind': 'answer', 'value': 3}]
+        self.client.post(reverse('survey:question-bulk'), json.dumps(items), content_type='application/json')
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.value_histogram, {1: 0, 2: 0, 3: 1, 4: 0, 5: 0})
+        call_command('rebuild_ranking_counters', verify=True, stdout=StringIO())
+
+    def test_median(self):
+        """Tests the median of odd and even amounts of answers, and the empty histogram"""
+        question = Question(value_1_count=1, value_5_count=2, value_count=3, value_sum=11)
+        self.assertEqual(question.value_median, 5)
+        question.value_2_count, question.value_count, question.value_sum = 1, 4, 13
+        self.assertEqual(question.value_median, 3.5)
+        self.assertIsNone(Question().value_median)
+        self.assertIsNone(Question().value_mean)
+
+    def test_rebuild(self):
+        """Tests that rebuild_ranking_counters fixes the histograms"""
+        Answer.objects.create(question=self.question, author=self.other_user, value=4)
+        Question.objects.update(value_4_count=0, value_sum=7)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_ranking_counters', verify=True, stdout=StringIO())
+        call_command('rebuild_ranking_counters', stdout=StringIO())
+        self.question.refresh_from_db()
+        self.assertEqual((self.question.value_4_count, self.question.value_count, self.question.value_sum), (1, 1, 4))
+
+    def test_list_and_api(self):
+        """Tests that the list and the ranking API show the mean, median and distribution without more queries"""
+        Answer.objects.create(question=self.question, author=self.other_user, value=4)
+        Answer.objects.create(question=self.question, author=self.user, value=1)
+        response = self.client.get(reverse('survey:question-list'))
+        self.assertContains(response, 'Media 2.5, mediana 2.5')
+        self.assertContains(response, '1: 1, 2: 0, 3: 0, 4: 1, 5: 0')
+
+        question = self.client.get(reverse('survey:question-ranking')).json()['results'][0]
+        self.assertEqual(question['mean'], 2.5)
+        self.assertEqual(question['median'], 2.5)
+        self.assertEqual(question['distribution'], {'1': 1, '2': 0, '3': 0, '4': 1, '5': 0})
+
+
+class RankingProfileTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(profiles.invalidate)
+        users = [User.objects.create_user(username='user{}'.format(i), password='12345') for i in range(3)]
+        self.popular = Question.objects.create(title='Popular question', author=users[0])
+        self.liked = Question.objects.create(title='Liked question', author=users[0])
+        for user in users:
+            self.popular.answers.create(author=user, value=4)
+            self.liked.votes.create(author=user, is_like=True)
+        self.popular.created = datetime.today().date() - timedelta(days=2)
+        self.popular.save()
+
+    def profile(self, name, role, **weights):
+        return RankingProfile.objects.create(name=name, role=role, **dict({
+            'answer_points': 10, 'like_points': 5, 'dislike_points': -3, 'daily_bonus_points': 10,
+        }, **weights))
+
+    def test_settings_profile(self):
+        """Tests that RANKING_CONFIGURATION is the active profile while there's none in the database"""
+        self.profile('Inactive', 'inactive', like_points=100)
+        self.assertEqual(active_profile().name, 'settings')
+        self.assertEqual(Question.objects.get(pk=self.liked.pk).shadow_score, self.liked.score)
+
+    def test_active_profile(self):
+        """Tests that the scores follow a new active profile once rescored"""
+        self.profile('Likes', 'active', like_points=100)
+        self.assertEqual(active_profile().name, 'settings')
+        call_command('rescore_questions', stdout=StringIO())
+        self.assertEqual(active_profile().name, 'Likes')
+        call_command('rebuild_ranking_counters', '--verify', stdout=StringIO())
+
+        ranked = list(Question.objects.ranked().values_list('pk', 'total_points'))
+        self.assertEqual(ranked, [(self.liked.pk, 310), (self.popular.pk, 30)])
+        # New writes use the active profile
+        self.liked.answers.create(author=User.objects.create_user(username='new'), value=1)
+        self.assertEqual(Question.objects.get(pk=self.liked.pk).points, 320)
+
+    def test_shadow_profile(self):
+        """Tests that the shadow scores are maintained beside the active ones"""
+        self.profile('Answers', 'shadow', answer_points=100, daily_bonus_points=0)
+        call_command('rescore_questions', stdout=StringIO())
+        call_command('rebuild_ranking_counters', '--verify', stdout=StringIO())
+
+        self.assertEqual(list(Question.objects.ranked().values_list('pk', flat=True)), [self.popular.pk, self.liked.pk])
+        liked = Question.objects.get(pk=self.liked.pk)
+        self.assertEqual((liked.points, liked.shadow_points), (25, 15))
+        shadow = list(Question.objects.ranked(shadow=True).values_list('pk', 'total_points'))
+        self.assertEqual(shadow, [(self.popular.pk, 300), (self.liked.pk, 15)])
+
+        self.liked.votes.create(author=User.objects.create_user(username='new'), is_like=False)
+        liked = Question.objects.get(pk=self.liked.pk)
+        self.assertEqual((liked.points, liked.shadow_points), (22, 12))
+        call_command('rebuild_ranking_counters', '--verify', stdout=StringIO())
+
+    def test_time_decay(self):
+        """Tests that questions lose points with age, without rescoring them every day"""
+        self.profile('Decay', 'active', decay_points=8, daily_bonus_points=0)
+        call_command('rescore_questions', stdout=StringIO())
+        call_command('rebuild_ranking_counters', '--verify', stdout=StringIO())
+
+        popular = Question.objects.get(pk=self.popular.pk)
+        self.assertEqual(popular.points, 30 - 16)
+        self.assertEqual(list(Question.objects.ranked().values_list('pk', flat=True)), [self.liked.pk, self.popular.pk])
+        # Moving the question to today removes its decay
+        popular.created = datetime.today().date()
+        popular.save()
+        self.assertEqual(popular.points, 30)
+        self.assertEqual(list(Question.objects.ranked().values_list('pk', flat=True)), [self.popular.pk, self.liked.pk])
+        call_command('rebuild_ranking_counters', '--verify', stdout=StringIO())
+
+    def test_version(self):
+        """Tests that every change increases the version and the other processes reload the applied profiles"""
+        profile = self.profile('Likes', 'active')
+        profile.like_points = 50
+        profile.save()
+        call_command('rescore_questions', stdout=StringIO())
+        self.assertEqual(active_profile().version, 2)
+        self.assertEqual(active_profile().like_points, 50)
+
+        other_process = ProfileRegistry()
+        self.assertEqual(other_process.get('active').like_points, 50)
+        AppliedRankingProfile.objects.filter(role='active').update(like_points=70, version=3)
+        with self.settings(RANKING_PROFILES={'check_interval': 0}):
+            self.assertEqual(other_process.get('active').like_points, 50)
+            bump_version(PROFILES_VERSION_KEY)
+            self.assertEqual(other_process.get('active').like_points, 70)
+
+    def test_applied_by_rescore(self):
+        """Tests that a profile change is only served once the questions are rescored with it"""
+        points = Question.objects.get(pk=self.popular.pk).points
+        leaderboard.top(10)
+        version = ranking_version()
+        card_versions = question_versions([self.liked.pk])
+        self.profile('Decay', 'active', answer_points=10, decay_points=1)
+        self.assertEqual(active_profile().name, 'settings')
+        self.assertEqual(Question.objects.get(pk=self.popular.pk).points, points)
+        self.assertEqual(ranking_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rescore_questions', stdout=StringIO())
+        self.assertEqual(active_profile().name, 'Decay')
+        self.assertEqual(Question.objects.get(pk=self.popular.pk).points, 30 - 2)
+        self.assertIsNone(cache.get(leaderboard.cache_key))
+        self.assertNotEqual(ranking_version(), version)
+        self.assertNotEqual(question_versions([self.liked.pk]), card_versions)
+        call_command('rebuild_ranking_counters', '--verify', stdout=StringIO())
+
+    def test_deleted_profile(self):
+        """Tests that a deleted profile is still served until the questions are rescored without it"""
+        self.profile('Likes', 'active', like_points=100)
+        call_command('rescore_questions', stdout=StringIO())
+        RankingProfile.objects.get().delete()
+        self.assertEqual(active_profile().name, 'Likes')
+        self.assertEqual(Question.objects.get(pk=self.liked.pk).points, 310)
+
+        call_command('rescore_questions', stdout=StringIO())
+        self.assertEqual(active_profile().name, 'settings')
+        call_command('rebuild_ranking_counters', '--verify', stdout=StringIO())
+
+    def test_one_active_profile(self):
+        """Tests that only one profile can be active"""
+        self.profile('Likes', 'active')
+        with self.assertRaises(IntegrityError):
+            self.profile('Answers', 'active')
+
+
+class TrendingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='test_user', password='12345')
+        self.old = Question.objects.create(title='Old question', author=self.user)
+        self.new = Question.objects.create(title='New question', author=self.user)
+        self.quiet = Question.objects.create(title='Quiet question', author=self.user)
+        self.now = datetime(2026, 1, 10, 18, 30, tzinfo=timezone.utc)
+        self.answer_points = settings.RANKING_CONFIGURATION['answer_points']
+
+    def test_buckets(self):
+        """Tests that new answers and votes are added to the hourly and daily buckets, removed ones are not"""
+        self.new.answers.create(author=self.user, value=3)
+        vote = self.new.votes.create(author=self.user, is_like=True)
+        vote.is_like = False
+        vote.save()
+        vote.delete()
+        buckets = QuestionActivity.objects.filter(question=self.new)
+        self.assertEqual(
+            sorted(buckets.values_list('period', 'answers', 'likes', 'dislikes')),
+            [('day', 1, 1, 1), ('hour', 1, 1, 1)]
+        )
+        self.assertEqual(buckets.get(period='hour').start.minute, 0)
+
+    def test_decay(self):
+        """Tests that recent activity ranks first, and activity out of the window is ignored"""
+        add_question_activity(self.old.pk, answers=10, now=self.now - timedelta(hours=12))
+        add_question_activity(self.new.pk, answers=3, now=self.now)
+        add_question_activity(self.quiet.pk, answers=50, now=self.now - timedelta(days=30))
+
+        trending = list(Question.objects.trending('hour', now=self.now).values_list('pk', 'total_points'))
+        self.assertEqual(trending, [(self.new.pk, self.answer_points * 3), (self.old.pk, self.answer_points * 10 / 4)])
+        # The same day
+        trending = list(Question.objects.trending('day', now=self.now).values_list('pk', 'total_points'))
+        self.assertEqual(trending, [(self.old.pk, self.answer_points * 10), (self.new.pk, self.answer_points * 3)])
+
+    def test_prune(self):
+        """Tests that the command only deletes the buckets out of the windows"""
+        add_question_activity(self.old.pk, answers=1, now=timezone.now() - timedelta(days=3))
+        add_question_activity(self.new.pk, answers=1)
+        call_command('prune_question_activity', stdout=StringIO())
+        self.assertEqual(
+            sorted(QuestionActivity.objects.values_list('question', 'period')),
+            [(self.old.pk, 'day'), (self.new.pk, 'day'), (self.new.pk, 'hour')]
+        )
+
+    def test_list_view(self):
+        """Tests the trending mode of the list and the ranking API"""
+        self.old.answers.create(author=self.user, value=3)
+        self.new.votes.create(author=self.user, is_like=True)
+        response = self.client.get(reverse('survey:question-list'), {'sort': 'trending', 'period': 'day'})
+        self.assertEqual(response.context['trending_period'], 'day')
+        self.assertEqual([question.pk for question in response.context['object_list']], [self.old.pk, self.new.pk])
+        # The count is cached for the current window only
+        self.assertEqual(cache.get('survey:trending-count:day:{}'.format(activity_bucket('day').isoformat())), 2)
+
+        response = self.client.get(reverse('survey:question-ranking'), {'sort': 'trending', 'period': 'other'})
+        results = response.json()['results']
+        like_points = settings.RANKING_CONFIGURATION['like_points']
+        self.assertEqual([result['trending_points'] for result in results], [self.answer_points, like_points])
+        # The ranking still lists every question
+        response = self.client.get(reverse('survey:question-list'))
+        self.assertEqual(len(response.context['object_list']), 3)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='test_user', password='12345')
+        self.title_hit = Question.objects.create(title='Qué opinas del ejercicio', author=self.user)
+        self.description_hit = Question.objects.create(
+            title='Otra pregunta', description='Sobre el ejercicio técnico', author=self.user
+        )
+        self.other = Question.objects.create(title='Sin relación', author=self.user)
+
+    def search(self, query, queryset=None):
+        return list((queryset or Question.objects).search(query).values_list('pk', flat=True))
+
+    def test_bm25(self):
+        """Tests that titles weigh more, words match as prefixes, without accents and case"""
+        self.assertEqual(self.search('EJERC'), [self.title_hit.pk, self.description_hit.pk])
+        self.assertEqual(self.search('que ejercicio'), [self.title_hit.pk])
+        self.assertEqual(self.search('tecnico'), [self.description_hit.pk])
+        # Operators and quotes are taken as words
+        self.assertEqual(self.search('"ejercicio" OR -sin*'), [])
+        self.assertEqual(self.search(' ?! '), [])
+
+    def test_matched_once(self):
+        """Tests that the index is matched once per query, not once more for the rank of each hit"""
+        with CaptureQueriesContext(connection) as context:
+            hits = list(Question.objects.search('ejercicio'))
+            count = Question.objects.search('ejercicio').count()
+        self.assertEqual((len(hits), count), (2, 2))
+        self.assertEqual([query['sql'].count(' MATCH ') for query in context.captured_queries], [1, 1])
+
+    def test_points_order(self):
+        """Tests that hits can be listed by points"""
+        self.description_hit.votes.create(author=self.user, is_like=True)
+        hits = Question.objects.ranked().search('ejercicio', order=False)
+        self.assertEqual([question.pk for question in hits], [self.description_hit.pk, self.title_hit.pk])
+        self.assertTrue(all(question.search_rank > 0 for question in hits))
+
+    def test_sync(self):
+        """Tests that creates, edits (also from QuestionUpdateView), deletes and raw inserts are indexed"""
+        response = self.client.post(reverse('survey:question-edit', args=[self.other.pk]), {
+            'title': 'Pregunta editada', 'description': 'Nueva descripción'
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.search('relacion'), [])
+        self.assertEqual(self.search('editada'), [self.other.pk])
+        # Counter updates don't touch the index
+        self.other.answers.create(author=self.user, value=3)
+
+        self.title_hit.delete()
+        self.assertEqual(self.search('opinas'), [])
+        SyntheticDataset(questions=10, users=5, seed=0).generate()
+        self.assertEqual(Question.objects.search('synthetic question').count(), 10)
+        call_command('rebuild_search_index', '--verify', stdout=StringIO())
+
+    def test_triggers_restored(self):
+        """Tests that the triggers dropped by a remake of survey_question are restored after migrating"""
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER survey_question_fts_insert')
+        with self.assertRaisesMessage(CommandError, 'survey_question_fts_insert'):
+            call_command('rebuild_search_index', '--verify', stdout=StringIO())
+        question = Question.objects.create(title='Escrita sin trigger', author=self.user)
+        self.assertEqual(self.search('trigger'), [])
+
+        emit_post_migrate_signal(verbosity=0, interactive=False, db=DEFAULT_DB_ALIAS)
+        self.assertEqual(self.search('trigger'), [question.pk])
+        call_command('rebuild_search_index', '--verify', stdout=StringIO())
+
+    def test_rebuild(self):
+        """Tests that the command finds and rebuilds an index out of sync"""
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO survey_question_fts(survey_question_fts) VALUES ('delete-all')")
+        self.assertEqual(self.search('ejercicio'), [])
+        with self.assertRaises(CommandError):
+            call_command('rebuild_search_index', '--verify', stdout=StringIO())
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        call_command('rebuild_search_index', '--verify', stdout=StringIO())
+        self.assertEqual(self.search('ejercicio'), [self.title_hit.pk, self.description_hit.pk])
+
+    def test_list_view(self):
+        """Tests the search of the list and the ranking API"""
+        response = self.client.get(reverse('survey:question-list'), {'q': 'ejercicio', 'sort': 'points'})
+        self.assertEqual(response.context['search_query'], 'ejercicio')
+        self.assertEqual(response.context['page_query'], 'q=ejercicio&sort=points&')
+        self.assertEqual(len(response.context['object_list']), 2)
+
+        response = self.client.get(reverse('survey:question-ranking'), {'q': 'ejercicio'})
+        results = response.json()['results']
+        self.assertEqual([result['pk'] for result in results], [self.title_hit.pk, self.description_hit.pk])
+        self.assertGreater(results[0]['search_rank'], results[1]['search_rank'])
+
+
 class ViewTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.user_data = {
             'username': 'test_user',
             'password': 'qwerty'
@@ -245,6 +1940,32 @@ class ViewTests(TestCase):
         response = self.client.get(reverse('survey:question-list'))
         self.assertEqual(response.status_code, 200)
 
+    def list_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('survey:question-list'))
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertListQueriesDontGrow(self):
+        """Renders the list with one and with many questions, the amount of queries has to be the same"""
+        few_questions_queries = self.list_queries()
+
+        other_user = User.objects.create_user(username='other_user', password='qwerty')
+        for i in range(30):
+            question = Question.objects.create_question(author=other_user, title='Question {}'.format(i))
+            question.answers.create(author=self.user, value=3)
+            question.votes.create(author=other_user, is_like=i % 2 == 0)
+
+        self.assertEqual(self.list_queries(), few_questions_queries)
+
+    def test_question_list_view_queries_no_auth(self):
+        self.assertListQueriesDontGrow()
+
+    def test_question_list_view_queries(self):
+        self.client.login(**self.user_data)
+        self.assertListQueriesDontGrow()
+
     def test_question_create_view_no_auth(self):
         create_url = reverse('survey:question-create')
         response = self.client.get(create_url)
@@ -1,15 +1,27 @@
 from django.urls import path
 
 from survey.views import (QuestionListView,
+                          QuestionRankingView,
                           QuestionCreateView,
                           QuestionUpdateView,
                           answer_question,
-                          like_dislike_question)
+                          like_dislike_question,
+                          bulk_answer_like_question,
+                          instrumentation_stats)
+from survey import async_views
+from survey.async_views import sync_or_async
+
+question_list = sync_or_async(QuestionListView.as_view(), async_views.question_list)
+answer_question = sync_or_async(answer_question, async_views.answer_question)
+like_dislike_question = sync_or_async(like_dislike_question, async_views.like_dislike_question)
 
 urlpatterns = [
-    path('', QuestionListView.as_view(), name='question-list'),
+    path('', question_list, name='question-list'),
+    path('api/ranking/', QuestionRankingView.as_view(), name='question-ranking'),
     path('question/add/', QuestionCreateView.as_view(), name='question-create'),
     path('question/edit/<int:pk>/', QuestionUpdateView.as_view(), name='question-edit'),
     path('question/answer/', answer_question, name='question-answer'),
     path('question/like/', like_dislike_question, name='question-like'),
+    path('question/bulk/', bulk_answer_like_question, name='question-bulk'),
+    path('api/stats/', instrumentation_stats, name='request-stats'),
 ]
@@ -0,0 +1,71 @@
+import time
+
+from django.core.cache import cache
+
+RANKING_VERSION_KEY = 'survey:ranking-version'
+# Part of the version of every question, bumped when the points of all of them change (e.g. a rescore)
+QUESTIONS_VERSION_KEY = 'survey:questions-version'
+
+
+def _initial_version():
+    # If a version is evicted from the cache it starts again from the clock, never from a value
+    # that could still be part of the key of an old cached entry
+    return int(time.time() * 1000)
+
+
+def get_version(key):
+    return cache.get_or_set(key, _initial_version, None)
+
+
+def get_versions(keys):
+    """
+    Returns the versions of many keys with one cache read, as {key: version}
+    """
+    versions = cache.get_many(keys)
+    missing = {key: _initial_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return versions
+
+
+def bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _initial_version()
+        cache.set(key, version, None)
+        return version
+
+
+def question_version_key(question_pk):
+    return 'survey:question-version:{}'.format(question_pk)
+
+
+def ranking_version():
+    """
+    Global version of the ranking, it changes on every answer, vote or question write
+    """
+    return get_version(RANKING_VERSION_KEY)
+
+
+def question_versions(question_pks):
+    """
+    Returns the version of each question as {question_pk: version}, they change when
+    the question or its points change, or the points of every question change
+    """
+    versions = get_versions([QUESTIONS_VERSION_KEY] + [question_version_key(pk) for pk in question_pks])
+    return {
+        pk: '{}.{}'.format(versions[QUESTIONS_VERSION_KEY], versions[question_version_key(pk)])
+        for pk in question_pks
+    }
+
+
+def bump_question_version(question_pk):
+    bump_version(question_version_key(question_pk))
+    bump_version(RANKING_VERSION_KEY)
+
+
+def bump_all_question_versions():
+    bump_version(QUESTIONS_VERSION_KEY)
+    bump_version(RANKING_VERSION_KEY)
@@ -1,38 +1,258 @@
-from django.http import JsonResponse
+import hashlib
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse, HttpResponse
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.generic.edit import CreateView, UpdateView
 from django.views.generic.list import ListView
 from django.urls import reverse_lazy
-from django.db.models import IntegerField, BooleanField, Value, OuterRef, Subquery
-from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_POST, condition
+from django.views.decorators.gzip import gzip_page
+from django.utils.decorators import method_decorator
+from django.db import transaction
+from django.middleware.csrf import get_token
+
+from survey.models import Question, Answer, Vote, PERIOD_LENGTHS, activity_bucket
+from survey.database import retry_on_locked
+from survey.leaderboard import leaderboard
+from survey.ingestion import ingest, MAX_ITEMS
+from survey.instrumentation import request_stats, summary_text
+from survey.journal import journal
+from survey.overlay import overlay_interactions, invalidate_user_interactions, version_key as interactions_version_key
+from survey.pagination import ApproximateCountPaginator, KeysetPaginator, encode_cursor
+from survey.routers import read_from_replica
+from survey.versions import ranking_version, question_versions, get_version
+from survey.profiles import active_profile
+from survey.events import RANKING_EVENTS_PATH
+
+
+def trending_period(request):
+    """
+    Returns the trending period of a list request (?sort=trending&period=day), None for the ranking.
+    The period is hourly unless it's a valid one.
+    """
+    if request.GET.get('sort') != 'trending':
+        return None
+    period = request.GET.get('period')
+    return period if period in PERIOD_LENGTHS else 'hour'
+
+
+def search_query(request):
+    """Returns the search of a list request (?q=words), empty for no search"""
+    return request.GET.get('q', '').strip()
+
+
+def list_clock(request):
+    """
+    The time the list pages depend on: the day (because of the daily bonus) for the ranking,
+    the current activity bucket for the trending mode (the decay changes with each bucket)
+    """
+    period = trending_period(request)
+    if period:
+        return activity_bucket(period).isoformat()
+    return datetime.today().date().isoformat()
+
 
-from survey.models import Question, Answer, Vote
+def csrf_cookie(request):
+    """
+    Returns the CSRF cookie the page of the request is rendered with, a new one if the request has none
+    """
+    get_token(request)
+    return request.META['CSRF_COOKIE']
 
 
+def ranking_etag(request, *args, **kwargs):
+    """
+    ETag of the ranked list pages. It only reads version stamps from the cache, so unchanged pages
+    are answered with a 304 without querying the database.
+    It changes with the ranking version, the day or trending bucket (see list_clock), the page,
+    and the answers and votes of the user. Pages of logged in users also hold their CSRF token,
+    so it changes with their CSRF cookie too (it's rotated on login).
+    """
+    parts = [ranking_version(), list_clock(request), request.path, request.GET.urlencode()]
+    if request.user.is_authenticated:
+        parts += [
+            request.user.pk, get_version(interactions_version_key(request.user.pk)),
+            csrf_cookie(request),
+        ]
+    return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+@method_decorator(gzip_page, name='dispatch')
+@method_decorator(condition(etag_func=ranking_etag), name='get')
 class QuestionListView(ListView):
     model = Question
     paginate_by = 20
+    paginator_class = ApproximateCountPaginator
+    page_cache_prefix = 'survey:list-page'
+
+    def get(self, request, *args, **kwargs):
+        """
+        Pages of anonymous users are the same for everyone, they are cached until the ranking changes.
+        Pages read from a replica are not cached, they could be older than the versions in the key.
+        """
+        if request.user.is_authenticated or not settings.LIST_CACHE_CONFIGURATION.get('enabled', False):
+            return super().get(request, *args, **kwargs)
+
+        key = '{prefix}:{version}:{clock}:{query}'.format(
+            prefix=self.page_cache_prefix,
+            version=ranking_version(),
+            clock=list_clock(request),
+            query=hashlib.md5(request.GET.urlencode().encode()).hexdigest(),
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        response = super().get(request, *args, **kwargs)
+        timeout = settings.LIST_CACHE_CONFIGURATION.get('page_timeout', 60)
+
+        def cache_response(rendered):
+            if not read_from_replica():
+                cache.set(key, (rendered.content, rendered['Content-Type']), timeout)
+
+        if hasattr(response, 'add_post_render_callback'):
+            response.add_post_render_callback(cache_response)
+        else:
+            cache_response(response)
+        return response
 
     def get_queryset(self):
-        queryset = super().get_queryset().ranked()
+        period = trending_period(self.request)
+        query = search_query(self.request)
+        queryset = super().get_queryset()
+        queryset = queryset.trending(period) if period else queryset.ranked()
+        if query:
+            # Hits are ordered by relevance, unless the ranking (?sort=points) or the trending mode is asked for
+            queryset = queryset.search(query, order=not (period or self.request.GET.get('sort') == 'points'))
+        # Authors are shown in every row, they are fetched in the same query
+        return queryset.select_related('author')
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        period = trending_period(self.request)
+        if search_query(self.request):
+            # The hits are counted from the search index
+            count_queryset, count_cache_key = queryset, None
+        elif period:
+            # Only the questions with activity in the window are listed, the window moves with each bucket
+            count_queryset = queryset
+            count_cache_key = 'survey:trending-count:{}:{}'.format(period, activity_bucket(period).isoformat())
+        else:
+            count_queryset, count_cache_key = Question.objects.all(), 'survey:question-count'
+        return super().get_paginator(
+            queryset, per_page, orphans=orphans, allow_empty_first_page=allow_empty_first_page,
+            count_queryset=count_queryset, count_cache_key=count_cache_key, **kwargs
+        )
 
-        if self.request.user.is_authenticated:
-            # Annotates user_value (answer value) and is_like (if user liked or disliked the question) to each question
-            user_answers = self.request.user.answers.filter(
-                question_id=OuterRef('pk')
-            ).values('value')
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Pages are read with a cursor (keyset pagination) when there is one in the request,
+        the page number (offset pagination) is kept for the first and last pages.
+        The first page is served from the leaderboard snapshot, so the database only fetches
+        its questions by pk instead of sorting the whole table.
+        The trending and search pages only have numbers, they only sort the questions with recent activity
+        or the search hits.
+        """
+        if trending_period(self.request) or search_query(self.request):
+            paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+            page.previous_cursor = page.next_cursor = None
+            return paginator, page, object_list, is_paginated
 
-            user_votes = self.request.user.votes.filter(
-                question_id=OuterRef('pk')
-            ).values('is_like')
+        cursor = self.request.GET.get('cursor')
+        if cursor:
+            page = KeysetPaginator(queryset, page_size).page(cursor)
+            # The offset paginator gives the approximate amount of pages for the last page link
+            page.paginator = self.get_paginator(queryset, page_size)
+            return page.paginator, page, page.object_list, True
 
-            queryset = queryset.annotate(
-                user_value=Coalesce(Subquery(user_answers), Value(0), output_field=IntegerField()),
-                is_like=Coalesce(Subquery(user_votes), Value(None), output_field=BooleanField())
-            )
+        paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+        if page.number == 1:
+            top_pks = leaderboard.top(page_size)
+            if top_pks is not None:
+                page.object_list = queryset.filter(pk__in=top_pks)
 
-        return queryset
+        # Numbered pages also link to the next and previous pages with cursors
+        object_list = page.object_list = list(page.object_list)
+        page.previous_cursor = encode_cursor('p', object_list[0]) if page.has_previous() and object_list else None
+        page.next_cursor = encode_cursor('n', object_list[-1]) if page.has_next() and object_list else None
+        return paginator, page, object_list, is_paginated
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # The answers and votes of the user are added on top of the page, instead of being part of the query
+        overlay_interactions(self.request.user, context['object_list'])
+        context['trending_period'] = trending_period(self.request)
+        context['search_query'] = search_query(self.request)
+        # Numbered page links keep the mode and the search of the list
+        parameters = self.request.GET.copy()
+        for name in ('page', 'cursor'):
+            parameters.pop(name, None)
+        context['page_query'] = parameters.urlencode() + '&' if parameters else ''
+        context['ranking_events_path'] = RANKING_EVENTS_PATH if settings.RANKING_EVENTS.get('enabled') else None
+
+        if not self.request.user.is_authenticated:
+            # Cards are cached until their question changes
+            versions = question_versions([question.pk for question in context['object_list']])
+            for question in context['object_list']:
+                question.card_version = versions[question.pk]
+            context['fragment_timeout'] = settings.LIST_CACHE_CONFIGURATION.get('fragment_timeout', 600)
+            # With time decay the points of every card change each day
+            context['card_day'] = datetime.today().date().isoformat() if active_profile().decay_points else ''
+            # The questions of the page are already read, cards read from a replica are not cached
+            context['cache_fragments'] = not read_from_replica()
+        return context
+
+
+class QuestionRankingView(QuestionListView):
+    """
+    Same ranked pages as QuestionListView, as JSON for polling clients.
+    Accepts the same page, cursor, sort, period and q parameters.
+    """
+    page_cache_prefix = 'survey:ranking-page'
+
+    def render_to_response(self, context, **response_kwargs):
+        page = context['page_obj']
+        results = [question_data(question, self.request.user) for question in context['object_list']]
+        for data, question in zip(results, context['object_list']):
+            if context['trending_period']:
+                data['trending_points'] = round(question.total_points, 3)
+            if context['search_query']:
+                data['search_rank'] = round(question.search_rank, 6)
+        return JsonResponse({
+            'results': results,
+            'page': page.number,
+            'num_pages': page.paginator.num_pages,
+            'previous_cursor': page.previous_cursor,
+            'next_cursor': page.next_cursor,
+        })
+
+
+def question_data(question, user):
+    data = {
+        'pk': question.pk,
+        'title': question.title,
+        'description': question.description,
+        'author': str(question.author),
+        'created': question.created.isoformat(),
+        'points': question.points,
+        'answers': question.answer_count,
+        'likes': question.like_count,
+        'dislikes': question.dislike_count,
+        # From the answer histogram of the question, no aggregation
+        'mean': question.value_mean,
+        'median': question.value_median,
+        'distribution': question.value_histogram,
+    }
+    if user.is_authenticated:
+        data['user_value'] = question.user_value
+        data['is_like'] = question.is_like
+    return data
 
 
 class QuestionCreateView(LoginRequiredMixin, CreateView):
@@ -54,24 +274,81 @@ class QuestionUpdateView(UpdateView):
     success_url = reverse_lazy('survey:question-list')
 
 
+@retry_on_locked
+def save_answer(question_pk, author, value):
+    """Saves the answer of the author to the question, returns the question with its new counters"""
+    with transaction.atomic():
+        question = get_object_or_404(Question, pk=question_pk)
+        answer, _ = Answer.objects.get_or_create(question=question, author=author)
+        # So the signals update the counters of this instance
+        answer.question = question
+        answer.value = value
+        answer.save()
+    return question
+
+
+@retry_on_locked
+def save_vote(question_pk, author, is_like):
+    """Saves the vote of the author to the question, returns the question with its new counters"""
+    with transaction.atomic():
+        question = get_object_or_404(Question, pk=question_pk)
+        vote, _ = Vote.objects.get_or_create(question=question, author=author)
+        vote.question = question
+        vote.is_like = is_like
+        vote.save()
+    return question
+
+
 def answer_question(request):
     question_pk = request.POST.get('question_pk')
     if not question_pk:
         return JsonResponse({'ok': False})
-    question = get_object_or_404(Question, pk=question_pk)
-    answer, _ = Answer.objects.get_or_create(question=question, author=request.user)
-    answer.value = request.POST.get('value')
-    answer.save()
-    return JsonResponse({'ok': True})
+    question = save_answer(question_pk, request.user, request.POST.get('value'))
+    # The counters of the question were updated in memory by the answer, the client updates the page with them
+    return JsonResponse({'ok': True, 'question_pk': question.pk, 'points': question.points})
 
 
 def like_dislike_question(request):
     question_pk = request.POST.get('question_pk')
     if not request.POST.get('question_pk'):
         return JsonResponse({'ok': False})
-    question = get_object_or_404(Question, pk=question_pk)
     value = request.POST.get('value')
-    vote, _ = Vote.objects.get_or_create(question=question, author=request.user)
-    vote.is_like = True if value == 'like' else False
-    vote.save()
-    return JsonResponse({'ok': True})
+    if journal.enabled:
+        question = get_object_or_404(Question, pk=question_pk)
+        journal.append(request.user.pk, question.pk, value == 'like')
+        invalidate_user_interactions(request.user.pk)
+        return JsonResponse({'ok': True, 'pending': True})
+    question = save_vote(question_pk, request.user, value == 'like')
+    return JsonResponse({'ok': True, 'question_pk': question.pk, 'points': question.points})
+
+
+@require_POST
+def bulk_answer_like_question(request):
+    """
+    Applies many answers and votes at once, for clients that queue interactions offline.
+    Expects a JSON array of {"question_pk": ..., "kind": "answer" | "vote", "value": ...} items,
+    answer values are 1 to 5 and vote values are "like" or "dislike".
+    Returns the result of each item, in the same order.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'ok': False}, status=401)
+    try:
+        items = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'ok': False, 'error': 'Invalid JSON'}, status=400)
+    if not isinstance(items, list) or len(items) > MAX_ITEMS:
+        return JsonResponse({'ok': False, 'error': 'Expected a list of up to {} items'.format(MAX_ITEMS)}, status=400)
+
+    return JsonResponse({'ok': True, 'results': ingest(request.user, items)})
+
+
+@staff_member_required
+def instrumentation_stats(request):
+    """
+    Rolling stats of the instrumented requests of each view of this process, as JSON
+    or as plain text with ?format=text
+    """
+    summary = request_stats.summary()
+    if request.GET.get('format') == 'text':
+        return HttpResponse(summary_text(summary), content_type='text/plain; charset=utf-8')
+    return JsonResponse(summary)